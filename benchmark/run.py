@@ -0,0 +1,158 @@
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+
+BENCHMARK_DIR: str = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCHMARK_DIR), "src"))
+
+from pylox import Backend, Lox  # noqa: E402
+
+
+class BenchmarkError(Exception):
+    def __init__(self, benchmark: str, backend: Backend, status: int | str | None):
+        super().__init__(f"{benchmark} failed on the {backend.name.lower()} backend (exit status {status})")
+
+
+def benchmarks() -> list[str]:
+    return sorted(name.removesuffix(".lox") for name in os.listdir(BENCHMARK_DIR) if name.endswith(".lox"))
+
+
+# Runs the script once in a fresh Lox instance (so that no globals leak from one run to the next), swallowing what it
+# prints; the times the scripts print themselves are left out in favour of the wall time of the whole run, which
+# includes scanning, parsing and resolving
+def run_once(benchmark: str, backend: Backend) -> float:
+    path: str = os.path.join(BENCHMARK_DIR, f"{benchmark}.lox")
+    lox: Lox = Lox(backend)
+
+    start: float = time.perf_counter()
+    try:
+        with redirect_stdout(io.StringIO()):
+            lox.run_file(path)
+    except SystemExit as e:
+        raise BenchmarkError(benchmark, backend, e.code) from None
+    return time.perf_counter() - start
+
+
+# Tracing allocations slows the run down several times over, so it is done in a separate run that isn't timed
+def measure_allocations(benchmark: str, backend: Backend) -> dict[str, int]:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run_once(benchmark, backend)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"peak_bytes": peak, "retained_bytes": current}
+
+
+def percentile(samples: list[float], percent: int) -> float:
+    if len(samples) == 1:
+        return samples[0]
+
+    return statistics.quantiles(samples, n=100, method="inclusive")[percent - 1]
+
+
+def benchmark_backend(benchmark: str, backend: Backend, warmup: int, runs: int, allocations: bool) -> dict[str, object]:
+    for _ in range(warmup):
+        run_once(benchmark, backend)
+
+    times: list[float] = []
+    collections: list[int] = []
+    for _ in range(runs):
+        gc.collect()
+        before: int = gc.get_stats()[0]["collections"]
+        times.append(run_once(benchmark, backend))
+        collections.append(gc.get_stats()[0]["collections"] - before)
+
+    result: dict[str, object] = {"median": statistics.median(times),
+                                 "p95": percentile(times, 95),
+                                 "min": min(times),
+                                 "times": times,
+                                 # Young generation collections are triggered by container allocations, so their number
+                                 # is a cheap measure of how much a run allocates
+                                 "gc_collections": statistics.median(collections)}
+    if allocations:
+        result.update(measure_allocations(benchmark, backend))
+    return result
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARK_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_row(benchmark: str, backend: Backend, result: dict[str, object]) -> None:
+    line: str = f"{benchmark:<16} {backend.name.lower():<12} {result['median']:>9.4f} {result['p95']:>9.4f}"
+    if "peak_bytes" in result:
+        line += f" {result['peak_bytes'] / 1024:>10.0f}"
+    print(line, flush=True)
+
+
+def main() -> None:
+    available: list[str] = benchmarks()
+
+    arg_parser: ArgumentParser = ArgumentParser(description="Times the Lox benchmarks on one or more backends.")
+    arg_parser.add_argument("benchmarks", nargs="*", metavar="benchmark",
+                            help=f"benchmarks to run (default: all of them: {', '.join(available)})")
+    arg_parser.add_argument("--backend", action="append", choices=[backend.name.lower() for backend in Backend],
+                            help="backend to time, can be given several times (default: all of them)")
+    arg_parser.add_argument("--warmup", type=int, default=1, help="untimed runs before timing (default: 1)")
+    arg_parser.add_argument("--runs", type=int, default=5, help="timed runs (default: 5)")
+    arg_parser.add_argument("--no-allocations", dest="allocations", action="store_false",
+                            help="skip the extra run tracing memory allocations")
+    arg_parser.add_argument("--output", "-o", help="file to write the results to as JSON")
+    args = arg_parser.parse_args()
+
+    if args.runs < 1 or args.warmup < 0:
+        arg_parser.error("there must be at least one timed run and no negative number of warmup runs")
+    for benchmark in args.benchmarks:
+        if benchmark not in available:
+            arg_parser.error(f"unknown benchmark '{benchmark}'")
+
+    selected: list[Backend] = [Backend[name.upper()] for name in args.backend] if args.backend else list(Backend)
+    results: dict[str, dict[str, object]] = {}
+
+    print(f"{'benchmark':<16} {'backend':<12} {'median s':>9} {'p95 s':>9}" +
+          (f" {'peak KiB':>10}" if args.allocations else ""))
+    for benchmark in args.benchmarks or available:
+        results[benchmark] = {}
+        for backend in selected:
+            try:
+                result: dict[str, object] = benchmark_backend(benchmark, backend, args.warmup, args.runs,
+                                                              args.allocations)
+            except BenchmarkError as e:
+                print(e, file=sys.stderr)
+                result = {"error": str(e)}
+            else:
+                print_row(benchmark, backend, result)
+            results[benchmark][backend.name.lower()] = result
+
+    if args.output is not None:
+        report: dict[str, object] = {"commit": git_commit(),
+                                     "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                                     "python": platform.python_version(),
+                                     "implementation": platform.python_implementation(),
+                                     "warmup": args.warmup,
+                                     "runs": args.runs,
+                                     "results": results}
+        with open(args.output, "wt", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+            file.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import os
+import random
+import statistics
+import sys
+import time
+from argparse import ArgumentParser
+
+BENCHMARK_DIR: str = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCHMARK_DIR), "src"))
+
+from pylox import Lox  # noqa: E402
+from regex_scanner import RegexScanner  # noqa: E402
+from scanner import Scanner  # noqa: E402
+
+scanners: dict[str, type] = {"characters": Scanner, "regex": RegexScanner}
+
+
+# One of a handful of templates, filled in with random names and numbers, so that the source isn't the same few
+# lines over and over again, which would flatter whatever caching the regular expression engine does
+def generate_chunk(rng: random.Random, index: int) -> str:
+    name: str = f"{rng.choice(['count', 'total', 'node', 'value', 'item'])}_{index}"
+    number: str = str(rng.randint(0, 100000)) if rng.random() < 0.5 else f"{rng.uniform(0, 1000):.3f}"
+    templates: list[str] = [
+        f"fun {name}(a, b) {{\n  // Adds {number} to both\n  return a + b * {number} - (a / 2);\n}}\n",
+        f"class {name.title()} < Base {{\n  init(x) {{\n    this.x = x;\n  }}\n\n  get() {{\n"
+        f"    return this.x >= {number} and !nil or false;\n  }}\n}}\n",
+        f"for (var i = 0; i <= {number}; i = i + 1) {{\n  if (i != {name}) print \"{name} at \" + tostring(i);\n}}\n",
+        f"var {name} = \"a string holding {number}\";\nwhile ({name} == nil) {{ {name} = {number} % 7 ^ 2; }}\n",
+    ]
+    return rng.choice(templates)
+
+
+def generate_source(size: int, seed: int) -> str:
+    rng: random.Random = random.Random(seed)
+    chunks: list[str] = []
+    length: int = 0
+    while length < size:
+        chunks.append(generate_chunk(rng, len(chunks)))
+        length += len(chunks[-1])
+
+    return "".join(chunks)
+
+
+def time_scanner(scanner: type, source: str, runs: int) -> list[float]:
+    times: list[float] = []
+    for _ in range(runs):
+        start: float = time.perf_counter()
+        scanner(source, Lox()).scan_tokens()
+        times.append(time.perf_counter() - start)
+
+    return times
+
+
+def main() -> None:
+    arg_parser: ArgumentParser = ArgumentParser(description="Times the scanners on a generated Lox source.")
+    arg_parser.add_argument("--size", type=float, default=4, help="size of the source in megabytes (default: 4)")
+    arg_parser.add_argument("--runs", type=int, default=5, help="timed runs of each scanner (default: 5)")
+    arg_parser.add_argument("--seed", type=int, default=0, help="seed for generating the source (default: 0)")
+    arg_parser.add_argument("--scanner", action="append", choices=list(scanners),
+                            help="scanner to time, can be given several times (default: both)")
+    args = arg_parser.parse_args()
+
+    if args.runs < 1 or args.size <= 0:
+        arg_parser.error("there must be at least one run and the source can't be empty")
+
+    source: str = generate_source(int(args.size * 1024 * 1024), args.seed)
+    megabytes: float = len(source) / (1024 * 1024)
+    print(f"{'scanner':<12} {'median s':>9} {'min s':>9} {'MB/s':>9}")
+    for name in args.scanner or list(scanners):
+        times: list[float] = time_scanner(scanners[name], source, args.runs)
+        median: float = statistics.median(times)
+        print(f"{name:<12} {median:>9.4f} {min(times):>9.4f} {megabytes / median:>9.2f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+from array import array
+from enum import IntEnum, auto
+
+from tokenclass import Token
+
+
+class OpCode(IntEnum):
+    CONSTANT = auto()
+    NIL = auto()
+    TRUE = auto()
+    FALSE = auto()
+    POP = auto()
+    GET_LOCAL = auto()
+    SET_LOCAL = auto()
+    GET_GLOBAL = auto()
+    DEFINE_GLOBAL = auto()
+    SET_GLOBAL = auto()
+    GET_UPVALUE = auto()
+    SET_UPVALUE = auto()
+    GET_PROPERTY = auto()
+    SET_PROPERTY = auto()
+    GET_SUPER = auto()
+    GET_METHOD = auto()
+    GET_SUPER_METHOD = auto()
+    EQUAL = auto()
+    NOT_EQUAL = auto()
+    GREATER = auto()
+    GREATER_EQUAL = auto()
+    LESS = auto()
+    LESS_EQUAL = auto()
+    ADD = auto()
+    SUBTRACT = auto()
+    MULTIPLY = auto()
+    DIVIDE = auto()
+    MODULO = auto()
+    POWER = auto()
+    NOT = auto()
+    NEGATE = auto()
+    PRINT = auto()
+    JUMP = auto()
+    JUMP_IF_FALSE = auto()
+    POP_JUMP_IF_FALSE = auto()
+    LOOP = auto()
+    # The VM tells calls from all other instructions by their range, so these have to stay together
+    CALL = auto()
+    INVOKE = auto()
+    CALL_METHOD = auto()
+    CLOSURE = auto()
+    CLOSE_UPVALUE = auto()
+    RETURN = auto()
+    CLASS = auto()
+    INHERIT = auto()
+    METHOD = auto()
+
+
+# Unlike clox, which uses a byte per opcode and packs operands into one or two bytes, the chunk stores "wordcode": every
+# opcode and every operand is a single unsigned 32-bit word. Decoding an operand is then a plain index instead of
+# shifting bytes together, which matters a lot more in Python than the extra memory does
+class Chunk:
+    def __init__(self):
+        self.code: array = array("I")
+        self.constants: list[object] = []
+        # The source token every code word was emitted for, so that runtime errors report the same token (and thus
+        # the same line) as the tree-walking interpreter does. clox only keeps the line numbers
+        self.tokens: list[Token] = []
+        self.__constant_indices: dict[tuple[type, object], int] = {}
+
+    def write(self, word: int, token: Token) -> None:
+        self.code.append(word)
+        self.tokens.append(token)
+
+    def add_constant(self, value: object) -> int:
+        # Literals are deduplicated, but tokens (used as names) are not: every use site keeps its own token, so that
+        # errors mention the right line. Numbers are told apart by their representation, since 0 == -0 and NaN != NaN
+        key: tuple[type, object] | None = None if isinstance(value, Token) else (type(value), repr(value))
+        if key is not None and (index := self.__constant_indices.get(key)) is not None:
+            return index
+
+        self.constants.append(value)
+        index: int = len(self.constants) - 1
+        if key is not None:
+            self.__constant_indices[key] = index
+
+        return index
+
+
+__all__ = ["Chunk", "OpCode"]
@@ -0,0 +1,660 @@
+from math import nan
+from typing import Callable
+
+from environment import *
+from errors import LoxRuntimeError, LoxFunctionError
+from expr import *
+from interpreter import *
+from lox_callable import LoxCallable
+from lox_class import *
+from lox_function import LoxFunction
+from lox_value import *
+from resolver import FunctionLayout, VariableKind
+from return_class import *
+from stmt import *
+from tokenclass import *
+
+# Every node is compiled exactly once into one of these. Both take the frame of the call the node runs in, expressions
+# return their value, statements return nothing
+Evaluator = Callable[[list[object]], object]
+Executor = Callable[[list[object]], None]
+
+
+class ClosureCompiler(ExprVisitor, StmtVisitor):
+    def __init__(self, interpreter, locations: dict[object, tuple[VariableKind, int]],
+                 functions: dict[FunctionStmt, FunctionLayout], bodies: dict[int, tuple[list[Stmt], Executor]],
+                 tail_calls: set[CallExpr]):
+        self.__interpreter = interpreter
+        self.__globals: GlobalEnvironment = interpreter.globals
+        self.__locations: dict[object, tuple[VariableKind, int]] = locations
+        self.__functions: dict[FunctionStmt, FunctionLayout] = functions
+        self.__bodies: dict[int, tuple[list[Stmt], Executor]] = bodies
+        self.__tail_calls: set[CallExpr] = tail_calls
+
+        self.__binary_compilers: dict[TokenType, Callable[[Token, Evaluator, Evaluator], Evaluator]] = {
+            TokenType.MINUS: self.__binary_minus,
+            TokenType.PLUS: self.__binary_plus,
+            TokenType.SLASH: self.__binary_slash,
+            TokenType.STAR: self.__binary_star,
+            TokenType.CARET: self.__binary_caret,
+            TokenType.PERCENT: self.__binary_percent,
+            TokenType.GREATER: self.__binary_gtr,
+            TokenType.GREATER_EQUAL: self.__binary_geq,
+            TokenType.LESS: self.__binary_less,
+            TokenType.LESS_EQUAL: self.__binary_leq,
+            TokenType.BANG_EQUAL: lambda _, left, right: lambda frame: not is_equal(left(frame), right(frame)),
+            TokenType.EQUAL_EQUAL: lambda _, left, right: lambda frame: is_equal(left(frame), right(frame))
+        }
+
+    def compile_expression(self, expr: Expr) -> Evaluator:
+        return expr.accept(self)
+
+    def compile_statement(self, stmt: Stmt) -> Executor:
+        return stmt.accept(self)
+
+    def compile_statements(self, statements: list[Stmt]) -> Executor:
+        executors: tuple[Executor, ...] = tuple(self.compile_statement(statement) for statement in statements)
+
+        match executors:
+            case ():
+                return lambda frame: None
+            case (only,):
+                return only
+            case (first, second):
+                def execute_two(frame: list[object]) -> Return | None:
+                    if first(frame) is RETURN:
+                        return RETURN
+                    return second(frame)
+                return execute_two
+
+        def execute_all(frame: list[object]) -> Return | None:
+            for executor in executors:
+                if executor(frame) is RETURN:
+                    return RETURN
+        return execute_all
+
+    def visit_assign_expr(self, expr: AssignExpr) -> Evaluator:
+        value: Evaluator = self.compile_expression(expr.value)
+        name: str = expr.name.lexeme
+
+        match self.__locations.get(expr):
+            case (VariableKind.LOCAL, slot):
+                def assign_local(frame: list[object]) -> object:
+                    frame[slot] = result = value(frame)
+                    return result
+                return assign_local
+            case (VariableKind.CELL, slot):
+                def assign_cell(frame: list[object]) -> object:
+                    frame[slot].value = result = value(frame)
+                    return result
+                return assign_cell
+            case (VariableKind.UPVALUE, index):
+                def assign_upvalue(frame: list[object]) -> object:
+                    frame[-1][index].value = result = value(frame)
+                    return result
+                return assign_upvalue
+
+        global_values: dict[str, object] = self.__globals.values
+        token: Token = expr.name
+
+        def assign_global(frame: list[object]) -> object:
+            result: object = value(frame)
+            if name not in global_values:
+                raise LoxRuntimeError(token, f"Undefined variable '{name}'.")
+            global_values[name] = result
+            return result
+        return assign_global
+
+    def visit_binary_expr(self, expr: BinaryExpr) -> Evaluator:
+        return self.__binary_compilers[expr.operator.type](
+            expr.operator, self.compile_expression(expr.left), self.compile_expression(expr.right))
+
+    # Call sites, property gets and sets all keep a monomorphic inline cache in their closure: the last function called
+    # (known to take the right number of arguments) or the last instance shape seen, along with where the property was
+    # found for it. A shape fixes both the fields and the class of an instance, so a shape hit is always a valid one
+    def visit_call_expr(self, expr: CallExpr) -> Evaluator:
+        interpreter = self.__interpreter
+        arguments: tuple[Evaluator, ...] = tuple(self.compile_expression(argument) for argument in expr.arguments)
+        paren: Token = expr.paren
+        arg_no: int = len(arguments)
+        # A placeholder no callee can be, since even nil has to go through the checks
+        cached_function: object = object()
+        # Lox functions called in tail position are left to the run_tail_calls loop of the function returning
+        tail: bool = expr in self.__tail_calls
+
+        def call_value(function: object, values: list[object]) -> object:
+            nonlocal cached_function
+
+            if function is not cached_function:
+                if not isinstance(function, LoxCallable):
+                    raise LoxRuntimeError(paren, "Can only call functions and classes.")
+                if arg_no != (arity := function.arity()):
+                    raise LoxRuntimeError(paren, f"Expected {arity} arguments but got {arg_no}.")
+                cached_function = function
+
+            if tail and type(function) is LoxFunction:
+                return TailCall(function, function.this, values)
+
+            try:
+                return function.call(interpreter, values)
+            except LoxFunctionError as err:
+                raise LoxRuntimeError(paren, f"in function {err.function}: {err.message}.")
+
+        if isinstance(expr.callee, GetExpr):
+            return self.__invoke(expr.callee, arguments, paren, call_value, tail)
+
+        callee: Evaluator = self.compile_expression(expr.callee)
+        return lambda frame: call_value(callee(frame), [argument(frame) for argument in arguments])
+
+    def visit_get_expr(self, expr: GetExpr) -> Evaluator:
+        obj: Evaluator = self.compile_expression(expr.obj)
+        name: Token = expr.name
+        lexeme: str = name.lexeme
+        cached_shape: Shape | None = None
+        cached_index: int | None = None
+        cached_method: LoxFunction | None = None
+
+        def get(frame: list[object]) -> object:
+            nonlocal cached_shape, cached_index, cached_method
+
+            instance: object = obj(frame)
+            if not isinstance(instance, LoxInstance):
+                raise LoxRuntimeError(name, "Only instances have properties.")
+
+            if instance.shape is not cached_shape:
+                cached_shape = instance.shape
+                cached_index = cached_shape.offsets.get(lexeme)
+                cached_method = None if cached_index is not None else instance.klass.find_method(lexeme)
+
+            if cached_index is not None:
+                return instance.values[cached_index]
+            if cached_method is None:
+                raise LoxRuntimeError(name, f"Undefined property '{lexeme}'.")
+
+            return cached_method.bind(instance)
+        return get
+
+    # Groupings only exist for the parser's sake, so they disappear entirely
+    def visit_grouping_expr(self, expr: GroupingExpr) -> Evaluator:
+        return self.compile_expression(expr.expression)
+
+    def visit_literal_expr(self, expr: LiteralExpr) -> Evaluator:
+        value: object = expr.value
+        return lambda frame: value
+
+    def visit_logical_expr(self, expr: LogicalExpr) -> Evaluator:
+        left: Evaluator = self.compile_expression(expr.left)
+        right: Evaluator = self.compile_expression(expr.right)
+
+        if expr.operator.type == TokenType.OR:
+            def logical_or(frame: list[object]) -> object:
+                value: object = left(frame)
+                return value if is_truthy(value) else right(frame)
+            return logical_or
+
+        def logical_and(frame: list[object]) -> object:
+            value: object = left(frame)
+            return right(frame) if is_truthy(value) else value
+        return logical_and
+
+    def visit_set_expr(self, expr: SetExpr) -> Evaluator:
+        obj: Evaluator = self.compile_expression(expr.obj)
+        value: Evaluator = self.compile_expression(expr.value)
+        name: Token = expr.name
+
+        lexeme: str = name.lexeme
+        cached_shape: Shape | None = None
+        # Either the index of an existing field, or the shape to move to when adding it
+        cached_index: int | None = None
+        cached_transition: Shape | None = None
+
+        def set_field(frame: list[object]) -> object:
+            nonlocal cached_shape, cached_index, cached_transition
+
+            instance: object = obj(frame)
+            if not isinstance(instance, LoxInstance):
+                raise LoxRuntimeError(name, "Only instances have fields.")
+
+            # The value can add fields to the instance itself, so the shape is only checked once it's evaluated
+            result: object = value(frame)
+            if instance.shape is not cached_shape:
+                cached_shape = instance.shape
+                cached_index = cached_shape.offsets.get(lexeme)
+                cached_transition = None if cached_index is not None else cached_shape.with_field(lexeme)
+
+            if cached_index is not None:
+                instance.values[cached_index] = result
+            else:
+                instance.shape = cached_transition
+                instance.values.append(result)
+            return result
+        return set_field
+
+    def visit_super_expr(self, expr: SuperExpr) -> Evaluator:
+        superclass_value: Evaluator = self.__local(self.__locations[expr])
+        this_value: Evaluator = self.__local(self.__locations[expr, "this"])
+        method_name: Token = expr.method
+
+        def super_method(frame: list[object]) -> object:
+            superclass: LoxClass = superclass_value(frame)
+            obj: LoxInstance = this_value(frame)
+            method: LoxFunction | None = superclass.find_method(method_name.lexeme)
+
+            if method is None:
+                raise LoxRuntimeError(method_name, f"Undefined property '{method_name.lexeme}'.")
+
+            return method.bind(obj)
+        return super_method
+
+    def visit_this_expr(self, expr: ThisExpr) -> Evaluator:
+        return self.__variable(expr.keyword, expr)
+
+    def visit_unary_expr(self, expr: UnaryExpr) -> Evaluator:
+        right: Evaluator = self.compile_expression(expr.right)
+        operator: Token = expr.operator
+
+        if operator.type == TokenType.BANG:
+            return lambda frame: not is_truthy(right(frame))
+
+        def negate(frame: list[object]) -> float:
+            value: object = right(frame)
+            if isinstance(value, float):
+                return -value
+
+            raise LoxRuntimeError(operator, "Operand must be a number.")
+        return negate
+
+    def visit_variable_expr(self, expr: VariableExpr) -> Evaluator:
+        return self.__variable(expr.name, expr)
+
+    def visit_block_stmt(self, stmt: BlockStmt) -> Executor:
+        # Block scoped locals have slots of their own in the frame, so a block needs nothing but its statements run
+        return self.compile_statements(stmt.statements)
+
+    def visit_class_stmt(self, stmt: ClassStmt) -> Executor:
+        superclass_value: Evaluator | None = \
+            None if stmt.superclass is None else self.compile_expression(stmt.superclass)
+        name: str = stmt.name.lexeme
+        define: Callable[[list[object], object], None] = self.__definition(stmt, name)
+        initialize: Callable[[list[object], object], None] = self.__initialization(stmt, name)
+        define_super: Callable[[list[object], object], None] | None = \
+            None if stmt.superclass is None else self.__definition((stmt, "super"), "super")
+        methods: list[tuple[Callable[[list[object]], LoxFunction], str]] = \
+            [(self.__function(method, method.name.lexeme == "init"), method.name.lexeme) for method in stmt.methods]
+
+        def define_class(frame: list[object]) -> None:
+            superclass: object | None = None
+            if superclass_value is not None:
+                superclass = superclass_value(frame)
+                if not isinstance(superclass, LoxClass):
+                    raise LoxRuntimeError(stmt.superclass.name, "Superclass must be a class.")
+
+            define(frame, None)
+            if superclass is not None:
+                define_super(frame, superclass)
+
+            initialize(frame, LoxClass(name, superclass, {method_name: method(frame) for method, method_name in methods}))
+        return define_class
+
+    def visit_expression_stmt(self, stmt: ExpressionStmt) -> Executor:
+        # The value of an expression statement is simply dropped, so the evaluator can serve as the executor as is
+        return self.compile_expression(stmt.expression)
+
+    def visit_function_stmt(self, stmt: FunctionStmt) -> Executor:
+        function: Callable[[list[object]], LoxFunction] = self.__function(stmt, False)
+        define: Callable[[list[object], object], None] = self.__definition(stmt, stmt.name.lexeme)
+
+        match self.__locations.get(stmt):
+            case (VariableKind.CELL, slot):
+                # Declared before the function is created, in case it captures itself
+                def define_captured_function(frame: list[object]) -> None:
+                    frame[slot] = cell = Cell(None)
+                    cell.value = function(frame)
+                return define_captured_function
+
+        return lambda frame: define(frame, function(frame))
+
+    def visit_if_stmt(self, stmt: IfStmt) -> Executor:
+        condition: Evaluator = self.compile_expression(stmt.condition)
+        if_clause: Executor = self.compile_statement(stmt.if_clause)
+
+        if stmt.else_clause is None:
+            def if_then(frame: list[object]) -> Return | None:
+                if is_truthy(condition(frame)):
+                    return if_clause(frame)
+            return if_then
+
+        else_clause: Executor = self.compile_statement(stmt.else_clause)
+
+        def if_then_else(frame: list[object]) -> Return | None:
+            if is_truthy(condition(frame)):
+                return if_clause(frame)
+            return else_clause(frame)
+        return if_then_else
+
+    def visit_print_stmt(self, stmt: PrintStmt) -> Executor:
+        value: Evaluator = self.compile_expression(stmt.expression)
+        return lambda frame: print(stringify(value(frame)))
+
+    def visit_return_stmt(self, stmt: ReturnStmt) -> Executor:
+        value: Evaluator | None = None if stmt.value is None else self.compile_expression(stmt.value)
+
+        if value is None:
+            def return_nil(frame: list[object]) -> Return:
+                frame.append(None)
+                return RETURN
+            return return_nil
+
+        # The value goes on the end of the frame (which is dropped as soon as the call is over) for the call to pick up
+        def return_value(frame: list[object]) -> Return:
+            frame.append(value(frame))
+            return RETURN
+        return return_value
+
+    def visit_var_stmt(self, stmt: VarStmt) -> Executor:
+        initializer: Evaluator | None = None if stmt.initializer is None else self.compile_expression(stmt.initializer)
+
+        if initializer is None:
+            define: Callable[[list[object], object], None] = self.__definition(stmt, stmt.name.lexeme)
+            return lambda frame: define(frame, None)
+
+        match self.__locations.get(stmt):
+            case (VariableKind.LOCAL, slot):
+                def define_local(frame: list[object]) -> None:
+                    frame[slot] = initializer(frame)
+                return define_local
+            case (VariableKind.CELL, slot):
+                def define_cell(frame: list[object]) -> None:
+                    frame[slot] = Cell(initializer(frame))
+                return define_cell
+
+        global_values: dict[str, object] = self.__globals.values
+        name: str = stmt.name.lexeme
+
+        def define_global(frame: list[object]) -> None:
+            global_values[name] = initializer(frame)
+        return define_global
+
+    def visit_while_stmt(self, stmt: WhileStmt) -> Executor:
+        condition: Evaluator = self.compile_expression(stmt.condition)
+        body: Executor = self.compile_statement(stmt.body)
+
+        def loop(frame: list[object]) -> Return | None:
+            while is_truthy(condition(frame)):
+                if body(frame) is RETURN:
+                    return RETURN
+        return loop
+
+    # A method called right away is invoked on the instance directly, without binding it first. Fields shadow methods,
+    # so a field holding a function is just called as any other value
+    def __invoke(self, callee: GetExpr, arguments: tuple[Evaluator, ...], paren: Token,
+                 call_value: Callable[[object, list[object]], object], tail: bool) -> Evaluator:
+        interpreter = self.__interpreter
+        obj: Evaluator = self.compile_expression(callee.obj)
+        name: Token = callee.name
+        lexeme: str = name.lexeme
+        arg_no: int = len(arguments)
+        # Only shapes without such a field get cached, so a hit always means a method call
+        cached_shape: Shape | None = None
+        cached_method: LoxFunction | None = None
+
+        def invoke(frame: list[object]) -> object:
+            nonlocal cached_shape, cached_method
+
+            instance: object = obj(frame)
+            if not isinstance(instance, LoxInstance):
+                raise LoxRuntimeError(name, "Only instances have properties.")
+
+            if instance.shape is cached_shape:
+                if tail:
+                    return TailCall(cached_method, instance, [argument(frame) for argument in arguments])
+                return cached_method.invoke(interpreter, instance, [argument(frame) for argument in arguments])
+
+            index: int | None = instance.shape.offsets.get(lexeme)
+            if index is not None:
+                return call_value(instance.values[index], [argument(frame) for argument in arguments])
+
+            method: LoxFunction | None = instance.klass.find_method(lexeme)
+            if method is None:
+                raise LoxRuntimeError(name, f"Undefined property '{lexeme}'.")
+
+            values: list[object] = [argument(frame) for argument in arguments]
+            if arg_no != (arity := method.arity()):
+                raise LoxRuntimeError(paren, f"Expected {arity} arguments but got {arg_no}.")
+
+            cached_shape, cached_method = instance.shape, method
+            return TailCall(method, instance, values) if tail else method.invoke(interpreter, instance, values)
+        return invoke
+
+    # LoxFunction runs its body through Interpreter.execute_function, so the compiled body is looked up by the identity
+    # of the statement list. The list itself is stored alongside to keep it alive, so that its id can't be reused
+    def __function(self, stmt: FunctionStmt, is_initializer: bool) -> Callable[[list[object]], LoxFunction]:
+        self.__bodies[id(stmt.body)] = (stmt.body, self.compile_statements(stmt.body))
+        layout: FunctionLayout = self.__functions[stmt]
+
+        if len(layout.upvalues) == 0:
+            return lambda frame: LoxFunction(stmt, layout, [], is_initializer)
+
+        def make_function(frame: list[object]) -> LoxFunction:
+            upvalues: list[Cell] = frame[-1]
+            return LoxFunction(stmt, layout, [frame[index] if is_local else upvalues[index]
+                                              for is_local, index in layout.upvalues], is_initializer)
+        return make_function
+
+    # Declarations the resolver knows nothing about are globals. Captured locals get a fresh Cell every time their
+    # declaration runs, so every loop iteration still gets its own variable
+    def __definition(self, declaration: object, name: str) -> Callable[[list[object], object], None]:
+        match self.__locations.get(declaration):
+            case (VariableKind.LOCAL, slot):
+                def define_local(frame: list[object], value: object) -> None:
+                    frame[slot] = value
+                return define_local
+            case (VariableKind.CELL, slot):
+                def define_cell(frame: list[object], value: object) -> None:
+                    frame[slot] = Cell(value)
+                return define_cell
+
+        global_values: dict[str, object] = self.__globals.values
+
+        def define_global(frame: list[object], value: object) -> None:
+            global_values[name] = value
+        return define_global
+
+    def __initialization(self, declaration: object, name: str) -> Callable[[list[object], object], None]:
+        match self.__locations.get(declaration):
+            case (VariableKind.CELL, slot):
+                def initialize_cell(frame: list[object], value: object) -> None:
+                    frame[slot].value = value
+                return initialize_cell
+
+        return self.__definition(declaration, name)
+
+    def __variable(self, name: Token, expr: Expr) -> Evaluator:
+        lexeme: str = name.lexeme
+        location: tuple[VariableKind, int] | None = self.__locations.get(expr)
+
+        if location is not None:
+            return self.__local(location)
+
+        global_values: dict[str, object] = self.__globals.values
+
+        def global_variable(frame: list[object]) -> object:
+            try:
+                return global_values[lexeme]
+            except KeyError:
+                raise LoxRuntimeError(name, f"Undefined variable '{lexeme}'.")
+        return global_variable
+
+    def __local(self, location: tuple[VariableKind, int]) -> Evaluator:
+        match location:
+            case (VariableKind.LOCAL, slot):
+                return lambda frame: frame[slot]
+            case (VariableKind.CELL, slot):
+                return lambda frame: frame[slot].value
+            case (VariableKind.UPVALUE, index):
+                return lambda frame: frame[-1][index].value
+
+    # Operator compilers: the operand type checks are inlined into every specialised closure
+
+    @staticmethod
+    def __binary_plus(operator: Token, left: Evaluator, right: Evaluator) -> Evaluator:
+        def plus(frame: list[object]) -> float | str:
+            a: object = left(frame)
+            b: object = right(frame)
+            if isinstance(a, float) and isinstance(b, float):
+                return a + b
+            if isinstance(a, str) and isinstance(b, str):
+                return a + b
+
+            raise LoxRuntimeError(operator, "Operands must be two numbers or two strings.")
+        return plus
+
+    @staticmethod
+    def __binary_minus(operator: Token, left: Evaluator, right: Evaluator) -> Evaluator:
+        def minus(frame: list[object]) -> float:
+            a: object = left(frame)
+            b: object = right(frame)
+            if isinstance(a, float) and isinstance(b, float):
+                return a - b
+
+            raise LoxRuntimeError(operator, "Operands must be numbers.")
+        return minus
+
+    @staticmethod
+    def __binary_slash(operator: Token, left: Evaluator, right: Evaluator) -> Evaluator:
+        def slash(frame: list[object]) -> float:
+            a: object = left(frame)
+            b: object = right(frame)
+            if isinstance(a, float) and isinstance(b, float):
+                # 0/0 is NaN, just like in the interpreter
+                return nan if a == b == 0 else a / b
+
+            raise LoxRuntimeError(operator, "Operands must be numbers.")
+        return slash
+
+    @staticmethod
+    def __binary_star(operator: Token, left: Evaluator, right: Evaluator) -> Evaluator:
+        def star(frame: list[object]) -> float:
+            a: object = left(frame)
+            b: object = right(frame)
+            if isinstance(a, float) and isinstance(b, float):
+                return a * b
+
+            raise LoxRuntimeError(operator, "Operands must be numbers.")
+        return star
+
+    @staticmethod
+    def __binary_caret(operator: Token, left: Evaluator, right: Evaluator) -> Evaluator:
+        def caret(frame: list[object]) -> float:
+            a: object = left(frame)
+            b: object = right(frame)
+            if isinstance(a, float) and isinstance(b, float):
+                return a ** b
+
+            raise LoxRuntimeError(operator, "Operands must be numbers.")
+        return caret
+
+    @staticmethod
+    def __binary_percent(operator: Token, left: Evaluator, right: Evaluator) -> Evaluator:
+        def percent(frame: list[object]) -> float:
+            a: object = left(frame)
+            b: object = right(frame)
+            if isinstance(a, float) and isinstance(b, float):
+                return a % b
+
+            raise LoxRuntimeError(operator, "Operands must be numbers.")
+        return percent
+
+    @staticmethod
+    def __binary_gtr(operator: Token, left: Evaluator, right: Evaluator) -> Evaluator:
+        def gtr(frame: list[object]) -> bool:
+            a: object = left(frame)
+            b: object = right(frame)
+            if isinstance(a, float) and isinstance(b, float):
+                return a > b
+
+            raise LoxRuntimeError(operator, "Operands must be numbers.")
+        return gtr
+
+    @staticmethod
+    def __binary_geq(operator: Token, left: Evaluator, right: Evaluator) -> Evaluator:
+        def geq(frame: list[object]) -> bool:
+            a: object = left(frame)
+            b: object = right(frame)
+            if isinstance(a, float) and isinstance(b, float):
+                return a >= b
+
+            raise LoxRuntimeError(operator, "Operands must be numbers.")
+        return geq
+
+    @staticmethod
+    def __binary_less(operator: Token, left: Evaluator, right: Evaluator) -> Evaluator:
+        def less(frame: list[object]) -> bool:
+            a: object = left(frame)
+            b: object = right(frame)
+            if isinstance(a, float) and isinstance(b, float):
+                return a < b
+
+            raise LoxRuntimeError(operator, "Operands must be numbers.")
+        return less
+
+    @staticmethod
+    def __binary_leq(operator: Token, left: Evaluator, right: Evaluator) -> Evaluator:
+        def leq(frame: list[object]) -> bool:
+            a: object = left(frame)
+            b: object = right(frame)
+            if isinstance(a, float) and isinstance(b, float):
+                return a <= b
+
+            raise LoxRuntimeError(operator, "Operands must be numbers.")
+        return leq
+
+
+class ClosureInterpreter(Interpreter):
+    def __init__(self, lox_main):
+        super().__init__(lox_main)
+        self.__lox_main = lox_main
+        self.__locations: dict[object, tuple[VariableKind, int]] = {}
+        self.__functions: dict[FunctionStmt, FunctionLayout] = {}
+        self.__bodies: dict[int, tuple[list[Stmt], Executor]] = {}
+        self.__tail_calls: set[CallExpr] = set()
+        self.__compiler: ClosureCompiler = ClosureCompiler(self, self.__locations, self.__functions, self.__bodies,
+                                                           self.__tail_calls)
+        self.__script_frame_size: int = 0
+
+    def interpret(self, statements: list[Stmt], mode: OpMode) -> None:
+        executors: list[Executor] = []
+        for statement in statements:
+            if mode == OpMode.INTERACTIVE and isinstance(statement, ExpressionStmt):
+                value: Evaluator = self.__compiler.compile_expression(statement.expression)
+                executors.append(lambda frame, value=value: print(stringify(value(frame))))
+            else:
+                executors.append(self.__compiler.compile_statement(statement))
+
+        frame: list[object] = [None] * self.__script_frame_size + [[]]
+
+        try:
+            for executor in executors:
+                executor(frame)
+        except LoxRuntimeError as err:
+            self.__lox_main.runtime_error(err)
+
+    # The upvalues go in the frame's last slot, past the locals, so there's no interpreter state to restore on return
+    def execute_function(self, statements: list[Stmt], frame: list[object], upvalues: list[Cell]) -> object:
+        frame.append(upvalues)
+        return frame[-1] if self.__bodies[id(statements)][1](frame) is RETURN else None
+
+    def resolve(self, node: object, kind: VariableKind, index: int) -> None:
+        self.__locations[node] = (kind, index)
+
+    def resolve_function(self, function: FunctionStmt, layout: FunctionLayout) -> None:
+        self.__functions[function] = layout
+
+    def resolve_script(self, frame_size: int) -> None:
+        self.__script_frame_size = frame_size
+
+    def resolve_tail_call(self, expr: CallExpr) -> None:
+        self.__tail_calls.add(expr)
+
+
+__all__ = ["ClosureInterpreter"]
@@ -0,0 +1,441 @@
+from enum import Enum, auto
+
+from bytecode import *
+from expr import *
+from stmt import *
+from tokenclass import *
+
+
+class FunctionKind(Enum):
+    SCRIPT = auto()
+    FUNCTION = auto()
+    INITIALIZER = auto()
+    METHOD = auto()
+
+
+class Function:
+    def __init__(self, name: str):
+        self.name: str = name
+        self.arity: int = 0
+        self.upvalue_count: int = 0
+        self.chunk: Chunk = Chunk()
+
+    def __str__(self) -> str:
+        return "<script>" if self.name == "" else f"<fn {self.name}>"
+
+
+class Local:
+    def __init__(self, name: str, depth: int):
+        self.name: str = name
+        # -1 marks a variable that has been declared, but whose initializer hasn't been compiled yet
+        self.depth: int = depth
+        self.is_captured: bool = False
+
+
+class FunctionState:
+    def __init__(self, enclosing, function: Function, kind: FunctionKind):
+        self.enclosing: FunctionState | None = enclosing
+        self.function: Function = function
+        self.kind: FunctionKind = kind
+        self.upvalues: list[tuple[bool, int]] = []
+        self.scope_depth: int = 0
+
+        # Slot zero holds the callee itself, or "this" inside of methods, just like in clox
+        self.locals: list[Local] = [Local("this" if kind in (FunctionKind.INITIALIZER, FunctionKind.METHOD) else "", 0)]
+
+
+class ClassState:
+    def __init__(self, enclosing):
+        self.enclosing: ClassState | None = enclosing
+        self.has_superclass: bool = False
+
+
+# The compiler relies on the resolver having already rejected all the invalid programs (returns at top level, "this"
+# outside of classes, etc.), so it never reports any errors itself and only has to find out where variables live
+class Compiler(ExprVisitor, StmtVisitor):
+    def __init__(self):
+        self.__state: FunctionState | None = None
+        self.__class: ClassState | None = None
+        # The token every emitted code word is attributed to (for runtime error reporting)
+        self.__token: Token | None = None
+
+        self.__binary_opcodes: dict[TokenType, OpCode] = {
+            TokenType.MINUS: OpCode.SUBTRACT,
+            TokenType.PLUS: OpCode.ADD,
+            TokenType.SLASH: OpCode.DIVIDE,
+            TokenType.STAR: OpCode.MULTIPLY,
+            TokenType.CARET: OpCode.POWER,
+            TokenType.PERCENT: OpCode.MODULO,
+            TokenType.GREATER: OpCode.GREATER,
+            TokenType.GREATER_EQUAL: OpCode.GREATER_EQUAL,
+            TokenType.LESS: OpCode.LESS,
+            TokenType.LESS_EQUAL: OpCode.LESS_EQUAL,
+            TokenType.BANG_EQUAL: OpCode.NOT_EQUAL,
+            TokenType.EQUAL_EQUAL: OpCode.EQUAL
+        }
+
+    def compile(self, statements: list[Stmt], print_expressions: bool) -> Function:
+        self.__state = FunctionState(None, Function(""), FunctionKind.SCRIPT)
+
+        for statement in statements:
+            if print_expressions and isinstance(statement, ExpressionStmt):
+                self.__compile(statement.expression)
+                self.__emit(OpCode.PRINT)
+            else:
+                self.__compile(statement)
+
+        return self.__end_function()
+
+    def visit_assign_expr(self, expr: AssignExpr) -> None:
+        self.__compile(expr.value)
+        self.__named_variable(expr.name, True)
+
+    def visit_binary_expr(self, expr: BinaryExpr) -> None:
+        self.__compile(expr.left)
+        self.__compile(expr.right)
+
+        self.__token = expr.operator
+        self.__emit(self.__binary_opcodes[expr.operator.type])
+
+    # A method called right away isn't bound: INVOKE looks it up on the receiver below the arguments (where a field of
+    # the same name shadows it) and calls it with the receiver as "this", all in one instruction. That only happens
+    # once the arguments have been evaluated, though, so when evaluating them could fail or have effects, GET_METHOD
+    # and GET_SUPER_METHOD look the method up first and leave it right above its receiver (or a nil above the value of
+    # the field), for CALL_METHOD to call it
+    def visit_call_expr(self, expr: CallExpr) -> None:
+        if isinstance(expr.callee, GetExpr) and all(self.__is_inert(argument) for argument in expr.arguments):
+            self.__compile(expr.callee.obj)
+            for argument in expr.arguments:
+                self.__compile(argument)
+
+            self.__token = expr.callee.name
+            self.__emit(OpCode.INVOKE, self.__constant(expr.callee.name))
+            self.__token = expr.paren
+            self.__emit(len(expr.arguments))
+            return
+
+        call: OpCode = OpCode.CALL_METHOD
+        if isinstance(expr.callee, GetExpr):
+            self.__compile(expr.callee.obj)
+            self.__token = expr.callee.name
+            self.__emit(OpCode.GET_METHOD, self.__constant(expr.callee.name))
+        elif isinstance(expr.callee, SuperExpr):
+            self.__super_receiver(expr.callee)
+            self.__token = expr.callee.method
+            self.__emit(OpCode.GET_SUPER_METHOD, self.__constant(expr.callee.method))
+        else:
+            call = OpCode.CALL
+            self.__compile(expr.callee)
+
+        for argument in expr.arguments:
+            self.__compile(argument)
+
+        self.__token = expr.paren
+        self.__emit(call, len(expr.arguments))
+
+    def visit_get_expr(self, expr: GetExpr) -> None:
+        self.__compile(expr.obj)
+
+        self.__token = expr.name
+        self.__emit(OpCode.GET_PROPERTY, self.__constant(expr.name))
+
+    def visit_grouping_expr(self, expr: GroupingExpr) -> None:
+        self.__compile(expr.expression)
+
+    def visit_literal_expr(self, expr: LiteralExpr) -> None:
+        match expr.value:
+            case None: self.__emit(OpCode.NIL)
+            case True: self.__emit(OpCode.TRUE)
+            case False: self.__emit(OpCode.FALSE)
+            case _: self.__emit(OpCode.CONSTANT, self.__constant(expr.value))
+
+    def visit_logical_expr(self, expr: LogicalExpr) -> None:
+        self.__compile(expr.left)
+
+        if expr.operator.type == TokenType.OR:
+            else_jump: int = self.__emit_jump(OpCode.JUMP_IF_FALSE)
+            end_jump: int = self.__emit_jump(OpCode.JUMP)
+            self.__patch_jump(else_jump)
+        else:
+            end_jump: int = self.__emit_jump(OpCode.JUMP_IF_FALSE)
+
+        self.__emit(OpCode.POP)
+        self.__compile(expr.right)
+        self.__patch_jump(end_jump)
+
+    def visit_set_expr(self, expr: SetExpr) -> None:
+        self.__compile(expr.obj)
+        self.__compile(expr.value)
+
+        self.__token = expr.name
+        self.__emit(OpCode.SET_PROPERTY, self.__constant(expr.name))
+
+    def visit_super_expr(self, expr: SuperExpr) -> None:
+        self.__super_receiver(expr)
+
+        self.__token = expr.method
+        self.__emit(OpCode.GET_SUPER, self.__constant(expr.method))
+
+    def visit_this_expr(self, expr: ThisExpr) -> None:
+        self.__named_variable(expr.keyword, False)
+
+    def visit_unary_expr(self, expr: UnaryExpr) -> None:
+        self.__compile(expr.right)
+
+        self.__token = expr.operator
+        self.__emit(OpCode.NEGATE if expr.operator.type == TokenType.MINUS else OpCode.NOT)
+
+    def visit_variable_expr(self, expr: VariableExpr) -> None:
+        self.__named_variable(expr.name, False)
+
+    def visit_block_stmt(self, stmt: BlockStmt) -> None:
+        self.__begin_scope()
+        for statement in stmt.statements:
+            self.__compile(statement)
+        self.__end_scope()
+
+    def visit_class_stmt(self, stmt: ClassStmt) -> None:
+        self.__token = stmt.name
+        self.__declare_variable(stmt.name)
+        self.__emit(OpCode.CLASS, self.__constant(stmt.name.lexeme))
+        self.__define_variable(stmt.name)
+
+        self.__class = ClassState(self.__class)
+
+        if stmt.superclass is not None:
+            self.visit_variable_expr(stmt.superclass)
+
+            self.__begin_scope()
+            self.__add_local("super")
+            self.__mark_initialized()
+
+            self.__named_variable(stmt.name, False)
+            self.__token = stmt.superclass.name
+            self.__emit(OpCode.INHERIT)
+            self.__class.has_superclass = True
+
+        self.__named_variable(stmt.name, False)
+        for method in stmt.methods:
+            kind: FunctionKind = FunctionKind.INITIALIZER if method.name.lexeme == "init" else FunctionKind.METHOD
+            self.__function(method, kind)
+
+            self.__token = method.name
+            self.__emit(OpCode.METHOD, self.__constant(method.name.lexeme))
+        self.__emit(OpCode.POP)
+
+        if self.__class.has_superclass:
+            self.__end_scope()
+
+        self.__class = self.__class.enclosing
+
+    def visit_expression_stmt(self, stmt: ExpressionStmt) -> None:
+        # Constant folding leaves plenty of these behind, and pushing a literal only to pop it again does nothing
+        if isinstance(stmt.expression, LiteralExpr):
+            return
+
+        self.__compile(stmt.expression)
+        self.__emit(OpCode.POP)
+
+    def visit_function_stmt(self, stmt: FunctionStmt) -> None:
+        self.__declare_variable(stmt.name)
+        # Marking the function as initialized straight away allows it to refer to itself for recursion
+        self.__mark_initialized()
+        self.__function(stmt, FunctionKind.FUNCTION)
+        self.__define_variable(stmt.name)
+
+    def visit_if_stmt(self, stmt: IfStmt) -> None:
+        self.__compile(stmt.condition)
+
+        then_jump: int = self.__emit_jump(OpCode.POP_JUMP_IF_FALSE)
+        self.__compile(stmt.if_clause)
+        if stmt.else_clause is None:
+            self.__patch_jump(then_jump)
+            return
+
+        else_jump: int = self.__emit_jump(OpCode.JUMP)
+        self.__patch_jump(then_jump)
+        self.__compile(stmt.else_clause)
+        self.__patch_jump(else_jump)
+
+    def visit_print_stmt(self, stmt: PrintStmt) -> None:
+        self.__compile(stmt.expression)
+        self.__emit(OpCode.PRINT)
+
+    def visit_return_stmt(self, stmt: ReturnStmt) -> None:
+        self.__token = stmt.keyword
+        if stmt.value is None:
+            self.__emit_return()
+        else:
+            self.__compile(stmt.value)
+            self.__emit(OpCode.RETURN)
+
+    def visit_var_stmt(self, stmt: VarStmt) -> None:
+        self.__declare_variable(stmt.name)
+
+        if stmt.initializer is not None:
+            self.__compile(stmt.initializer)
+        else:
+            self.__emit(OpCode.NIL)
+
+        self.__define_variable(stmt.name)
+
+    def visit_while_stmt(self, stmt: WhileStmt) -> None:
+        loop_start: int = len(self.__chunk().code)
+        self.__compile(stmt.condition)
+
+        exit_jump: int = self.__emit_jump(OpCode.POP_JUMP_IF_FALSE)
+        self.__compile(stmt.body)
+        self.__emit(OpCode.LOOP, len(self.__chunk().code) + 2 - loop_start)
+
+        self.__patch_jump(exit_jump)
+
+    def __compile(self, target: Expr | Stmt) -> None:
+        target.accept(self)
+
+    def __function(self, stmt: FunctionStmt, kind: FunctionKind) -> None:
+        function: Function = Function(stmt.name.lexeme)
+        function.arity = len(stmt.params)
+
+        self.__state = FunctionState(self.__state, function, kind)
+        self.__begin_scope()
+
+        for param in stmt.params:
+            self.__add_local(param.lexeme)
+            self.__mark_initialized()
+
+        for statement in stmt.body:
+            self.__compile(statement)
+
+        self.__token = stmt.name
+        upvalues: list[tuple[bool, int]] = self.__state.upvalues
+        function = self.__end_function()
+
+        self.__emit(OpCode.CLOSURE, self.__constant(function))
+        for is_local, index in upvalues:
+            self.__emit(int(is_local), index)
+
+    def __end_function(self) -> Function:
+        self.__emit_return()
+
+        function: Function = self.__state.function
+        function.upvalue_count = len(self.__state.upvalues)
+        self.__state = self.__state.enclosing
+
+        return function
+
+    # Evaluating a literal or a local variable can neither fail nor have any effects
+    def __is_inert(self, expr: Expr) -> bool:
+        if isinstance(expr, LiteralExpr):
+            return True
+        if isinstance(expr, VariableExpr):
+            return self.__resolve_local(self.__state, expr.name.lexeme) is not None
+
+        return isinstance(expr, ThisExpr)
+
+    # Variables
+
+    def __named_variable(self, name: Token, assign: bool) -> None:
+        self.__token = name
+
+        if (slot := self.__resolve_local(self.__state, name.lexeme)) is not None:
+            self.__emit(OpCode.SET_LOCAL if assign else OpCode.GET_LOCAL, slot)
+        elif (slot := self.__resolve_upvalue(self.__state, name.lexeme)) is not None:
+            self.__emit(OpCode.SET_UPVALUE if assign else OpCode.GET_UPVALUE, slot)
+        else:
+            self.__emit(OpCode.SET_GLOBAL if assign else OpCode.GET_GLOBAL, self.__constant(name))
+
+    @staticmethod
+    def __resolve_local(state: FunctionState, name: str) -> int | None:
+        for i in range(len(state.locals) - 1, -1, -1):
+            if state.locals[i].name == name:
+                return i
+
+        return None
+
+    def __resolve_upvalue(self, state: FunctionState, name: str) -> int | None:
+        if state.enclosing is None:
+            return None
+
+        if (local := self.__resolve_local(state.enclosing, name)) is not None:
+            state.enclosing.locals[local].is_captured = True
+            return self.__add_upvalue(state, True, local)
+
+        if (upvalue := self.__resolve_upvalue(state.enclosing, name)) is not None:
+            return self.__add_upvalue(state, False, upvalue)
+
+        return None
+
+    @staticmethod
+    def __add_upvalue(state: FunctionState, is_local: bool, index: int) -> int:
+        upvalue: tuple[bool, int] = (is_local, index)
+        if upvalue in state.upvalues:
+            return state.upvalues.index(upvalue)
+
+        state.upvalues.append(upvalue)
+        return len(state.upvalues) - 1
+
+    def __add_local(self, name: str) -> None:
+        self.__state.locals.append(Local(name, -1))
+
+    def __declare_variable(self, name: Token) -> None:
+        if self.__state.scope_depth > 0:
+            self.__add_local(name.lexeme)
+
+    def __define_variable(self, name: Token) -> None:
+        if self.__state.scope_depth > 0:
+            self.__mark_initialized()
+            return
+
+        self.__token = name
+        self.__emit(OpCode.DEFINE_GLOBAL, self.__constant(name))
+
+    def __mark_initialized(self) -> None:
+        if self.__state.scope_depth > 0:
+            self.__state.locals[-1].depth = self.__state.scope_depth
+
+    def __begin_scope(self) -> None:
+        self.__state.scope_depth += 1
+
+    def __end_scope(self) -> None:
+        state: FunctionState = self.__state
+        state.scope_depth -= 1
+
+        while state.locals and state.locals[-1].depth > state.scope_depth:
+            self.__emit(OpCode.CLOSE_UPVALUE if state.locals[-1].is_captured else OpCode.POP)
+            state.locals.pop()
+
+    # Emitting code
+
+    def __chunk(self) -> Chunk:
+        return self.__state.function.chunk
+
+    def __constant(self, value: object) -> int:
+        return self.__chunk().add_constant(value)
+
+    def __super_receiver(self, expr: SuperExpr) -> None:
+        self.__named_variable(Token(TokenType.THIS, "this", None, expr.keyword.line), False)
+        self.__named_variable(Token(TokenType.SUPER, "super", None, expr.keyword.line), False)
+
+    def __emit(self, *words: int) -> None:
+        chunk: Chunk = self.__chunk()
+        for word in words:
+            chunk.write(word, self.__token)
+
+    def __emit_return(self) -> None:
+        if self.__state.kind == FunctionKind.INITIALIZER:
+            self.__emit(OpCode.GET_LOCAL, 0)
+        else:
+            self.__emit(OpCode.NIL)
+
+        self.__emit(OpCode.RETURN)
+
+    def __emit_jump(self, opcode: OpCode) -> int:
+        self.__emit(opcode, 0)
+        return len(self.__chunk().code) - 1
+
+    def __patch_jump(self, offset: int) -> None:
+        # The jump is relative to the word right after the operand
+        self.__chunk().code[offset] = len(self.__chunk().code) - offset - 1
+
+
+__all__ = ["Compiler", "Function"]
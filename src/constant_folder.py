@@ -0,0 +1,201 @@
+import operator
+from math import nan
+from typing import Callable
+
+from expr import *
+from lox_value import is_equal, is_truthy
+from stmt import *
+from tokenclass import TokenType
+
+
+class NotFoldable(Exception):
+    pass
+
+
+def number_operation(operation: Callable[[float, float], object]) -> Callable[[object, object], object]:
+    def fold(left: object, right: object) -> object:
+        if not isinstance(left, float) or not isinstance(right, float):
+            raise NotFoldable  # Leave the type error to be reported at runtime, with its line
+
+        try:
+            return operation(left, right)
+        except ArithmeticError:  # Division by zero or an overflow: whatever the backends do about it is up to them
+            raise NotFoldable from None
+
+    return fold
+
+
+def add(left: object, right: object) -> object:
+    if isinstance(left, float) and isinstance(right, float) or isinstance(left, str) and isinstance(right, str):
+        return left + right
+
+    raise NotFoldable
+
+
+# Java returns NaN for 0/0, while Python raises an error, so it's handled the same way the interpreter does
+def divide(left: float, right: float) -> float:
+    return nan if left == right == 0 else left / right
+
+
+def power(left: float, right: float) -> float:
+    result: float | complex = left ** right
+    if not isinstance(result, float):  # A negative number to a fractional power
+        raise NotFoldable
+    return result
+
+
+def negate(right: object) -> object:
+    if not isinstance(right, float):
+        raise NotFoldable
+    return -right
+
+
+binary_operations: dict[TokenType, Callable[[object, object], object]] = {
+    TokenType.PLUS: add,
+    TokenType.MINUS: number_operation(operator.sub),
+    TokenType.STAR: number_operation(operator.mul),
+    TokenType.SLASH: number_operation(divide),
+    TokenType.PERCENT: number_operation(operator.mod),
+    TokenType.CARET: number_operation(power),
+    TokenType.GREATER: number_operation(operator.gt),
+    TokenType.GREATER_EQUAL: number_operation(operator.ge),
+    TokenType.LESS: number_operation(operator.lt),
+    TokenType.LESS_EQUAL: number_operation(operator.le),
+    TokenType.EQUAL_EQUAL: is_equal,
+    TokenType.BANG_EQUAL: lambda left, right: not is_equal(left, right)
+}
+
+unary_operations: dict[TokenType, Callable[[object], object]] = {
+    TokenType.MINUS: negate,
+    TokenType.BANG: lambda right: not is_truthy(right)
+}
+
+
+# Runs between the parser and the resolver, evaluating the operators whose operands are all literals once and for all
+# and replacing them with the resulting literal, on every backend. Operations that would fail at runtime (on operands of
+# the wrong types, say) are left as they are, so that they still fail when (and if) they are run. Groupings only matter
+# to the parser, so they are dropped altogether. Statements are updated in place, expressions are replaced by the
+# result of visiting them. Logical operators that would throw away an operand which isn't a literal are only folded by
+# a second run, after the resolver, with short_circuit set, since whatever is thrown away has to be checked for static
+# errors first
+class ConstantFolder(ExprVisitor, StmtVisitor):
+    def __init__(self, short_circuit: bool = False):
+        self.__short_circuit: bool = short_circuit
+
+    def fold(self, statements: list[Stmt]) -> list[Stmt]:
+        for statement in statements:
+            statement.accept(self)
+
+        return statements
+
+    def visit_assign_expr(self, expr: AssignExpr) -> Expr:
+        expr.value = self.__fold(expr.value)
+        return expr
+
+    def visit_binary_expr(self, expr: BinaryExpr) -> Expr:
+        expr.left = self.__fold(expr.left)
+        expr.right = self.__fold(expr.right)
+
+        if isinstance(expr.left, LiteralExpr) and isinstance(expr.right, LiteralExpr):
+            try:
+                return LiteralExpr(binary_operations[expr.operator.type](expr.left.value, expr.right.value))
+            except NotFoldable:
+                pass
+
+        return expr
+
+    def visit_call_expr(self, expr: CallExpr) -> Expr:
+        expr.callee = self.__fold(expr.callee)
+        expr.arguments = [self.__fold(argument) for argument in expr.arguments]
+        return expr
+
+    def visit_get_expr(self, expr: GetExpr) -> Expr:
+        expr.obj = self.__fold(expr.obj)
+        return expr
+
+    def visit_grouping_expr(self, expr: GroupingExpr) -> Expr:
+        return self.__fold(expr.expression)
+
+    @staticmethod
+    def visit_literal_expr(expr: LiteralExpr) -> Expr:
+        return expr
+
+    # The left operand decides whether the right one is evaluated at all, so it's enough for it to be a literal: the
+    # expression is either the left literal or just the right operand
+    def visit_logical_expr(self, expr: LogicalExpr) -> Expr:
+        expr.left = self.__fold(expr.left)
+        expr.right = self.__fold(expr.right)
+
+        if isinstance(expr.left, LiteralExpr) and (self.__short_circuit or isinstance(expr.right, LiteralExpr)):
+            if is_truthy(expr.left.value) == (expr.operator.type == TokenType.OR):
+                return expr.left
+            return expr.right
+
+        return expr
+
+    def visit_set_expr(self, expr: SetExpr) -> Expr:
+        expr.obj = self.__fold(expr.obj)
+        expr.value = self.__fold(expr.value)
+        return expr
+
+    @staticmethod
+    def visit_super_expr(expr: SuperExpr) -> Expr:
+        return expr
+
+    @staticmethod
+    def visit_this_expr(expr: ThisExpr) -> Expr:
+        return expr
+
+    def visit_unary_expr(self, expr: UnaryExpr) -> Expr:
+        expr.right = self.__fold(expr.right)
+
+        if isinstance(expr.right, LiteralExpr):
+            try:
+                return LiteralExpr(unary_operations[expr.operator.type](expr.right.value))
+            except NotFoldable:
+                pass
+
+        return expr
+
+    @staticmethod
+    def visit_variable_expr(expr: VariableExpr) -> Expr:
+        return expr
+
+    def visit_block_stmt(self, stmt: BlockStmt) -> None:
+        self.fold(stmt.statements)
+
+    def visit_class_stmt(self, stmt: ClassStmt) -> None:
+        self.fold(stmt.methods)
+
+    def visit_expression_stmt(self, stmt: ExpressionStmt) -> None:
+        stmt.expression = self.__fold(stmt.expression)
+
+    def visit_function_stmt(self, stmt: FunctionStmt) -> None:
+        self.fold(stmt.body)
+
+    def visit_if_stmt(self, stmt: IfStmt) -> None:
+        stmt.condition = self.__fold(stmt.condition)
+        stmt.if_clause.accept(self)
+        if stmt.else_clause is not None:
+            stmt.else_clause.accept(self)
+
+    def visit_print_stmt(self, stmt: PrintStmt) -> None:
+        stmt.expression = self.__fold(stmt.expression)
+
+    def visit_return_stmt(self, stmt: ReturnStmt) -> None:
+        if stmt.value is not None:
+            stmt.value = self.__fold(stmt.value)
+
+    def visit_var_stmt(self, stmt: VarStmt) -> None:
+        if stmt.initializer is not None:
+            stmt.initializer = self.__fold(stmt.initializer)
+
+    def visit_while_stmt(self, stmt: WhileStmt) -> None:
+        stmt.condition = self.__fold(stmt.condition)
+        stmt.body.accept(self)
+
+    def __fold(self, expr: Expr) -> Expr:
+        return expr.accept(self)
+
+
+__all__ = ["ConstantFolder"]
@@ -0,0 +1,126 @@
+import json
+from typing import Callable, TextIO
+
+from environment import Cell, GlobalEnvironment
+from interpreter import Interpreter
+from lox_function import LoxFunction
+from lox_native import native_functions
+
+
+# Counts what the interpreter does while running: the nodes it visits (by type), the frames and cells it allocates, the
+# methods it binds, the returns it unwinds, its global and local variable lookups and its native calls. Like the
+# profiler, it swaps counting wrappers in for the methods doing these things while it is running, so the interpreter
+# doesn't test for it anywhere and runs unchanged when it's off. Nodes are only counted by the tree-walker, the only
+# backend visiting them at runtime; frames, cells, bound methods and natives are counted by the closures backend too
+class InterpreterCounters:
+    def __init__(self):
+        self.nodes: dict[str, int] = {}
+        self.frames: int = 0
+        self.cells: int = 0
+        self.bound_methods: int = 0
+        self.local_lookups: int = 0
+        self.global_lookups: int = 0
+        self.native_calls: int = 0
+        self.__originals: list[tuple[type, str, object | None]] = []
+
+    def start(self) -> None:
+        counters: InterpreterCounters = self
+
+        for name in dir(Interpreter):
+            if name.startswith("visit_"):
+                self.__patch(Interpreter, name, self.__counted_visit(name))
+
+        call = LoxFunction.call
+        invoke = LoxFunction.invoke
+        bind = LoxFunction.bind
+        cell_init = Cell.__init__
+        load = Interpreter._load
+        get_global = GlobalEnvironment.get
+
+        # Every call builds the callee's frame, either in call (through a value) or in invoke (a method called right away)
+        def counted_call(function: LoxFunction, interpreter, arguments: list[object]) -> object:
+            counters.frames += 1
+            return call(function, interpreter, arguments)
+
+        def counted_invoke(function: LoxFunction, interpreter, this: object | None, arguments: list[object]) -> object:
+            counters.frames += 1
+            return invoke(function, interpreter, this, arguments)
+
+        def counted_bind(function: LoxFunction, instance) -> LoxFunction:
+            counters.bound_methods += 1
+            return bind(function, instance)
+
+        def counted_cell_init(cell: Cell, value: object | None) -> None:
+            counters.cells += 1
+            cell_init(cell, value)
+
+        def counted_load(interpreter: Interpreter, location) -> object:
+            counters.local_lookups += 1
+            return load(interpreter, location)
+
+        def counted_get_global(environment: GlobalEnvironment, name) -> object:
+            counters.global_lookups += 1
+            return get_global(environment, name)
+
+        self.__patch(LoxFunction, "call", counted_call)
+        self.__patch(LoxFunction, "invoke", counted_invoke)
+        self.__patch(LoxFunction, "bind", counted_bind)
+        self.__patch(Cell, "__init__", counted_cell_init)
+        self.__patch(Interpreter, "_load", counted_load)
+        self.__patch(GlobalEnvironment, "get", counted_get_global)
+        for native in native_functions:
+            self.__patch(native, "call", self.__counted_native(native.call))
+
+    def stop(self) -> None:
+        for owner, name, original in reversed(self.__originals):
+            if original is None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+        self.__originals.clear()
+
+    def as_dict(self) -> dict[str, object]:
+        return {"nodes": dict(sorted(self.nodes.items(), key=lambda item: item[1], reverse=True)),
+                "frames": self.frames,
+                "cells": self.cells,
+                "bound_methods": self.bound_methods,
+                # Every executed return statement unwinds its function's body back to the call
+                "return_unwinds": self.nodes.get("ReturnStmt", 0),
+                "local_lookups": self.local_lookups,
+                "global_lookups": self.global_lookups,
+                "native_calls": self.native_calls}
+
+    def dump(self, file: TextIO) -> None:
+        json.dump(self.as_dict(), file, indent=2)
+        file.write("\n")
+
+    def __patch(self, owner: type, name: str, replacement: Callable) -> None:
+        self.__originals.append((owner, name, owner.__dict__.get(name)))
+        setattr(owner, name, replacement)
+
+    # visit_binary_expr counts BinaryExprs and so on
+    def __counted_visit(self, name: str) -> Callable:
+        node_type: str = "".join(word.capitalize() for word in name.removeprefix("visit_").split("_"))
+        visit: Callable = getattr(Interpreter, name)
+        nodes: dict[str, int] = self.nodes
+
+        if isinstance(Interpreter.__dict__[name], staticmethod):
+            def counted_visit(_: Interpreter, node) -> object:
+                nodes[node_type] = nodes.get(node_type, 0) + 1
+                return visit(node)
+        else:
+            def counted_visit(interpreter: Interpreter, node) -> object:
+                nodes[node_type] = nodes.get(node_type, 0) + 1
+                return visit(interpreter, node)
+
+        return counted_visit
+
+    def __counted_native(self, call: Callable) -> Callable:
+        def counted_call(native, interpreter, arguments: list[object]) -> object:
+            self.native_calls += 1
+            return call(native, interpreter, arguments)
+
+        return counted_call
+
+
+__all__ = ["InterpreterCounters"]
@@ -0,0 +1,102 @@
+from expr import LiteralExpr
+from lox_value import is_truthy
+from stmt import *
+
+
+# Runs after the resolver (so that the code it drops still gets checked for static errors), once constant folding has
+# turned whatever conditions it could into literals. It drops:
+# - the statements following one that never completes normally (a return, an if returning from both branches, a block
+#   holding either, or a while loop whose condition is always true, which only a return can leave), which can't run;
+# - ifs and whiles with literal conditions, replaced by the branch taken, if any;
+# - declarations of locals that are never used at all, as long as evaluating their initializer has no effect.
+# Statements are visited into their replacement, or None when they are dropped altogether
+class DeadCodeEliminator(StmtVisitor):
+    def __init__(self, unused_locals: set[object]):
+        self.__unused_locals: set[object] = unused_locals
+
+    def eliminate(self, statements: list[Stmt]) -> list[Stmt]:
+        live: list[Stmt] = []
+        for statement in statements:
+            statement: Stmt | None = statement.accept(self)
+            if statement is None:
+                continue
+
+            live.append(statement)
+            if self.__never_completes(statement):
+                break
+
+        return live
+
+    def visit_block_stmt(self, stmt: BlockStmt) -> Stmt:
+        stmt.statements = self.eliminate(stmt.statements)
+        return stmt
+
+    def visit_class_stmt(self, stmt: ClassStmt) -> Stmt:
+        for method in stmt.methods:
+            method.accept(self)
+        return stmt
+
+    @staticmethod
+    def visit_expression_stmt(stmt: ExpressionStmt) -> Stmt:
+        return stmt
+
+    def visit_function_stmt(self, stmt: FunctionStmt) -> Stmt:
+        stmt.body = self.eliminate(stmt.body)
+        return stmt
+
+    def visit_if_stmt(self, stmt: IfStmt) -> Stmt | None:
+        if isinstance(stmt.condition, LiteralExpr):
+            branch: Stmt | None = stmt.if_clause if is_truthy(stmt.condition.value) else stmt.else_clause
+            if branch is None:
+                return None
+            # Kept in a block, so that a branch that is an expression statement doesn't end up at the top level, where
+            # the REPL would print its value
+            return BlockStmt([branch]).accept(self) if not isinstance(branch, BlockStmt) else branch.accept(self)
+
+        stmt.if_clause = self.__body(stmt.if_clause)
+        if stmt.else_clause is not None:
+            stmt.else_clause = stmt.else_clause.accept(self)
+        return stmt
+
+    @staticmethod
+    def visit_print_stmt(stmt: PrintStmt) -> Stmt:
+        return stmt
+
+    @staticmethod
+    def visit_return_stmt(stmt: ReturnStmt) -> Stmt:
+        return stmt
+
+    def visit_var_stmt(self, stmt: VarStmt) -> Stmt | None:
+        if stmt in self.__unused_locals and (stmt.initializer is None or isinstance(stmt.initializer, LiteralExpr)):
+            return None
+        return stmt
+
+    def visit_while_stmt(self, stmt: WhileStmt) -> Stmt | None:
+        if isinstance(stmt.condition, LiteralExpr) and not is_truthy(stmt.condition.value):
+            return None
+
+        stmt.body = self.__body(stmt.body)
+        return stmt
+
+    # The bodies of ifs and whiles can't be left out, so dropped ones are replaced by an empty block
+    def __body(self, stmt: Stmt) -> Stmt:
+        body: Stmt | None = stmt.accept(self)
+        return body if body is not None else BlockStmt([])
+
+    def __never_completes(self, stmt: Stmt) -> bool:
+        match stmt:
+            case ReturnStmt():
+                return True
+            case BlockStmt(statements=statements):
+                # A statement that never completes is always the last one left in its block
+                return len(statements) != 0 and self.__never_completes(statements[-1])
+            case IfStmt(if_clause=if_clause, else_clause=else_clause):
+                return else_clause is not None and self.__never_completes(if_clause) and \
+                    self.__never_completes(else_clause)
+            case WhileStmt(condition=LiteralExpr(value=value)):
+                return is_truthy(value)
+
+        return False
+
+
+__all__ = ["DeadCodeEliminator"]
@@ -2,46 +2,38 @@ from errors import LoxRuntimeError
 from tokenclass import Token
 
 
-class Environment:
-    def __init__(self, enclosing=None):
-        self.values: dict[str, object] = {}
-        self.enclosing: Environment | None = enclosing
+# Locals live in flat per call frames (see the resolver), except for those captured by a closure: these are boxed in
+# a Cell, which the frame and every closure capturing the variable share
+class Cell:
+    __slots__ = ("value",)
+
+    def __init__(self, value: object | None):
+        self.value: object | None = value
 
-    def ancestor(self, distance: int):
-        environment: Environment = self
-        for _ in range(distance):
-            environment = environment.enclosing
 
-        return environment
+# Globals are late bound (they can be used in functions before being declared and redefined at will), so they are the
+# only variables still looked up by name
+class GlobalEnvironment:
+    __slots__ = ("values",)
+
+    def __init__(self):
+        self.values: dict[str, object] = {}
 
     def assign(self, name: Token, value: object) -> None:
         if name.lexeme in self.values:
             self.values[name.lexeme] = value
             return
 
-        if self.enclosing is not None:
-            self.enclosing.assign(name, value)
-            return
-
         raise LoxRuntimeError(name, f"Undefined variable '{name.lexeme}'.")
 
-    def assign_at(self, distance: int, name: Token, value: object) -> None:
-        self.ancestor(distance).values |= {name.lexeme: value}
-
     def define(self, name: str, value: object | None) -> None:
-        self.values |= {name: value}
+        self.values[name] = value
 
     def get(self, name: Token) -> object:
         if name.lexeme in self.values:
             return self.values[name.lexeme]
 
-        if self.enclosing is not None:
-            return self.enclosing.get(name)
-
         raise LoxRuntimeError(name, f"Undefined variable '{name.lexeme}'.")
 
-    def get_at(self, distance: int, name: str) -> object:
-        return self.ancestor(distance).values.get(name)
-
 
-__all__ = "Environment"
+__all__ = ["Cell", "GlobalEnvironment"]
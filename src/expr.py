@@ -4,6 +4,8 @@ from tokenclass import Token
 
 
 class Expr(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def accept(self, visitor): ...
 
@@ -26,9 +28,8 @@ class ExprVisitor(ABC):
     @abstractmethod
     def visit_grouping_expr(self, expr: Expr) -> object | None: ...
 
-    @staticmethod
     @abstractmethod
-    def visit_literal_expr(expr: Expr) -> object | None: ...
+    def visit_literal_expr(self, expr: Expr) -> object | None: ...
 
     @abstractmethod
     def visit_logical_expr(self, expr: Expr) -> object | None: ...
@@ -50,6 +51,8 @@ class ExprVisitor(ABC):
 
 
 class AssignExpr(Expr):
+    __slots__ = ("name", "value")
+
     def __init__(self, name: Token, value: Expr):
         self.name: Token = name
         self.value: Expr = value
@@ -59,6 +62,8 @@ class AssignExpr(Expr):
 
 
 class BinaryExpr(Expr):
+    __slots__ = ("left", "operator", "right")
+
     def __init__(self, left: Expr, operator: Token, right: Expr):
         self.left: Expr = left
         self.operator: Token = operator
@@ -69,6 +74,8 @@ class BinaryExpr(Expr):
 
 
 class CallExpr(Expr):
+    __slots__ = ("callee", "paren", "arguments")
+
     def __init__(self, callee: Expr, paren: Token, arguments: list[Expr]):
         self.callee: Expr = callee
         self.paren: Token = paren
@@ -79,6 +86,8 @@ class CallExpr(Expr):
 
 
 class GetExpr(Expr):
+    __slots__ = ("obj", "name")
+
     def __init__(self, obj: Expr, name: Token):
         self.obj: Expr = obj
         self.name: Token = name
@@ -88,6 +97,8 @@ class GetExpr(Expr):
 
 
 class GroupingExpr(Expr):
+    __slots__ = ("expression",)
+
     def __init__(self, expression: Expr):
         self.expression: Expr = expression
 
@@ -96,6 +107,8 @@ class GroupingExpr(Expr):
 
 
 class LiteralExpr(Expr):
+    __slots__ = ("value",)
+
     def __init__(self, value: object):
         self.value: object = value
 
@@ -104,6 +117,8 @@ class LiteralExpr(Expr):
 
 
 class LogicalExpr(Expr):
+    __slots__ = ("left", "operator", "right")
+
     def __init__(self, left: Expr, operator: Token, right: Expr):
         self.left: Expr = left
         self.operator: Token = operator
@@ -114,6 +129,8 @@ class LogicalExpr(Expr):
 
 
 class SetExpr(Expr):
+    __slots__ = ("obj", "name", "value")
+
     def __init__(self, obj: Expr, name: Token, value: Expr):
         self.obj: Expr = obj
         self.name: Token = name
@@ -124,6 +141,8 @@ class SetExpr(Expr):
 
 
 class SuperExpr(Expr):
+    __slots__ = ("keyword", "method")
+
     def __init__(self, keyword: Token, method: Token):
         self.keyword: Token = keyword
         self.method: Token = method
@@ -133,6 +152,8 @@ class SuperExpr(Expr):
 
 
 class ThisExpr(Expr):
+    __slots__ = ("keyword",)
+
     def __init__(self, keyword: Token):
         self.keyword: Token = keyword
 
@@ -141,6 +162,8 @@ class ThisExpr(Expr):
 
 
 class UnaryExpr(Expr):
+    __slots__ = ("operator", "right")
+
     def __init__(self, operator: Token, right: Expr):
         self.operator: Token = operator
         self.right: Expr = right
@@ -150,6 +173,8 @@ class UnaryExpr(Expr):
 
 
 class VariableExpr(Expr):
+    __slots__ = ("name",)
+
     def __init__(self, name: Token):
         self.name: Token = name
 
@@ -157,5 +182,5 @@ class VariableExpr(Expr):
         return visitor.visit_variable_expr(self)
 
 
-__all__ = ["Expr", "ExprVisitor", "AssignExpr", "BinaryExpr", "CallExpr", "GetExpr", "GroupingExpr",
-           "LiteralExpr", "LogicalExpr", "SetExpr", "SuperExpr", "ThisExpr", "UnaryExpr", "VariableExpr"]
+__all__ = ["Expr", "ExprVisitor", "AssignExpr", "BinaryExpr", "CallExpr", "GetExpr", "GroupingExpr", "LiteralExpr",
+           "LogicalExpr", "SetExpr", "SuperExpr", "ThisExpr", "UnaryExpr", "VariableExpr"]
@@ -0,0 +1,319 @@
+from collections import Counter
+
+from expr import *
+from stmt import *
+
+
+# Expressions an inlinable function may return: ones that can't change any state, so that it makes no difference when,
+# how many times or whether at all the arguments substituted for its parameters are evaluated
+def is_pure(expr: Expr) -> bool:
+    match expr:
+        case LiteralExpr() | VariableExpr():
+            return True
+        case BinaryExpr(left=left, right=right) | LogicalExpr(left=left, right=right):
+            return is_pure(left) and is_pure(right)
+        case UnaryExpr(right=right):
+            return is_pure(right)
+        case GetExpr(obj=obj):
+            return is_pure(obj)
+        case GroupingExpr(expression=expression):
+            return is_pure(expression)
+
+    return False
+
+
+def free_names(expr: Expr) -> set[str]:
+    match expr:
+        case VariableExpr(name=name):
+            return {name.lexeme}
+        case BinaryExpr(left=left, right=right) | LogicalExpr(left=left, right=right):
+            return free_names(left) | free_names(right)
+        case UnaryExpr(right=right) | GroupingExpr(expression=right) | GetExpr(obj=right):
+            return free_names(right)
+
+    return set()
+
+
+# Copies a pure expression, substituting copies of the arguments for the parameters. Every inlined copy has to be made
+# of new nodes, since the backends keep what the resolver tells them about nodes in side tables keyed by the nodes
+def substitute(expr: Expr, arguments: dict[str, Expr]) -> Expr:
+    match expr:
+        case LiteralExpr(value=value):
+            return LiteralExpr(value)
+        case VariableExpr(name=name):
+            argument: Expr | None = arguments.get(name.lexeme)
+            return VariableExpr(name) if argument is None else substitute(argument, {})
+        case BinaryExpr(left=left, operator=operator, right=right):
+            return BinaryExpr(substitute(left, arguments), operator, substitute(right, arguments))
+        case LogicalExpr(left=left, operator=operator, right=right):
+            return LogicalExpr(substitute(left, arguments), operator, substitute(right, arguments))
+        case UnaryExpr(operator=operator, right=right):
+            return UnaryExpr(operator, substitute(right, arguments))
+        case GetExpr(obj=obj, name=name):
+            return GetExpr(substitute(obj, arguments), name)
+        case GroupingExpr(expression=expression):
+            return substitute(expression, arguments)
+
+    raise TypeError(f"can't substitute into {type(expr).__name__}")
+
+
+# Names assigned to anywhere, and how many times every name is declared at the top level
+class DeclarationCounter(ExprVisitor, StmtVisitor):
+    def __init__(self):
+        self.assigned: set[str] = set()
+        self.top_level: Counter[str] = Counter()
+
+    def count(self, statements: list[Stmt]) -> None:
+        for statement in statements:
+            if isinstance(statement, (VarStmt, FunctionStmt, ClassStmt)):
+                self.top_level[statement.name.lexeme] += 1
+            statement.accept(self)
+
+    def visit_assign_expr(self, expr: AssignExpr) -> None:
+        self.assigned.add(expr.name.lexeme)
+        expr.value.accept(self)
+
+    def visit_binary_expr(self, expr: BinaryExpr) -> None:
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visit_call_expr(self, expr: CallExpr) -> None:
+        expr.callee.accept(self)
+        for argument in expr.arguments:
+            argument.accept(self)
+
+    def visit_get_expr(self, expr: GetExpr) -> None:
+        expr.obj.accept(self)
+
+    def visit_grouping_expr(self, expr: GroupingExpr) -> None:
+        expr.expression.accept(self)
+
+    def visit_literal_expr(self, expr: LiteralExpr) -> None:
+        pass
+
+    def visit_logical_expr(self, expr: LogicalExpr) -> None:
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visit_set_expr(self, expr: SetExpr) -> None:
+        expr.obj.accept(self)
+        expr.value.accept(self)
+
+    def visit_super_expr(self, expr: SuperExpr) -> None:
+        pass
+
+    def visit_this_expr(self, expr: ThisExpr) -> None:
+        pass
+
+    def visit_unary_expr(self, expr: UnaryExpr) -> None:
+        expr.right.accept(self)
+
+    def visit_variable_expr(self, expr: VariableExpr) -> None:
+        pass
+
+    def visit_block_stmt(self, stmt: BlockStmt) -> None:
+        for statement in stmt.statements:
+            statement.accept(self)
+
+    def visit_class_stmt(self, stmt: ClassStmt) -> None:
+        for method in stmt.methods:
+            method.accept(self)
+
+    def visit_expression_stmt(self, stmt: ExpressionStmt) -> None:
+        stmt.expression.accept(self)
+
+    def visit_function_stmt(self, stmt: FunctionStmt) -> None:
+        for statement in stmt.body:
+            statement.accept(self)
+
+    def visit_if_stmt(self, stmt: IfStmt) -> None:
+        stmt.condition.accept(self)
+        stmt.if_clause.accept(self)
+        if stmt.else_clause is not None:
+            stmt.else_clause.accept(self)
+
+    def visit_print_stmt(self, stmt: PrintStmt) -> None:
+        stmt.expression.accept(self)
+
+    def visit_return_stmt(self, stmt: ReturnStmt) -> None:
+        if stmt.value is not None:
+            stmt.value.accept(self)
+
+    def visit_var_stmt(self, stmt: VarStmt) -> None:
+        if stmt.initializer is not None:
+            stmt.initializer.accept(self)
+
+    def visit_while_stmt(self, stmt: WhileStmt) -> None:
+        stmt.condition.accept(self)
+        stmt.body.accept(self)
+
+
+# Replaces calls to small functions with the expression they return, with the arguments substituted for the
+# parameters. It runs before the resolver, since the inlined expressions are resolved where they end up. To keep the
+# program's behaviour exactly the same, a function is only inlined when:
+# - it is declared once at the top level and never assigned to, so the global it's bound to always holds it from its
+#   declaration on; only calls in the top level statements after the declaration are inlined, as the function is
+#   defined by the time these run;
+# - its body is a single return of a pure expression, so it doesn't call anything (itself included) or change any
+#   state, and doesn't capture anything but globals, none of which is shadowed by a local where it's inlined;
+# - every argument of the call is a literal or a local, so evaluating it has no effects either and can't fail.
+# Since a later script (or line typed into the REPL) could redefine the function, it's only meant to run on whole scripts
+class Inliner(ExprVisitor, StmtVisitor):
+    def __init__(self):
+        self.inlined: int = 0
+        self.__functions: dict[str, FunctionStmt] = {}
+        self.__scopes: list[dict[str, bool]] = []  # Whether every local declared so far has been defined
+
+    def inline(self, statements: list[Stmt]) -> list[Stmt]:
+        counter: DeclarationCounter = DeclarationCounter()
+        counter.count(statements)
+
+        for statement in statements:
+            statement.accept(self)
+
+            if isinstance(statement, FunctionStmt) and counter.top_level[statement.name.lexeme] == 1 and \
+                    statement.name.lexeme not in counter.assigned and self.__is_inlinable(statement):
+                self.__functions[statement.name.lexeme] = statement
+
+        return statements
+
+    def visit_assign_expr(self, expr: AssignExpr) -> Expr:
+        expr.value = self.__inline(expr.value)
+        return expr
+
+    def visit_binary_expr(self, expr: BinaryExpr) -> Expr:
+        expr.left = self.__inline(expr.left)
+        expr.right = self.__inline(expr.right)
+        return expr
+
+    def visit_call_expr(self, expr: CallExpr) -> Expr:
+        expr.callee = self.__inline(expr.callee)
+        expr.arguments = [self.__inline(argument) for argument in expr.arguments]
+
+        if not isinstance(expr.callee, VariableExpr) or self.__find(expr.callee.name.lexeme) is not None:
+            return expr
+
+        function: FunctionStmt | None = self.__functions.get(expr.callee.name.lexeme)
+        if function is None or len(function.params) != len(expr.arguments) or \
+                not all(self.__is_duplicable(argument) for argument in expr.arguments):
+            return expr
+
+        body: Expr = function.body[0].value
+        if any(self.__find(name) is not None for name in free_names(body) - {param.lexeme for param in function.params}):
+            return expr
+
+        self.inlined += 1
+        return substitute(body, {param.lexeme: argument for param, argument in zip(function.params, expr.arguments)})
+
+    def visit_get_expr(self, expr: GetExpr) -> Expr:
+        expr.obj = self.__inline(expr.obj)
+        return expr
+
+    def visit_grouping_expr(self, expr: GroupingExpr) -> Expr:
+        expr.expression = self.__inline(expr.expression)
+        return expr
+
+    @staticmethod
+    def visit_literal_expr(expr: LiteralExpr) -> Expr:
+        return expr
+
+    def visit_logical_expr(self, expr: LogicalExpr) -> Expr:
+        expr.left = self.__inline(expr.left)
+        expr.right = self.__inline(expr.right)
+        return expr
+
+    def visit_set_expr(self, expr: SetExpr) -> Expr:
+        expr.obj = self.__inline(expr.obj)
+        expr.value = self.__inline(expr.value)
+        return expr
+
+    @staticmethod
+    def visit_super_expr(expr: SuperExpr) -> Expr:
+        return expr
+
+    @staticmethod
+    def visit_this_expr(expr: ThisExpr) -> Expr:
+        return expr
+
+    def visit_unary_expr(self, expr: UnaryExpr) -> Expr:
+        expr.right = self.__inline(expr.right)
+        return expr
+
+    @staticmethod
+    def visit_variable_expr(expr: VariableExpr) -> Expr:
+        return expr
+
+    def visit_block_stmt(self, stmt: BlockStmt) -> None:
+        self.__scopes.append({})
+        for statement in stmt.statements:
+            statement.accept(self)
+        self.__scopes.pop()
+
+    def visit_class_stmt(self, stmt: ClassStmt) -> None:
+        self.__declare(stmt.name.lexeme, True)
+        for method in stmt.methods:
+            self.__function(method)
+
+    def visit_expression_stmt(self, stmt: ExpressionStmt) -> None:
+        stmt.expression = self.__inline(stmt.expression)
+
+    def visit_function_stmt(self, stmt: FunctionStmt) -> None:
+        self.__declare(stmt.name.lexeme, True)
+        self.__function(stmt)
+
+    def visit_if_stmt(self, stmt: IfStmt) -> None:
+        stmt.condition = self.__inline(stmt.condition)
+        stmt.if_clause.accept(self)
+        if stmt.else_clause is not None:
+            stmt.else_clause.accept(self)
+
+    def visit_print_stmt(self, stmt: PrintStmt) -> None:
+        stmt.expression = self.__inline(stmt.expression)
+
+    def visit_return_stmt(self, stmt: ReturnStmt) -> None:
+        if stmt.value is not None:
+            stmt.value = self.__inline(stmt.value)
+
+    def visit_var_stmt(self, stmt: VarStmt) -> None:
+        self.__declare(stmt.name.lexeme, False)
+        if stmt.initializer is not None:
+            stmt.initializer = self.__inline(stmt.initializer)
+        self.__declare(stmt.name.lexeme, True)
+
+    def visit_while_stmt(self, stmt: WhileStmt) -> None:
+        stmt.condition = self.__inline(stmt.condition)
+        stmt.body.accept(self)
+
+    def __inline(self, expr: Expr) -> Expr:
+        return expr.accept(self)
+
+    def __function(self, function: FunctionStmt) -> None:
+        self.__scopes.append({param.lexeme: True for param in function.params})
+        for statement in function.body:
+            statement.accept(self)
+        self.__scopes.pop()
+
+    def __declare(self, name: str, defined: bool) -> None:
+        if len(self.__scopes) != 0:
+            self.__scopes[-1][name] = defined
+
+    # Whether the innermost local with this name has been defined, or None for globals
+    def __find(self, name: str) -> bool | None:
+        for scope in reversed(self.__scopes):
+            if name in scope:
+                return scope[name]
+
+        return None
+
+    # A local read in its own initializer is a static error, which inlining mustn't make disappear
+    def __is_duplicable(self, argument: Expr) -> bool:
+        return isinstance(argument, LiteralExpr) or \
+            isinstance(argument, VariableExpr) and self.__find(argument.name.lexeme) is True
+
+    @staticmethod
+    def __is_inlinable(function: FunctionStmt) -> bool:
+        return len(function.body) == 1 and isinstance(function.body[0], ReturnStmt) and \
+            function.body[0].value is not None and is_pure(function.body[0].value)
+
+
+__all__ = ["Inliner"]
@@ -2,14 +2,17 @@ from enum import Enum, auto
 from math import nan
 from typing import SupportsFloat
 
-from environment import Environment
+from environment import *
 from errors import LoxRuntimeError, LoxFunctionError
 from expr import *
 from lox_callable import LoxCallable
 from lox_class import *
 from lox_function import LoxFunction
 from lox_native import *
-from return_class import Return
+from lox_value import *
+from quickening import *
+from return_class import *
+from resolver import FunctionLayout, VariableKind
 from stmt import *
 from tokenclass import *
 
@@ -22,13 +25,18 @@ class OpMode(Enum):
 class Interpreter(ExprVisitor, StmtVisitor):
     def __init__(self, lox_main):
         self.__lox_main = lox_main
-        self.globals: Environment = Environment()
-        self.__environment: Environment = self.globals
-        self.__locals: dict[Expr, int] = {}
+        self.globals: GlobalEnvironment = GlobalEnvironment()
+        self._frame: list[object] = []
+        self._upvalues: list[Cell] = []
+        self.__return_value: object | None = None
+        self.__script_frame_size: int = 0
+        self._locals: dict[object, tuple[VariableKind, int]] = {}
+        self._functions: dict[FunctionStmt, FunctionLayout] = {}
+        self.__tail_calls: list[CallExpr] = []
 
         self.__unary_operators: dict[TokenType, callable] = {
             TokenType.MINUS: self.__unary_minus_handler,
-            TokenType.BANG: lambda _, x: not self.__is_truthy(x)
+            TokenType.BANG: lambda _, x: not is_truthy(x)
         }
         self.__binary_operators: dict[TokenType, callable] = {
             TokenType.MINUS: self.__binary_minus_handler,
@@ -41,13 +49,18 @@ class Interpreter(ExprVisitor, StmtVisitor):
             TokenType.GREATER_EQUAL: self.__binary_geq_handler,
             TokenType.LESS: self.__binary_less_handler,
             TokenType.LESS_EQUAL: self.__binary_leq_handler,
-            TokenType.BANG_EQUAL: lambda _, l, r: not self.__is_equal(l, r),
-            TokenType.EQUAL_EQUAL: lambda _, l, r: self.__is_equal(l, r)
+            TokenType.BANG_EQUAL: lambda _, l, r: not is_equal(l, r),
+            TokenType.EQUAL_EQUAL: lambda _, l, r: is_equal(l, r)
         }
 
         self.__define_natives()
 
     def interpret(self, statements: list[Stmt], mode: OpMode) -> None:
+        self._frame = [None] * self.__script_frame_size
+        self._upvalues = []
+
+        self._mark_tail_calls()
+
         try:
             for statement in statements:
                 self.__mode_execute(statement, mode)
@@ -56,23 +69,162 @@ class Interpreter(ExprVisitor, StmtVisitor):
 
     def visit_assign_expr(self, expr: AssignExpr) -> object:
         value: object = self.__evaluate(expr.value)
-        distance: int = self.__locals.get(expr)
+        location: tuple[VariableKind, int] | None = self._locals.get(expr)
 
-        self.__environment.assign_at(distance, expr.name, value) if distance is not None \
-            else self.globals.assign(expr.name, value)
+        self._store(location, value) if location is not None else self.globals.assign(expr.name, value)
 
         return value
 
+    # Only evaluated once per node, which then specialises itself for the operand types it got (see quickening.py)
     def visit_binary_expr(self, expr: BinaryExpr) -> object | bool:
         left: object = self.__evaluate(expr.left)
         right: object = self.__evaluate(expr.right)
 
+        expr.__class__ = specialise(expr, left, right)
+        return self.__binary_operators[expr.operator.type](expr.operator, left, right)
+
+    def visit_generic_binary_expr(self, expr: GenericBinaryExpr) -> object | bool:
+        left: object = self.__evaluate(expr.left)
+        right: object = self.__evaluate(expr.right)
+
         return self.__binary_operators[expr.operator.type](expr.operator, left, right)
 
+    # Specialised binary expressions only check the types of their operands, falling back on the generic path for good
+    # when these aren't the expected ones
+
+    def visit_float_add_expr(self, expr: FloatAddExpr) -> object:
+        left: object = self.__evaluate(expr.left)
+        right: object = self.__evaluate(expr.right)
+
+        if type(left) is float and type(right) is float:
+            return left + right
+        return self.__despecialise(expr, left, right)
+
+    def visit_float_subtract_expr(self, expr: FloatSubtractExpr) -> object:
+        left: object = self.__evaluate(expr.left)
+        right: object = self.__evaluate(expr.right)
+
+        if type(left) is float and type(right) is float:
+            return left - right
+        return self.__despecialise(expr, left, right)
+
+    def visit_float_multiply_expr(self, expr: FloatMultiplyExpr) -> object:
+        left: object = self.__evaluate(expr.left)
+        right: object = self.__evaluate(expr.right)
+
+        if type(left) is float and type(right) is float:
+            return left * right
+        return self.__despecialise(expr, left, right)
+
+    def visit_float_divide_expr(self, expr: FloatDivideExpr) -> object:
+        left: object = self.__evaluate(expr.left)
+        right: object = self.__evaluate(expr.right)
+
+        if type(left) is float and type(right) is float:
+            return nan if left == right == 0 else left / right
+        return self.__despecialise(expr, left, right)
+
+    def visit_float_less_expr(self, expr: FloatLessExpr) -> object:
+        left: object = self.__evaluate(expr.left)
+        right: object = self.__evaluate(expr.right)
+
+        if type(left) is float and type(right) is float:
+            return left < right
+        return self.__despecialise(expr, left, right)
+
+    def visit_float_less_equal_expr(self, expr: FloatLessEqualExpr) -> object:
+        left: object = self.__evaluate(expr.left)
+        right: object = self.__evaluate(expr.right)
+
+        if type(left) is float and type(right) is float:
+            return left <= right
+        return self.__despecialise(expr, left, right)
+
+    def visit_float_greater_expr(self, expr: FloatGreaterExpr) -> object:
+        left: object = self.__evaluate(expr.left)
+        right: object = self.__evaluate(expr.right)
+
+        if type(left) is float and type(right) is float:
+            return left > right
+        return self.__despecialise(expr, left, right)
+
+    def visit_float_greater_equal_expr(self, expr: FloatGreaterEqualExpr) -> object:
+        left: object = self.__evaluate(expr.left)
+        right: object = self.__evaluate(expr.right)
+
+        if type(left) is float and type(right) is float:
+            return left >= right
+        return self.__despecialise(expr, left, right)
+
+    def visit_string_add_expr(self, expr: StringAddExpr) -> object:
+        left: object = self.__evaluate(expr.left)
+        right: object = self.__evaluate(expr.right)
+
+        if type(left) is str and type(right) is str:
+            return left + right
+        return self.__despecialise(expr, left, right)
+
     def visit_call_expr(self, expr: CallExpr) -> object:
+        if isinstance(expr.callee, GetExpr):
+            return self.__invoke(expr, expr.callee)
+
         callee: object = self.__evaluate(expr.callee)
         arguments: list[object] = [self.__evaluate(argument) for argument in expr.arguments]
 
+        return self.__call(expr, callee, arguments)
+
+    # A call whose result the enclosing function returns. Lox functions aren't called from here, but from the
+    # run_tail_calls loop of the function returning, once it has returned; natives and classes are called as usual.
+    # Kept apart from visit_call_expr, so that other calls don't have to check whether they are tail calls
+    def visit_tail_call_expr(self, expr: TailCallExpr) -> object:
+        if isinstance(expr.callee, GetExpr):
+            return self.__tail_invoke(expr, expr.callee)
+
+        callee: object = self.__evaluate(expr.callee)
+        arguments: list[object] = [self.__evaluate(argument) for argument in expr.arguments]
+
+        return self.__tail_call(expr, callee, arguments)
+
+    # A method called right away runs with the instance as "this" directly, so a bound function is only ever created
+    # when a method is used as a value. Fields shadow methods, so a field holding a function is called as any other
+    def __invoke(self, expr: CallExpr, callee: GetExpr) -> object:
+        obj: object = self.__evaluate(callee.obj)
+        if not isinstance(obj, LoxInstance):
+            raise LoxRuntimeError(callee.name, "Only instances have properties.")
+
+        index: int | None = obj.shape.offsets.get(callee.name.lexeme)
+        if index is not None:
+            return self.__call(expr, obj.values[index], [self.__evaluate(argument) for argument in expr.arguments])
+
+        method: LoxFunction | None = obj.klass.find_method(callee.name.lexeme)
+        if method is None:
+            raise LoxRuntimeError(callee.name, f"Undefined property '{callee.name.lexeme}'.")
+        arguments: list[object] = [self.__evaluate(argument) for argument in expr.arguments]
+        if (arg_no := len(arguments)) != (arity := method.arity()):
+            raise LoxRuntimeError(expr.paren, f"Expected {arity} arguments but got {arg_no}.")
+
+        return method.invoke(self, obj, arguments)
+
+    def __tail_invoke(self, expr: CallExpr, callee: GetExpr) -> object:
+        obj: object = self.__evaluate(callee.obj)
+        if not isinstance(obj, LoxInstance):
+            raise LoxRuntimeError(callee.name, "Only instances have properties.")
+
+        index: int | None = obj.shape.offsets.get(callee.name.lexeme)
+        if index is not None:
+            return self.__tail_call(expr, obj.values[index],
+                                    [self.__evaluate(argument) for argument in expr.arguments])
+
+        method: LoxFunction | None = obj.klass.find_method(callee.name.lexeme)
+        if method is None:
+            raise LoxRuntimeError(callee.name, f"Undefined property '{callee.name.lexeme}'.")
+        arguments: list[object] = [self.__evaluate(argument) for argument in expr.arguments]
+        if (arg_no := len(arguments)) != (arity := method.arity()):
+            raise LoxRuntimeError(expr.paren, f"Expected {arity} arguments but got {arg_no}.")
+
+        return TailCall(method, obj, arguments)
+
+    def __call(self, expr: CallExpr, callee: object, arguments: list[object]) -> object:
         if not isinstance(callee, LoxCallable):
             raise LoxRuntimeError(expr.paren, "Can only call functions and classes.")
 
@@ -85,6 +237,15 @@ class Interpreter(ExprVisitor, StmtVisitor):
         except LoxFunctionError as err:
             raise LoxRuntimeError(expr.paren, f"in function {err.function}: {err.message}.")
 
+    def __tail_call(self, expr: CallExpr, callee: object, arguments: list[object]) -> object:
+        if type(callee) is not LoxFunction:
+            return self.__call(expr, callee, arguments)
+
+        if (arg_no := len(arguments)) != (arity := callee.arity()):
+            raise LoxRuntimeError(expr.paren, f"Expected {arity} arguments but got {arg_no}.")
+
+        return TailCall(callee, callee.this, arguments)
+
     def visit_get_expr(self, expr: GetExpr) -> object:
         obj: object = self.__evaluate(expr.obj)
         if isinstance(obj, LoxInstance):
@@ -102,10 +263,10 @@ class Interpreter(ExprVisitor, StmtVisitor):
     def visit_logical_expr(self, expr: LogicalExpr) -> object:
         left: object = self.__evaluate(expr.left)
         if expr.operator.type == TokenType.OR:
-            if self.__is_truthy(left):
+            if is_truthy(left):
                 return left
         else:
-            if not self.__is_truthy(left):
+            if not is_truthy(left):
                 return left
 
         return self.__evaluate(expr.right)
@@ -122,9 +283,8 @@ class Interpreter(ExprVisitor, StmtVisitor):
         return value
 
     def visit_super_expr(self, expr: SuperExpr) -> object:
-        distance: int = self.__locals.get(expr)
-        superclass: LoxClass = self.__environment.get_at(distance, "super")
-        obj: LoxInstance = self.__environment.get_at(distance - 1, "this")
+        superclass: LoxClass = self._load(self._locals[expr])
+        obj: LoxInstance = self._load(self._locals[expr, "this"])
         method: LoxFunction = superclass.find_method(expr.method.lexeme)
 
         if method is None:
@@ -133,7 +293,7 @@ class Interpreter(ExprVisitor, StmtVisitor):
         return method.bind(obj)
 
     def visit_this_expr(self, expr: ThisExpr) -> object:
-        return self.__lookup_variable(expr.keyword, expr)
+        return self._lookup_variable(expr.keyword, expr)
 
     def visit_unary_expr(self, expr: UnaryExpr) -> object:
         right: object = self.__evaluate(expr.right)
@@ -141,10 +301,12 @@ class Interpreter(ExprVisitor, StmtVisitor):
         return self.__unary_operators[expr.operator.type](expr.operator, right)
 
     def visit_variable_expr(self, expr: VariableExpr) -> object:
-        return self.__lookup_variable(expr.name, expr)
+        return self._lookup_variable(expr.name, expr)
 
-    def visit_block_stmt(self, stmt: BlockStmt) -> None:
-        self.execute_block(stmt.statements, Environment(self.__environment))
+    def visit_block_stmt(self, stmt: BlockStmt) -> Return | None:
+        for statement in stmt.statements:
+            if self.__execute(statement) is RETURN:
+                return RETURN
 
     def visit_class_stmt(self, stmt: ClassStmt) -> None:
         superclass: object | None = None
@@ -153,101 +315,148 @@ class Interpreter(ExprVisitor, StmtVisitor):
             if not isinstance(superclass, LoxClass):
                 raise LoxRuntimeError(stmt.superclass.name, "Superclass must be a class.")
 
-        self.__environment.define(stmt.name.lexeme, None)
+        self._define(stmt, stmt.name.lexeme, None)
 
-        if stmt.superclass is not None:
-            self.__environment = Environment(self.__environment)
-            self.__environment.define("super", superclass)
+        if superclass is not None:
+            self._define((stmt, "super"), "super", superclass)
 
         methods: dict[str, LoxFunction] = \
-            {method.name.lexeme: LoxFunction(method, self.__environment, method.name.lexeme == "init")
-             for method in stmt.methods}
+            {method.name.lexeme: self._function(method, method.name.lexeme == "init") for method in stmt.methods}
 
-        klass: LoxClass = LoxClass(stmt.name.lexeme, superclass, methods)
-
-        if superclass is not None:
-            self.__environment = self.__environment.enclosing
-
-        self.__environment.assign(stmt.name, klass)
+        self._initialize(stmt, stmt.name.lexeme, LoxClass(stmt.name.lexeme, superclass, methods))
 
     def visit_expression_stmt(self, stmt: ExpressionStmt) -> None:
         self.__evaluate(stmt.expression)
 
     def visit_function_stmt(self, stmt: FunctionStmt) -> None:
-        function: LoxFunction = LoxFunction(stmt, self.__environment, False)
-        self.__environment.define(stmt.name.lexeme, function)
+        # Declared before the function is created, in case it captures itself
+        self._define(stmt, stmt.name.lexeme, None)
+        self._initialize(stmt, stmt.name.lexeme, self._function(stmt, False))
 
-    def visit_if_stmt(self, stmt: IfStmt) -> None:
-        if self.__is_truthy(self.__evaluate(stmt.condition)):
-            self.__execute(stmt.if_clause)
+    def visit_if_stmt(self, stmt: IfStmt) -> Return | None:
+        if is_truthy(self.__evaluate(stmt.condition)):
+            return self.__execute(stmt.if_clause)
         elif stmt.else_clause is not None:
-            self.__execute(stmt.else_clause)
+            return self.__execute(stmt.else_clause)
 
     def visit_print_stmt(self, stmt: PrintStmt) -> None:
         value: object = self.__evaluate(stmt.expression)
-        print(self.__stringify(value))
+        print(stringify(value))
 
-    def visit_return_stmt(self, stmt: ReturnStmt) -> None:
-        value: object | None = None
-        if stmt.value is not None:
-            value = self.__evaluate(stmt.value)
-
-        raise Return(value)
+    def visit_return_stmt(self, stmt: ReturnStmt) -> Return:
+        self.__return_value = None if stmt.value is None else self.__evaluate(stmt.value)
+        return RETURN
 
     def visit_var_stmt(self, stmt: VarStmt) -> None:
         value: object | None = None
         if stmt.initializer is not None:
             value = self.__evaluate(stmt.initializer)
 
-        self.__environment.define(stmt.name.lexeme, value)
+        self._define(stmt, stmt.name.lexeme, value)
 
-    def visit_while_stmt(self, stmt: WhileStmt) -> None:
-        while self.__is_truthy(self.__evaluate(stmt.condition)):
-            self.__execute(stmt.body)
+    def visit_while_stmt(self, stmt: WhileStmt) -> Return | None:
+        while is_truthy(self.__evaluate(stmt.condition)):
+            if self.__execute(stmt.body) is RETURN:
+                return RETURN
 
     def __mode_execute(self, stmt: Stmt, mode: OpMode) -> None:
         if mode == OpMode.INTERACTIVE and isinstance(stmt, ExpressionStmt):
             value: object = self.__evaluate(stmt.expression)
-            print(self.__stringify(value))
+            print(stringify(value))
         else:
             self.__execute(stmt)
 
     def __evaluate(self, expr: Expr) -> object:
         return expr.accept(self)
 
-    def __execute(self, stmt: Stmt) -> None:
+    def __execute(self, stmt: Stmt) -> Return | None:
         return stmt.accept(self)
 
-    def __lookup_variable(self, name: Token, expr: Expr) -> object:
-        distance: int | None = self.__locals.get(expr)
-        return self.__environment.get_at(distance, name.lexeme) if distance is not None else self.globals.get(name)
+    def __despecialise(self, expr: BinaryExpr, left: object, right: object) -> object | bool:
+        expr.__class__ = GenericBinaryExpr
+        return self.__binary_operators[expr.operator.type](expr.operator, left, right)
+
+    # The helpers from here to _function are shared with StackInterpreter, which keeps its variables in the same frames
+
+    def _lookup_variable(self, name: Token, expr: Expr) -> object:
+        location: tuple[VariableKind, int] | None = self._locals.get(expr)
+        return self._load(location) if location is not None else self.globals.get(name)
+
+    def _load(self, location: tuple[VariableKind, int]) -> object:
+        match location:
+            case (VariableKind.LOCAL, slot):
+                return self._frame[slot]
+            case (VariableKind.CELL, slot):
+                return self._frame[slot].value
+            case (VariableKind.UPVALUE, index):
+                return self._upvalues[index].value
+
+    def _store(self, location: tuple[VariableKind, int], value: object) -> None:
+        match location:
+            case (VariableKind.LOCAL, slot):
+                self._frame[slot] = value
+            case (VariableKind.CELL, slot):
+                self._frame[slot].value = value
+            case (VariableKind.UPVALUE, index):
+                self._upvalues[index].value = value
+
+    # Declarations the resolver knows nothing about are globals. Captured locals get a fresh Cell every time their
+    # declaration runs, so every loop iteration still gets its own variable
+    def _define(self, declaration: object, name: str, value: object | None) -> None:
+        match self._locals.get(declaration):
+            case None:
+                self.globals.define(name, value)
+            case (VariableKind.LOCAL, slot):
+                self._frame[slot] = value
+            case (VariableKind.CELL, slot):
+                self._frame[slot] = Cell(value)
+
+    def _initialize(self, declaration: object, name: str, value: object) -> None:
+        location: tuple[VariableKind, int] | None = self._locals.get(declaration)
+        self._store(location, value) if location is not None else self.globals.define(name, value)
+
+    def _function(self, declaration: FunctionStmt, is_initializer: bool) -> LoxFunction:
+        layout: FunctionLayout = self._functions[declaration]
+        upvalues: list[Cell] = [self._frame[index] if is_local else self._upvalues[index]
+                                for is_local, index in layout.upvalues]
+
+        return LoxFunction(declaration, layout, upvalues, is_initializer)
+
+    # Returns the function's return value. A runtime error aborts the whole script, and interpret starts over with a
+    # fresh frame, so the caller's frame only needs restoring on the way out of a successful call
+    def execute_function(self, statements: list[Stmt], frame: list[object], upvalues: list[Cell]) -> object:
+        previous_frame: list[object] = self._frame
+        previous_upvalues: list[Cell] = self._upvalues
+        self._frame = frame
+        self._upvalues = upvalues
 
-    def execute_block(self, statements: list[Stmt], environment: Environment) -> None:
-        previous: Environment = self.__environment
-        try:
-            self.__environment = environment
-            for statement in statements:
-                self.__execute(statement)
-        finally:
-            self.__environment = previous
+        value: object | None = None
+        for statement in statements:
+            if self.__execute(statement) is RETURN:
+                value = self.__return_value
+                break
 
-    def resolve(self, expr: Expr, depth: int) -> None:
-        self.__locals |= {expr: depth}
+        self._frame = previous_frame
+        self._upvalues = previous_upvalues
+        return value
 
-    @staticmethod
-    def __is_equal(a: object, b: object) -> bool:
-        # Apparently, the original Java version treats anything of different types as unequal, so we're going to do the
-        # same: is the types aren't precisely the same, the operands aren't equal, otherwise properly check for equality
-        return False if type(a) is not type(b) else a == b
+    def resolve(self, node: object, kind: VariableKind, index: int) -> None:
+        self._locals |= {node: (kind, index)}
 
-    @staticmethod
-    def __is_truthy(obj: object) -> bool:
-        if obj is None:
-            return False
-        if isinstance(obj, bool):
-            return obj
+    def resolve_function(self, function: FunctionStmt, layout: FunctionLayout) -> None:
+        self._functions |= {function: layout}
+
+    def resolve_script(self, frame_size: int) -> None:
+        self.__script_frame_size = frame_size
+
+    def resolve_tail_call(self, expr: CallExpr) -> None:
+        self.__tail_calls.append(expr)
 
-        return True
+    # Only changed once there's no optimization pass left to visit them. Shared with StackInterpreter
+    def _mark_tail_calls(self) -> None:
+        for call in self.__tail_calls:
+            call.__class__ = TailCallExpr
+        self.__tail_calls.clear()
 
     @staticmethod
     def __check_number_operand(operator: Token, operand: object) -> None:
@@ -263,20 +472,6 @@ class Interpreter(ExprVisitor, StmtVisitor):
 
         raise LoxRuntimeError(operator, "Operands must be numbers.")
 
-    @staticmethod
-    def __stringify(obj: object) -> str:
-        match obj:
-            case True: return "true"
-            case False: return "false"
-            case None: return "nil"
-            case _ if isinstance(obj, float):
-                text: str = str(obj)
-                if text.endswith(".0"):
-                    text = text[:-2]
-                return text
-
-        return str(obj)
-
     # Operator handlers
 
     @staticmethod
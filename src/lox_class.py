@@ -4,10 +4,30 @@ from lox_function import LoxFunction
 from tokenclass import Token
 
 
+# The hidden class of an instance: which fields it has, and at which index of its values each one is stored. Instances
+# of a class adding the same fields in the same order end up sharing shapes, through the transitions cached along the
+# way, so a shape can stand for the whole layout of an instance (its class included) in an inline cache
+class Shape:
+    __slots__ = ("offsets", "transitions")
+
+    def __init__(self, offsets: dict[str, int]):
+        self.offsets: dict[str, int] = offsets
+        self.transitions: dict[str, Shape] = {}
+
+    def with_field(self, name: str):
+        shape: Shape | None = self.transitions.get(name)
+        if shape is None:
+            shape = self.transitions[name] = Shape(self.offsets | {name: len(self.offsets)})
+
+        return shape
+
+
 class LoxClass(LoxCallable):
     def __init__(self, name: str, superclass, methods: dict[str, LoxFunction]):
         self.name: str = name
         self.superclass: LoxClass | None = superclass
+        # Every class has a shape tree of its own, so that a shape always belongs to a single class
+        self.shape: Shape = Shape({})
 
         self.methods: dict[str, LoxFunction] = self.superclass.methods | methods if self.superclass is not None \
             else methods
@@ -19,7 +39,7 @@ class LoxClass(LoxCallable):
         instance: LoxInstance = LoxInstance(self)
         initializer: LoxFunction = self.find_method("init")
         if initializer is not None:
-            initializer.bind(instance).call(interpreter, arguments)
+            initializer.invoke(interpreter, instance, arguments)
 
         return instance
 
@@ -32,13 +52,17 @@ class LoxClass(LoxCallable):
 
 
 class LoxInstance:
+    __slots__ = ("klass", "shape", "values")
+
     def __init__(self, klass: LoxClass):
         self.klass: LoxClass = klass
-        self.__fields: dict[str, object] = {}
+        self.shape: Shape = klass.shape
+        self.values: list[object] = []
 
     def get(self, name: Token) -> object:
-        if name.lexeme in self.__fields:
-            return self.__fields[name.lexeme]
+        index: int | None = self.shape.offsets.get(name.lexeme)
+        if index is not None:
+            return self.values[index]
 
         method: LoxFunction | None = self.klass.find_method(name.lexeme)
         if method is not None:
@@ -47,10 +71,16 @@ class LoxInstance:
         raise LoxRuntimeError(name, f"Undefined property '{name.lexeme}'.")
 
     def set(self, name: Token, value: object) -> None:
-        self.__fields |= {name.lexeme: value}
+        index: int | None = self.shape.offsets.get(name.lexeme)
+        if index is not None:
+            self.values[index] = value
+            return
+
+        self.shape = self.shape.with_field(name.lexeme)
+        self.values.append(value)
 
     def __str__(self) -> str:
         return f"<{self.klass.name} instance>"
 
 
-__all__ = ["LoxClass", "LoxInstance"]
+__all__ = ["LoxClass", "LoxInstance", "Shape"]
@@ -1,34 +1,66 @@
-from environment import Environment
+from environment import Cell
 from lox_callable import LoxCallable
-from return_class import Return
+from resolver import FunctionLayout
+from return_class import TailCall
 from stmt import FunctionStmt
 
 
 class LoxFunction(LoxCallable):
-    def __init__(self, declaration: FunctionStmt, closure: Environment, is_initializer: bool):
+    def __init__(self, declaration: FunctionStmt, layout: FunctionLayout, upvalues: list[Cell], is_initializer: bool,
+                 this: object | None = None):
         self.__declaration: FunctionStmt = declaration
-        self.__closure: Environment = closure
+        self.__layout: FunctionLayout = layout
+        self.__upvalues: list[Cell] = upvalues
         self.__is_initializer: bool = is_initializer
+        self.__this: object | None = this
 
-    def bind(self, instance):
-        environment: Environment = Environment(self.__closure)
-        environment.define("this", instance)
+    @property
+    def declaration(self) -> FunctionStmt:
+        return self.__declaration
+
+    @property
+    def this(self) -> object | None:
+        return self.__this
+
+    @property
+    def upvalues(self) -> list[Cell]:
+        return self.__upvalues
 
-        return LoxFunction(self.__declaration, environment, self.__is_initializer)
+    @property
+    def is_initializer(self) -> bool:
+        return self.__is_initializer
+
+    def bind(self, instance):
+        return LoxFunction(self.__declaration, self.__layout, self.__upvalues, self.__is_initializer, instance)
 
+    # The same as invoke on the bound "this", written out again rather than calling it, as every call through a value
+    # would otherwise take one more Python call
     def call(self, interpreter, arguments: list[object]) -> object:
-        environment: Environment = Environment(self.__closure)
+        value: object = interpreter.execute_function(self.__declaration.body, self.new_frame(self.__this, arguments),
+                                                     self.__upvalues)
+        if type(value) is TailCall:
+            return run_tail_calls(interpreter, value)
 
-        # A tiny sprinkle of Haskell-like functional programming:
-        for param, argument in zip(self.__declaration.params, arguments):
-            environment.define(param.lexeme, argument)
+        return self.__this if self.__is_initializer else value
 
-        try:
-            interpreter.execute_block(self.__declaration.body, environment)
-        except Return as return_value:
-            return self.__closure.get_at(0, "this") if self.__is_initializer else return_value.value
+    # Calls the method on "this" directly, sparing the allocation of a bound function when it's called right away
+    def invoke(self, interpreter, this: object | None, arguments: list[object]) -> object:
+        value: object = interpreter.execute_function(self.__declaration.body, self.new_frame(this, arguments),
+                                                     self.__upvalues)
+        if type(value) is TailCall:
+            return run_tail_calls(interpreter, value)
 
-        return self.__closure.get_at(0, "this") if self.__is_initializer else None
+        return this if self.__is_initializer else value
+
+    # The argument list is always a fresh one, so it becomes the frame as is: parameters are its first slots (after
+    # "this" in methods), followed by the function's other locals
+    def new_frame(self, this: object | None, arguments: list[object]) -> list[object]:
+        frame: list[object] = arguments if this is None else [this, *arguments]
+        for slot in self.__layout.boxed:
+            frame[slot] = Cell(frame[slot])
+        frame += self.__layout.padding
+
+        return frame
 
     def arity(self) -> int:
         return len(self.__declaration.params)
@@ -37,4 +69,16 @@ class LoxFunction(LoxCallable):
         return f"<fn {self.__declaration.name.lexeme}>"
 
 
-__all__ = "LoxFunction"
+# Runs the calls a body made in tail position (see TailCall) one after the other, so that they take no Python stack at
+# all. Only entered once a body has returned one, so that other calls don't pay for the loop
+def run_tail_calls(interpreter, value: TailCall) -> object:
+    while True:
+        function: LoxFunction = value.function
+        this: object | None = value.this
+        value = interpreter.execute_function(function.declaration.body, function.new_frame(this, value.arguments),
+                                             function.upvalues)
+        if type(value) is not TailCall:
+            return this if function.is_initializer else value
+
+
+__all__ = ["LoxFunction", "run_tail_calls"]
@@ -5,7 +5,6 @@ from abc import ABC, abstractmethod
 from errors import LoxFunctionError
 from lox_callable import LoxCallable
 from lox_class import *
-from lox_function import LoxFunction
 
 
 class LoxNativeFunction(LoxCallable, ABC):
@@ -61,10 +60,11 @@ class Type(LoxNativeFunction):
             return "number"
         elif isinstance(obj, str):
             return "string"
-        elif isinstance(obj, (LoxFunction, LoxNativeFunction)):
-            return "function"
         elif isinstance(obj, LoxClass):
             return "class"
+        elif isinstance(obj, LoxCallable):
+            # Covers the bytecode VM's closures and bound methods as well
+            return "function"
         elif isinstance(obj, LoxInstance):
             return obj.klass.name
         elif obj is None:
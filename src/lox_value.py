@@ -0,0 +1,30 @@
+def is_equal(a: object, b: object) -> bool:
+    # Apparently, the original Java version treats anything of different types as unequal, so we're going to do the
+    # same: is the types aren't precisely the same, the operands aren't equal, otherwise properly check for equality
+    return False if type(a) is not type(b) else a == b
+
+
+def is_truthy(obj: object) -> bool:
+    if obj is None:
+        return False
+    if isinstance(obj, bool):
+        return obj
+
+    return True
+
+
+def stringify(obj: object) -> str:
+    match obj:
+        case True: return "true"
+        case False: return "false"
+        case None: return "nil"
+        case _ if isinstance(obj, float):
+            text: str = str(obj)
+            if text.endswith(".0"):
+                text = text[:-2]
+            return text
+
+    return str(obj)
+
+
+__all__ = ["is_equal", "is_truthy", "stringify"]
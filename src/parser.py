@@ -1,14 +1,33 @@
+from typing import Iterable, Iterator
+
 from errors import ParseError
 from expr import *
 from stmt import *
 from tokenclass import *
 
 
+# The grammar never needs to look further ahead than the next token, or back further than the last one, so those two
+# are all that's kept of the tokens, which are pulled from the scanner one at a time as the parser moves on. The
+# cursor stays on the EOF token once it's reached it
+class TokenCursor:
+    __slots__ = ("current", "previous", "__tokens")
+
+    def __init__(self, tokens: Iterable[Token]):
+        self.__tokens: Iterator[Token] = iter(tokens)
+        self.current: Token = next(self.__tokens)
+        self.previous: Token | None = None
+
+    def advance(self) -> None:
+        if self.current.type != TokenType.EOF:
+            self.previous = self.current
+            self.current = next(self.__tokens)
+
+
 class Parser:
-    def __init__(self, tokens: list[Token], lox_main):
+    # The tokens can be a list as well as a stream of them coming out of the scanner as they are needed
+    def __init__(self, tokens: Iterable[Token], lox_main):
         self.__lox_main = lox_main
-        self.__current: int = 0
-        self.__tokens: list[Token] = tokens
+        self.__tokens: TokenCursor = TokenCursor(tokens)
 
         self.__synchronization_tokens: list[TokenType] = [
             TokenType.CLASS,
@@ -360,19 +379,18 @@ class Parser:
         return False if self.__is_at_end() else self.__peek().type == typ
 
     def __advance(self) -> Token:
-        if not self.__is_at_end():
-            self.__current += 1
+        self.__tokens.advance()
 
         return self.__previous()
 
     def __is_at_end(self) -> bool:
-        return self.__peek().type == TokenType.EOF
+        return self.__tokens.current.type == TokenType.EOF
 
     def __peek(self) -> Token:
-        return self.__tokens[self.__current]
+        return self.__tokens.current
 
     def __previous(self) -> Token:
-        return self.__tokens[self.__current - 1]
+        return self.__tokens.previous
 
     def __consume(self, typ: TokenType, message: str) -> Token:
         if self.__check(typ):
@@ -0,0 +1,138 @@
+import time
+from typing import Callable, TextIO
+
+from lox_class import LoxClass
+from lox_function import LoxFunction
+from lox_native import native_functions
+
+
+# Every Lox function, class and native function called while profiling accumulates one of these
+class CallStats:
+    __slots__ = ("calls", "inclusive", "exclusive")
+
+    def __init__(self):
+        self.calls: int = 0
+        self.inclusive: float = 0.0  # Time spent in the callable, including the callables it called
+        self.exclusive: float = 0.0  # Time spent in the callable's own code
+
+
+# Instruments the calls to Lox functions, classes and native functions by swapping their call methods for timed
+# wrappers while it is running, so that it costs nothing at all when profiling is off. Functions compiled by the bytecode
+# VM and the Python backend aren't LoxFunctions, so only calls to classes and natives are seen there (as far as these
+# backends call them through LoxClass.call and the natives' call methods)
+class FunctionProfiler:
+    SCRIPT: str = "<script>"
+
+    def __init__(self):
+        self.stats: dict[str, CallStats] = {}
+        self.stacks: dict[tuple[str, ...], float] = {}  # Exclusive time by call stack
+        self.__path: list[str] = [self.SCRIPT]
+        self.__child_times: list[float] = [0.0]
+        self.__active: dict[str, int] = {}  # How many times a callable is on the stack, to time recursion only once
+        self.__labels: dict[object, str] = {}
+        self.__originals: list[tuple[type, str, Callable | None]] = []
+        self.__start: float = 0.0
+
+    def start(self) -> None:
+        profiler: FunctionProfiler = self
+        call = LoxFunction.call
+        invoke = LoxFunction.invoke
+        class_call = LoxClass.call
+
+        def profiled_call(function: LoxFunction, interpreter, arguments: list[object]) -> object:
+            return profiler.__measure(profiler.__function_label(function), call, function, interpreter, arguments)
+
+        def profiled_invoke(function: LoxFunction, interpreter, this: object | None, arguments: list[object]) -> object:
+            return profiler.__measure(profiler.__function_label(function), invoke, function, interpreter, this,
+                                      arguments)
+
+        def profiled_class_call(klass: LoxClass, interpreter, arguments: list[object]) -> object:
+            return profiler.__measure(str(klass), class_call, klass, interpreter, arguments)
+
+        self.__patch(LoxFunction, "call", profiled_call)
+        self.__patch(LoxFunction, "invoke", profiled_invoke)
+        self.__patch(LoxClass, "call", profiled_class_call)
+        for native in native_functions:
+            self.__patch(native, "call", self.__profiled_native(native.call))
+
+        self.__start = time.perf_counter()
+
+    def stop(self) -> None:
+        elapsed: float = time.perf_counter() - self.__start
+        for owner, name, original in reversed(self.__originals):
+            if original is None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+        self.__originals.clear()
+
+        # Whatever was left on the stack (by an uncaught runtime error, say) is charged to the script
+        del self.__path[1:], self.__child_times[1:]
+        self.__record(self.SCRIPT, elapsed, elapsed - self.__child_times[0], True)
+
+    def report(self, file: TextIO) -> None:
+        print(f"{'calls':>10} {'inclusive s':>12} {'self s':>12} {'self %':>7}  callable", file=file)
+        total: float = self.stats[self.SCRIPT].inclusive or 1.0
+        for label, stats in sorted(self.stats.items(), key=lambda item: item[1].exclusive, reverse=True):
+            print(f"{stats.calls:>10} {stats.inclusive:>12.6f} {stats.exclusive:>12.6f} "
+                  f"{stats.exclusive / total:>7.1%}  {label}", file=file)
+
+    # The collapsed stack format of Brendan Gregg's flamegraph.pl (and of speedscope, among others): one line for every
+    # distinct call stack, with the frames separated by semicolons, followed by the self time spent in it, in
+    # microseconds
+    def write_stacks(self, path: str) -> None:
+        with open(path, "wt", encoding="utf-8") as file:
+            for stack, exclusive in self.stacks.items():
+                microseconds: int = round(exclusive * 1_000_000)
+                if microseconds > 0:
+                    file.write(f"{';'.join(frame.replace(';', ':') for frame in stack)} {microseconds}\n")
+
+    def __patch(self, owner: type, name: str, replacement: Callable) -> None:
+        self.__originals.append((owner, name, owner.__dict__.get(name)))
+        setattr(owner, name, replacement)
+
+    def __profiled_native(self, call: Callable) -> Callable:
+        def profiled_call(native, interpreter, arguments: list[object]) -> object:
+            return self.__measure(f"<native fn {native.name}>", call, native, interpreter, arguments)
+
+        return profiled_call
+
+    def __function_label(self, function: LoxFunction) -> str:
+        label: str | None = self.__labels.get(function.declaration)
+        if label is None:
+            name = function.declaration.name
+            label = self.__labels[function.declaration] = f"{function} (line {name.line})"
+        return label
+
+    def __measure(self, label: str, call: Callable, *arguments: object) -> object:
+        self.__path.append(label)
+        self.__child_times.append(0.0)
+        active: int = self.__active.get(label, 0)
+        self.__active[label] = active + 1
+
+        start: float = time.perf_counter()
+        try:
+            return call(*arguments)
+        finally:
+            elapsed: float = time.perf_counter() - start
+            self.__active[label] = active
+            # Nothing below this frame is left on the stack by now, even if an error unwound through it
+            child_time: float = self.__child_times.pop()
+            self.__record(label, elapsed, elapsed - child_time, active == 0)
+            self.__path.pop()
+            self.__child_times[-1] += elapsed
+
+    def __record(self, label: str, inclusive: float, exclusive: float, outermost: bool) -> None:
+        stats: CallStats | None = self.stats.get(label)
+        if stats is None:
+            stats = self.stats[label] = CallStats()
+        stats.calls += 1
+        if outermost:
+            stats.inclusive += inclusive
+        stats.exclusive += exclusive
+
+        stack: tuple[str, ...] = tuple(self.__path)
+        self.stacks[stack] = self.stacks.get(stack, 0.0) + exclusive
+
+
+__all__ = ["CallStats", "FunctionProfiler"]
@@ -1,17 +1,45 @@
 import sys
+from argparse import ArgumentParser
+from enum import Enum, auto
 
+from closure_interpreter import ClosureInterpreter
+from constant_folder import ConstantFolder
+from counters import InterpreterCounters
+from dead_code_eliminator import DeadCodeEliminator
 from errors import LoxRuntimeError
+from inliner import Inliner
 from interpreter import *
 from parser import Parser
+from profiler import FunctionProfiler
+from regex_scanner import RegexScanner
 from resolver import Resolver
-from scanner import Scanner
+from sampler import SamplingProfiler
+from stack_interpreter import StackInterpreter
 from stmt import Stmt
 from tokenclass import *
+from transpiler import PythonBackend
+from vm import VM
+
+
+class Backend(Enum):
+    INTERPRETER = auto()
+    CLOSURES = auto()
+    PYTHON = auto()
+    VM = auto()
+    STACK = auto()
+
+
+backends: dict[Backend, type] = {Backend.INTERPRETER: Interpreter,
+                                 Backend.CLOSURES: ClosureInterpreter,
+                                 Backend.PYTHON: PythonBackend,
+                                 Backend.VM: VM,
+                                 Backend.STACK: StackInterpreter}
 
 
 class Lox:
-    def __init__(self):
-        self.__interpreter: Interpreter = Interpreter(self)
+    def __init__(self, backend: Backend = Backend.INTERPRETER, inline: bool = False):
+        self.__interpreter: Interpreter | PythonBackend | VM = backends[backend](self)
+        self.__inline: bool = inline
         self.had_error: bool = False
         self.had_runtime_error: bool = False
 
@@ -31,17 +59,29 @@ class Lox:
         self.had_error = True
 
     def __run(self, source: str, mode: OpMode) -> None:
-        tokens: list[Token] = Scanner(source, self).scan_tokens()
-        statements: list[Stmt] = Parser(tokens, self).parse()
+        if isinstance(self.__interpreter, PythonBackend) and self.__interpreter.run_cached(source, mode, self.__inline):
+            return
+
+        # The parser pulls the tokens from the scanner as it goes, so they are never all held at once
+        statements: list[Stmt] = Parser(RegexScanner(source, self).tokens(), self).parse()
 
         if self.had_error:
             return
 
-        Resolver(self.__interpreter, self).resolve(statements)
+        statements = ConstantFolder().fold(statements)
+        # A later line could redefine an inlined function, so the REPL never inlines anything
+        if self.__inline and mode == OpMode.SCRIPT:
+            statements = ConstantFolder().fold(Inliner().inline(statements))
+        resolver: Resolver = Resolver(self.__interpreter, self)
+        resolver.resolve(statements)
 
         if self.had_error:
             return
 
+        # Logical operators are only short-circuited now that the operands they throw away have been resolved
+        statements = ConstantFolder(short_circuit=True).fold(statements)
+        statements = DeadCodeEliminator(resolver.unused_locals).eliminate(statements)
+
         self.__interpreter.interpret(statements, mode)
 
     def run_repl(self) -> None:
@@ -67,11 +107,80 @@ class Lox:
             sys.exit(70)
 
 
-if __name__ == "__main__":
-    if (length := len(sys.argv)) > 2:
-        print("Usage: pylox.py [script]")
+class LoxArgumentParser(ArgumentParser):
+    # Keep the exit code for usage errors the same as it was before there were any options (EX_USAGE)
+    def error(self, message: str) -> None:
+        self.print_usage(sys.stderr)
+        print(f"{self.prog}: error: {message}", file=sys.stderr)
         sys.exit(64)
-    elif length == 2:
-        Lox().run_file(sys.argv[1])
-    else:
-        Lox().run_repl()
+
+
+if __name__ == "__main__":
+    arg_parser: ArgumentParser = LoxArgumentParser(prog="pylox.py")
+    arg_parser.add_argument("script", nargs="?")
+    arg_parser.add_argument("--backend", choices=[backend.name.lower() for backend in Backend],
+                            default=Backend.INTERPRETER.name.lower(),
+                            help="execution backend: the tree-walking interpreter, the AST compiled to closures, the program "
+                                 "translated to Python, the bytecode VM or the AST evaluated on an explicit stack, which "
+                                 "isn't limited by Python's recursion limit")
+    arg_parser.add_argument("--inline", action="store_true",
+                            help="replace calls to small functions returning a pure expression with the expression")
+    arg_parser.add_argument("--profile", action="store_true",
+                            help="time every call to a Lox function, class or native function and print a report to "
+                                 "stderr at exit")
+    arg_parser.add_argument("--profile-stacks", metavar="FILE",
+                            help="profile and write the self time of every call stack to FILE in the collapsed stack "
+                                 "format taken by flame graph tools")
+    arg_parser.add_argument("--sample", action="store_true",
+                            help="sample the statement being run by the interpreter at regular intervals and print the "
+                                 "hottest lines to stderr at exit")
+    arg_parser.add_argument("--sample-stacks", metavar="FILE",
+                            help="sample and write the number of samples of every call stack to FILE in the collapsed "
+                                 "stack format")
+    arg_parser.add_argument("--sample-interval", metavar="MS", type=float, default=1.0,
+                            help="milliseconds between samples (default: 1)")
+    arg_parser.add_argument("--counters", action="store_true",
+                            help="count the nodes evaluated, the frames, cells and bound methods allocated, the returns, "
+                                 "variable lookups and native calls, and print them to stderr as JSON at exit")
+    args = arg_parser.parse_args()
+
+    sampling: bool = args.sample or args.sample_stacks is not None
+    if sampling and args.backend != Backend.INTERPRETER.name.lower():
+        arg_parser.error("sampling needs the interpreter backend")
+    if args.sample_interval <= 0:
+        arg_parser.error("the sampling interval must be positive")
+
+    lox: Lox = Lox(Backend[args.backend.upper()], args.inline)
+    profiler: FunctionProfiler | None = FunctionProfiler() if args.profile or args.profile_stacks else None
+    sampler: SamplingProfiler | None = SamplingProfiler(args.sample_interval / 1000) if sampling else None
+    counters: InterpreterCounters | None = InterpreterCounters() if args.counters else None
+    if profiler is not None:
+        profiler.start()
+    if counters is not None:
+        counters.start()
+    if sampler is not None:
+        sampler.start()
+
+    try:
+        if args.script is not None:
+            lox.run_file(args.script)
+        else:
+            lox.run_repl()
+    finally:
+        if sampler is not None:
+            sampler.stop()
+            source: str | None = None
+            if args.script is not None:
+                with open(args.script, "rt", encoding="utf-8") as file:
+                    source = file.read()
+            sampler.report(sys.stderr, source)
+            if args.sample_stacks is not None:
+                sampler.write_stacks(args.sample_stacks)
+        if counters is not None:
+            counters.stop()
+            counters.dump(sys.stderr)
+        if profiler is not None:
+            profiler.stop()
+            profiler.report(sys.stderr)
+            if args.profile_stacks is not None:
+                profiler.write_stacks(args.profile_stacks)
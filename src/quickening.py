@@ -0,0 +1,117 @@
+from expr import BinaryExpr, CallExpr
+from tokenclass import TokenType
+
+
+# The tree-walking interpreter rewrites binary expressions in place, the first time it evaluates them, into a node
+# specialised for the operand types it saw (for example, FloatAddExpr after adding two numbers), by swapping the node's
+# class, which makes the node dispatch to a different visitor method. A specialised node only has to check that it got
+# the same types again to do its operation directly, without looking up the operator's handler or having the operands
+# checked separately. As soon as it gets other types, it turns into a GenericBinaryExpr for good, so that a polymorphic
+# expression doesn't keep switching back and forth. The other backends never see these classes, since nodes are only
+# rewritten while being evaluated by the interpreter. Proving ahead of time which operands are always numbers, so that
+# even the type checks of the specialised nodes could be left out, was tried and made no measurable difference (the
+# equality benchmark ran in 0.355 s with it and 0.342 s without), so they stay. A class can only be swapped for one with
+# the same layout, so none of them add any slots
+
+class GenericBinaryExpr(BinaryExpr):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visit_generic_binary_expr(self)
+
+
+class FloatAddExpr(BinaryExpr):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visit_float_add_expr(self)
+
+
+class FloatSubtractExpr(BinaryExpr):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visit_float_subtract_expr(self)
+
+
+class FloatMultiplyExpr(BinaryExpr):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visit_float_multiply_expr(self)
+
+
+class FloatDivideExpr(BinaryExpr):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visit_float_divide_expr(self)
+
+
+class FloatLessExpr(BinaryExpr):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visit_float_less_expr(self)
+
+
+class FloatLessEqualExpr(BinaryExpr):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visit_float_less_equal_expr(self)
+
+
+class FloatGreaterExpr(BinaryExpr):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visit_float_greater_expr(self)
+
+
+class FloatGreaterEqualExpr(BinaryExpr):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visit_float_greater_equal_expr(self)
+
+
+class StringAddExpr(BinaryExpr):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visit_string_add_expr(self)
+
+
+specialisations: dict[tuple[TokenType, type], type[BinaryExpr]] = {
+    (TokenType.PLUS, float): FloatAddExpr,
+    (TokenType.MINUS, float): FloatSubtractExpr,
+    (TokenType.STAR, float): FloatMultiplyExpr,
+    (TokenType.SLASH, float): FloatDivideExpr,
+    (TokenType.LESS, float): FloatLessExpr,
+    (TokenType.LESS_EQUAL, float): FloatLessEqualExpr,
+    (TokenType.GREATER, float): FloatGreaterExpr,
+    (TokenType.GREATER_EQUAL, float): FloatGreaterEqualExpr,
+    (TokenType.PLUS, str): StringAddExpr
+}
+
+
+# Calls in tail position (see Resolver.visit_return_stmt) are given this class by the interpreter before running
+class TailCallExpr(CallExpr):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visit_tail_call_expr(self)
+
+
+# The class an unspecialised binary expression turns into, after being evaluated on these operands
+def specialise(expr: BinaryExpr, left: object, right: object) -> type[BinaryExpr]:
+    if type(left) is not type(right):
+        return GenericBinaryExpr
+
+    return specialisations.get((expr.operator.type, type(left)), GenericBinaryExpr)
+
+
+__all__ = ["GenericBinaryExpr", "FloatAddExpr", "FloatSubtractExpr", "FloatMultiplyExpr", "FloatDivideExpr",
+           "FloatLessExpr", "FloatLessEqualExpr", "FloatGreaterExpr", "FloatGreaterEqualExpr", "StringAddExpr",
+           "TailCallExpr", "specialise"]
@@ -0,0 +1,102 @@
+import re
+import sys
+from typing import Iterator
+
+from tokenclass import *
+
+keywords: dict[str, TokenType] = {"and": TokenType.AND,
+                                  "class": TokenType.CLASS,
+                                  "else": TokenType.ELSE,
+                                  "false": TokenType.FALSE,
+                                  "for": TokenType.FOR,
+                                  "fun": TokenType.FUN,
+                                  "if": TokenType.IF,
+                                  "nil": TokenType.NIL,
+                                  "or": TokenType.OR,
+                                  "print": TokenType.PRINT,
+                                  "return": TokenType.RETURN,
+                                  "super": TokenType.SUPER,
+                                  "this": TokenType.THIS,
+                                  "true": TokenType.TRUE,
+                                  "var": TokenType.VAR,
+                                  "while": TokenType.WHILE}
+
+operators: dict[str, TokenType] = {"(": TokenType.LEFT_PAREN,
+                                   ")": TokenType.RIGHT_PAREN,
+                                   "{": TokenType.LEFT_BRACE,
+                                   "}": TokenType.RIGHT_BRACE,
+                                   ",": TokenType.COMMA,
+                                   ".": TokenType.DOT,
+                                   "-": TokenType.MINUS,
+                                   "+": TokenType.PLUS,
+                                   ";": TokenType.SEMICOLON,
+                                   "*": TokenType.STAR,
+                                   "^": TokenType.CARET,
+                                   "%": TokenType.PERCENT,
+                                   "/": TokenType.SLASH,
+                                   "!": TokenType.BANG,
+                                   "!=": TokenType.BANG_EQUAL,
+                                   "=": TokenType.EQUAL,
+                                   "==": TokenType.EQUAL_EQUAL,
+                                   "<": TokenType.LESS,
+                                   "<=": TokenType.LESS_EQUAL,
+                                   ">": TokenType.GREATER,
+                                   ">=": TokenType.GREATER_EQUAL}
+
+# Whitespace and comments are skipped before every token instead of being matched on their own, and then one of the
+# alternatives matches: a name, an operator, a run of newlines, a number, a string, or a single character no token can
+# start with, each captured by its own group, or the end of the source after trailing whitespace, which captures
+# nothing. Comments are skipped before the slash operator is tried, and the two character operators are tried before
+# the one character ones. Digits and letters are ASCII only, like in the character by character scanner. A string
+# without its closing quote runs to the end of the source
+token_pattern: re.Pattern = re.compile(r"""
+    (?:[ \t\r]+|//[^\n]*)*
+    (?:([A-Za-z_][A-Za-z0-9_]*)
+      |([!=<>]=?|[(){},.\-+;*^%/])
+      |(\n+)
+      |([0-9]+(?:\.[0-9]+)?)
+      |("[^"]*"?)
+      |(.)
+      |\Z)
+""", re.VERBOSE | re.DOTALL)
+
+
+# Produces the same tokens as Scanner, with the same lines and errors, but matches them with one compiled regular
+# expression, instead of going over the source a character at a time through method calls. As in Scanner, the
+# newlines inside a string don't count towards the line numbers. The tokens can either be had all at once, or streamed
+# as the parser asks for them, so that they never all have to be in memory at the same time; errors are reported as
+# the characters they are about are reached either way. Names are interned, so that every token of the same variable
+# shares one string, and looking them up in dicts finds the keys by identity
+class RegexScanner:
+    def __init__(self, source: str, lox_main):
+        self.__lox_main = lox_main
+        self.__source: str = source
+
+    def scan_tokens(self) -> list[Token]:
+        return list(self.tokens())
+
+    def tokens(self) -> Iterator[Token]:
+        line: int = 1
+
+        for name, operator, newlines, number, string, unexpected in \
+                map(re.Match.groups, token_pattern.finditer(self.__source)):
+            if name:
+                yield Token(keywords.get(name, TokenType.IDENTIFIER), sys.intern(name), None, line)
+            elif operator:
+                yield Token(operators[operator], operator, None, line)
+            elif newlines:
+                line += len(newlines)
+            elif number:
+                yield Token(TokenType.NUMBER, number, float(number), line)
+            elif string:
+                if len(string) == 1 or string[-1] != "\"":
+                    self.__lox_main.line_error(line, "Unterminated string.")
+                else:
+                    yield Token(TokenType.STRING, string, string[1:-1], line)
+            elif unexpected:
+                self.__lox_main.line_error(line, "Unexpected character.")
+
+        yield Token(TokenType.EOF, "", None, line)
+
+
+__all__ = ["RegexScanner"]
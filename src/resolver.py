@@ -19,21 +19,76 @@ class FunctionType(Enum):
     METHOD = auto()
 
 
+# Where a resolved variable lives at runtime. Every function call gets one flat frame for all of its locals, blocks
+# included; only the locals captured by a closure are boxed in a Cell, which the closure shares as an upvalue
+class VariableKind(Enum):
+    LOCAL = auto()
+    CELL = auto()
+    UPVALUE = auto()
+
+
+class FunctionLayout:
+    def __init__(self, frame_size: int, parameters: int, boxed: tuple[int, ...], upvalues: tuple[tuple[bool, int], ...]):
+        self.frame_size: int = frame_size
+        # Filler for the frame slots after the parameters (and "this"), which are only written by their declarations
+        self.padding: list[None] = [None] * (frame_size - parameters)
+        # Parameter slots (and "this") that are captured, so have to be boxed on entry
+        self.boxed: tuple[int, ...] = boxed
+        # Captured from the enclosing function on creation: either a Cell in its frame (True) or one of its upvalues
+        self.upvalues: tuple[tuple[bool, int], ...] = upvalues
+
+
+class Local:
+    __slots__ = ("slot", "declaration", "defined", "captured", "references")
+
+    def __init__(self, slot: int, declaration: object | None):
+        self.slot: int = slot
+        # The declaring node, None for parameters and "this", which are stored by the call itself
+        self.declaration: object | None = declaration
+        self.defined: bool = False
+        self.captured: bool = False
+        # Whether the variable needs a Cell is only known once its scope ends, so resolving the reads and writes of it
+        # is held off until then
+        self.references: list[object] = []
+
+
+class FunctionScope:
+    def __init__(self, enclosing):
+        self.enclosing: FunctionScope | None = enclosing
+        self.scopes: deque[dict[str, Local]] = deque()
+        self.upvalues: dict[tuple[bool, int], int] = {}
+        self.next_slot: int = 0
+        self.frame_size: int = 0
+
+    def add_upvalue(self, is_local: bool, index: int) -> int:
+        return self.upvalues.setdefault((is_local, index), len(self.upvalues))
+
+    def find_local(self, name: str) -> Local | None:
+        for scope in reversed(self.scopes):
+            if (local := scope.get(name)) is not None:
+                return local
+
+        return None
+
+
 class Resolver(ExprVisitor, StmtVisitor):
     def __init__(self, interpreter, lox_main):
         self.__lox_main = lox_main
         self.__interpreter = interpreter
-        self.__scopes: deque[dict[str, bool]] = deque()
+        # The top level code is a function too: its block scoped locals live in a frame just like those of a call
+        self.__function: FunctionScope = FunctionScope(None)
         self.__current_function: FunctionType = FunctionType.NONE
         self.__current_class: ClassType = ClassType.NONE
+        # Declarations of locals that are never read, written or captured, for the dead code eliminator
+        self.unused_locals: set[object] = set()
 
     def resolve(self, statements: list[Stmt]) -> None:
-        for statement in statements:
-            self.__resolve(statement)
+        self.__resolve_statements(statements)
+        self.__interpreter.resolve_script(self.__function.frame_size)
 
     def visit_assign_expr(self, expr: AssignExpr) -> None:
         self.__resolve(expr.value)
-        self.__resolve_local(expr, expr.name)
+        self.__resolve_local(expr, expr.name.lexeme)
 
     def visit_binary_expr(self, expr: BinaryExpr) -> None:
         self.__resolve(expr.left)
@@ -69,36 +124,37 @@ class Resolver(ExprVisitor, StmtVisitor):
         elif self.__current_class != ClassType.SUBCLASS:
             self.__lox_main.token_error(expr.keyword, "Can't use 'super' in a class with no superclass.")
 
-        self.__resolve_local(expr, expr.keyword)
+        self.__resolve_local(expr, expr.keyword.lexeme)
+        # The method is bound to "this", which is resolved separately, as it lives in the method's frame
+        self.__resolve_local((expr, "this"), "this")
 
     def visit_this_expr(self, expr: ThisExpr) -> None:
         if self.__current_class == ClassType.NONE:
             self.__lox_main.token_error(expr.keyword, "Can't use 'this' outside of a class.")
             return
 
-        self.__resolve_local(expr, expr.keyword)
+        self.__resolve_local(expr, expr.keyword.lexeme)
 
     def visit_unary_expr(self, expr: UnaryExpr) -> None:
         self.__resolve(expr.right)
 
     def visit_variable_expr(self, expr: VariableExpr) -> None:
-        # Comparing as "is False" because "get" can return None, which is also false, but shouldn't satisfy the
-        # condition
-        if len(self.__scopes) != 0 and self.__scopes[-1].get(expr.name.lexeme) is False:
+        scopes: deque[dict[str, Local]] = self.__function.scopes
+        if len(scopes) != 0 and (local := scopes[-1].get(expr.name.lexeme)) is not None and not local.defined:
             self.__lox_main.token_error(expr.name, "Can't read local variable in its own initializer.")
 
-        self.__resolve_local(expr, expr.name)
+        self.__resolve_local(expr, expr.name.lexeme)
 
     def visit_block_stmt(self, stmt: BlockStmt) -> None:
         self.__begin_scope()
-        self.resolve(stmt.statements)
+        self.__resolve_statements(stmt.statements)
         self.__end_scope()
 
     def visit_class_stmt(self, stmt: ClassStmt) -> None:
         enclosing_class: ClassType = self.__current_class
         self.__current_class = ClassType.CLASS
 
-        self.__declare(stmt.name)
+        self.__declare(stmt, stmt.name)
         self.__define(stmt.name)
 
         if stmt.superclass is not None:
@@ -108,19 +164,15 @@ class Resolver(ExprVisitor, StmtVisitor):
             self.__current_class = ClassType.SUBCLASS
             self.__resolve(stmt.superclass)
 
+            # "super" is a hidden local of the scope around the class, which its methods capture
             self.__begin_scope()
-            self.__scopes[-1] |= {"super": True}
-
-        self.__begin_scope()
-        self.__scopes[-1] |= {"this": True}
+            self.__declare_implicit("super", (stmt, "super"))
 
         for method in stmt.methods:
             declaration: FunctionType = \
                 FunctionType.INITIALIZER if method.name.lexeme == "init" else FunctionType.METHOD
             self.__resolve_function(method, declaration)
 
-        self.__end_scope()
-
         if stmt.superclass is not None:
             self.__end_scope()
 
@@ -130,7 +182,7 @@ class Resolver(ExprVisitor, StmtVisitor):
         self.__resolve(stmt.expression)
 
     def visit_function_stmt(self, stmt: FunctionStmt) -> None:
-        self.__declare(stmt.name)
+        self.__declare(stmt, stmt.name)
         self.__define(stmt.name)
 
         self.__resolve_function(stmt, FunctionType.FUNCTION)
@@ -155,8 +207,13 @@ class Resolver(ExprVisitor, StmtVisitor):
 
             self.__resolve(stmt.value)
 
+            # Nothing is left to do in the function once a call it returns the result of is made, so the backend can
+            # run the call after returning from the function instead, in the same stack space
+            if isinstance(stmt.value, CallExpr) and self.__current_function != FunctionType.NONE:
+                self.__interpreter.resolve_tail_call(stmt.value)
+
     def visit_var_stmt(self, stmt: VarStmt) -> None:
-        self.__declare(stmt.name)
+        self.__declare(stmt, stmt.name)
 
         if stmt.initializer is not None:
             self.__resolve(stmt.initializer)
@@ -170,46 +227,104 @@ class Resolver(ExprVisitor, StmtVisitor):
     def __resolve(self, target: Expr | Stmt) -> None:
         target.accept(self)
 
-    def __resolve_local(self, expr: Expr, name: Token) -> None:
-        for i in range(len(self.__scopes) - 1, -1, -1):
-            if name.lexeme in self.__scopes[i]:
-                self.__interpreter.resolve(expr, len(self.__scopes) - 1 - i)
-                return
+    def __resolve_statements(self, statements: list[Stmt]) -> None:
+        for statement in statements:
+            self.__resolve(statement)
+
+    # Anything not found in a local scope is a global, which are looked up by name at runtime
+    def __resolve_local(self, node: object, name: str) -> None:
+        local: Local | None = self.__function.find_local(name)
+        if local is not None:
+            local.references.append(node)
+            return
+
+        upvalue: int | None = self.__resolve_upvalue(self.__function, name)
+        if upvalue is not None:
+            self.__interpreter.resolve(node, VariableKind.UPVALUE, upvalue)
+
+    def __resolve_upvalue(self, function: FunctionScope, name: str) -> int | None:
+        if function.enclosing is None:
+            return None
+
+        local: Local | None = function.enclosing.find_local(name)
+        if local is not None:
+            local.captured = True
+            return function.add_upvalue(True, local.slot)
+
+        upvalue: int | None = self.__resolve_upvalue(function.enclosing, name)
+        return None if upvalue is None else function.add_upvalue(False, upvalue)
 
     def __resolve_function(self, function: FunctionStmt, typ: FunctionType) -> None:
         enclosing_function: FunctionType = self.__current_function
         self.__current_function = typ
+        self.__function = FunctionScope(self.__function)
 
         self.__begin_scope()
+        if typ in (FunctionType.METHOD, FunctionType.INITIALIZER):
+            self.__declare_implicit("this", None)
+
         for param in function.params:
-            self.__declare(param)
+            self.__declare(None, param)
             self.__define(param)
 
-        self.resolve(function.body)
+        parameters: int = self.__function.next_slot
+        self.__resolve_statements(function.body)
+
+        boxed: tuple[int, ...] = tuple(local.slot for local in self.__function.scopes[-1].values()
+                                       if local.captured and local.declaration is None)
         self.__end_scope()
+
+        self.__interpreter.resolve_function(
+            function, FunctionLayout(self.__function.frame_size, parameters, boxed, tuple(self.__function.upvalues)))
+        self.__function = self.__function.enclosing
         self.__current_function = enclosing_function
 
     def __begin_scope(self) -> None:
-        self.__scopes.append({})
+        self.__function.scopes.append({})
 
     def __end_scope(self) -> None:
-        self.__scopes.pop()
+        scope: dict[str, Local] = self.__function.scopes.pop()
+        self.__function.next_slot -= len(scope)
 
-    def __declare(self, name: Token) -> None:
-        if len(self.__scopes) == 0:
+        for local in scope.values():
+            if local.declaration is not None and not local.references and not local.captured:
+                self.unused_locals.add(local.declaration)
+
+            kind: VariableKind = VariableKind.CELL if local.captured else VariableKind.LOCAL
+            if local.declaration is not None:
+                self.__interpreter.resolve(local.declaration, kind, local.slot)
+            for reference in local.references:
+                self.__interpreter.resolve(reference, kind, local.slot)
+
+    def __declare(self, declaration: object | None, name: Token) -> None:
+        if len(self.__function.scopes) == 0:
             return
 
-        scope: dict[str, bool] = self.__scopes[-1]
+        scope: dict[str, Local] = self.__function.scopes[-1]
         if name.lexeme in scope:
             self.__lox_main.token_error(name, "Already a variable with this name in this scope.")
+            return
 
-        scope |= {name.lexeme: False}
+        scope |= {name.lexeme: self.__new_local(declaration)}
+
+    def __declare_implicit(self, name: str, declaration: object | None) -> None:
+        local: Local = self.__new_local(declaration)
+        local.defined = True
+        self.__function.scopes[-1] |= {name: local}
 
     def __define(self, name: Token) -> None:
-        if len(self.__scopes) == 0:
+        if len(self.__function.scopes) == 0:
             return
 
-        self.__scopes[-1] |= {name.lexeme: True}
+        self.__function.scopes[-1][name.lexeme].defined = True
+
+    def __new_local(self, declaration: object | None) -> Local:
+        function: FunctionScope = self.__function
+        local: Local = Local(function.next_slot, declaration)
+        function.next_slot += 1
+        function.frame_size = max(function.frame_size, function.next_slot)
+
+        return local
 
 
-__all__ = "Resolver"
+__all__ = ["FunctionLayout", "Resolver", "VariableKind"]
@@ -1,7 +1,27 @@
-class Return(Exception):
-    def __init__(self, value: object | None):
-        super().__init__()
-        self.value: object | None = value
+# Completion record of a return statement. Rather than raising, it's handed back up through every statement enclosing
+# the return, up to the function call, which then picks up the value the backend stored on the way out. Statements
+# completing normally return anything else (None, or their expression's value in the closure backend), which an
+# enclosing statement carries on after
+class Return:
+    __slots__ = ()
 
+    def __repr__(self) -> str:
+        return "RETURN"
 
-__all__ = "Return"
+
+RETURN: Return = Return()
+
+
+# What a function returns in place of calling the Lox function its return statement calls in tail position (see
+# Resolver.visit_return_stmt). The function itself is done by then, so LoxFunction.invoke runs the call in its stead,
+# in the same loop, rather than in a Python call nested in the body of the caller
+class TailCall:
+    __slots__ = ("function", "this", "arguments")
+
+    def __init__(self, function, this: object | None, arguments: list[object]):
+        self.function = function
+        self.this: object | None = this
+        self.arguments: list[object] = arguments
+
+
+__all__ = ["Return", "RETURN", "TailCall"]
@@ -0,0 +1,144 @@
+import sys
+import threading
+from collections import Counter
+from typing import TextIO
+
+from expr import Expr
+from interpreter import Interpreter
+from lox_function import LoxFunction, run_tail_calls
+from stmt import BlockStmt, Stmt
+from tokenclass import Token
+
+
+# Finds the line of the first token in a node, looking through its fields in order (which is the order they appear in
+# the source, but for the closing parentheses of calls), or None for nodes without any token, such as literals. The
+# fields are the slots of the node's class, or of the class it was generated as, for the classes the interpreter swaps
+# in (see quickening.py), which add none
+def first_line(node: object) -> int | None:
+    if isinstance(node, Token):
+        return node.line
+    if isinstance(node, list):
+        fields = node
+    elif isinstance(node, (Expr, Stmt)):
+        fields = [getattr(node, name) for cls in type(node).__mro__ for name in cls.__dict__.get("__slots__", ())]
+    else:
+        return None
+
+    for field in fields:
+        line: int | None = first_line(field)
+        if line is not None:
+            return line
+    return None
+
+
+# Samples the statement the tree-walking interpreter is executing and the Lox calls leading to it, at regular intervals,
+# from a timer thread. The sampled thread's Python stack already holds everything needed (the statement being visited
+# in each Interpreter.__execute frame, the function in each frame calling one), so the interpreter itself does
+# no bookkeeping at all and runs at full speed when not sampled. The other backends don't execute statements through
+# the visitor, so there is nothing to sample there
+class SamplingProfiler:
+    SCRIPT: str = "<script>"
+
+    __EXECUTE = Interpreter._Interpreter__execute.__code__
+    # The frames running a Lox function's body, by the local holding the function
+    __CALLS: dict = {LoxFunction.call.__code__: "self", LoxFunction.invoke.__code__: "self",
+                     run_tail_calls.__code__: "function"}
+    __TAIL_CALLS = run_tail_calls.__code__
+
+    def __init__(self, interval: float = 0.001):
+        self.interval: float = interval
+        self.samples: int = 0
+        self.exclusive: Counter[int] = Counter()  # Samples where the line was the innermost statement
+        self.inclusive: Counter[int] = Counter()  # Samples where the line was anywhere on the stack
+        self.stacks: Counter[tuple[str, ...]] = Counter()  # Samples by Lox call stack, ending with the sampled line
+        self.functions: dict[int, str] = {}  # The function every sampled line is in
+        self.__lines: dict[Stmt, int | None] = {}
+        self.__thread_id: int | None = None
+        self.__thread: threading.Thread | None = None
+        self.__stopped: threading.Event = threading.Event()
+        self.__switch_interval: float = sys.getswitchinterval()
+
+    def start(self) -> None:
+        self.__thread_id = threading.get_ident()
+        self.__stopped.clear()
+        # The sampling thread can only run once the interpreter's thread gives the GIL up, which by default happens
+        # every 5 milliseconds
+        self.__switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self.__switch_interval, self.interval))
+
+        self.__thread = threading.Thread(target=self.__run, name="lox-sampler", daemon=True)
+        self.__thread.start()
+
+    def stop(self) -> None:
+        self.__stopped.set()
+        self.__thread.join()
+        sys.setswitchinterval(self.__switch_interval)
+
+    def report(self, file: TextIO, source: str | None = None) -> None:
+        source_lines: list[str] = source.splitlines() if source is not None else []
+        print(f"{self.samples} samples every {self.interval * 1000:g} ms", file=file)
+        print(f"{'line':>6} {'self':>7} {'self %':>7} {'total %':>7}  {'function':<24} source", file=file)
+
+        total: int = self.samples or 1
+        for line, samples in sorted(self.inclusive.items(), key=lambda item: (self.exclusive[item[0]], item[1]),
+                                    reverse=True):
+            text: str = source_lines[line - 1].strip() if 0 < line <= len(source_lines) else ""
+            print(f"{line:>6} {self.exclusive[line]:>7} {self.exclusive[line] / total:>7.1%} {samples / total:>7.1%}  "
+                  f"{self.functions[line]:<24} {text}", file=file)
+
+    # The same collapsed stack format as FunctionProfiler.write_stacks, counting samples instead of microseconds
+    def write_stacks(self, path: str) -> None:
+        with open(path, "wt", encoding="utf-8") as file:
+            for stack, samples in self.stacks.items():
+                file.write(f"{';'.join(frame.replace(';', ':') for frame in stack)} {samples}\n")
+
+    def __run(self) -> None:
+        while not self.__stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.__thread_id)
+            if frame is not None:
+                self.__sample(frame)
+
+    def __sample(self, frame) -> None:
+        entries: list[int | str] = []  # Statement lines and called functions, from the innermost frame outwards
+        # The function whose body made the tail calls being run has returned already, so it's left out
+        returned: bool = False
+        while frame is not None:
+            if frame.f_code is self.__EXECUTE:
+                line: int | None = self.__line(frame.f_locals["stmt"])
+                if line is not None:
+                    entries.append(line)
+            elif (local := self.__CALLS.get(frame.f_code)) is not None:
+                if not returned:
+                    function: LoxFunction = frame.f_locals[local]
+                    entries.append(f"{function} (line {function.declaration.name.line})")
+                returned = frame.f_code is self.__TAIL_CALLS
+            frame = frame.f_back
+
+        lines: set[int] = set()
+        stack: list[str] = [self.SCRIPT]
+        for entry in reversed(entries):
+            if isinstance(entry, str):
+                stack.append(entry)
+            else:
+                lines.add(entry)
+                self.functions.setdefault(entry, stack[-1])
+        if not lines:
+            return
+
+        innermost: int = next(entry for entry in entries if isinstance(entry, int))
+        self.samples += 1
+        self.exclusive[innermost] += 1
+        self.inclusive.update(lines)
+        self.stacks[(*stack, f"line {innermost}")] += 1
+
+    def __line(self, stmt: Stmt) -> int | None:
+        try:
+            return self.__lines[stmt]
+        except KeyError:
+            # Blocks are left out: the statement running inside them is more precise
+            line: int | None = None if isinstance(stmt, BlockStmt) else first_line(stmt)
+            self.__lines[stmt] = line
+            return line
+
+
+__all__ = ["SamplingProfiler", "first_line"]
@@ -1,4 +1,5 @@
 import string
+import sys
 
 from tokenclass import *
 
@@ -142,12 +143,12 @@ class Scanner:
         while self.__peek() in self.__symbols:
             self.__advance()
 
-        text: str = self.__source[self.__start: self.__current]
+        text: str = sys.intern(self.__source[self.__start: self.__current])
         typ: TokenType = self.__keywords.get(text)
         if typ is None:
             typ = TokenType.IDENTIFIER
 
-        self.__add_simple_token(typ)
+        self.__tokens.append(Token(typ, text, None, self.__line))
 
     # Special token handlers
 
@@ -0,0 +1,484 @@
+from math import nan
+from typing import Callable
+
+from environment import *
+from errors import LoxRuntimeError, LoxFunctionError
+from expr import *
+from interpreter import *
+from lox_callable import LoxCallable
+from lox_class import *
+from lox_function import LoxFunction
+from lox_value import *
+from quickening import TailCallExpr
+from resolver import VariableKind
+from stmt import *
+from tokenclass import *
+
+# Calls deeper than this are taken for a runaway recursion rather than a deep one, and stopped within a second or so,
+# before they use up much memory. It's 16 times as deep as the VM goes, and can be set per interpreter. Tail calls take
+# the place of the call they're made from, so they never count towards it
+MAX_CALL_DEPTH: int = 65_536
+
+# Expressions read directly, without side effects or operands to evaluate first
+LEAVES: frozenset[type] = frozenset({LiteralExpr, VariableExpr})
+
+# A pending piece of work: the step to take, and the node (or saved state) it's taken on
+Step = tuple[Callable[[object], None], object]
+
+
+# A caller's state, saved on the work stack when calling a function and restored when it returns
+class CallBoundary:
+    __slots__ = ("frame", "upvalues", "this", "is_initializer")
+
+    def __init__(self, frame: list[object], upvalues: list[Cell], this: object | None, is_initializer: bool):
+        self.frame: list[object] = frame
+        self.upvalues: list[Cell] = upvalues
+        self.this: object | None = this
+        self.is_initializer: bool = is_initializer
+
+
+# Runs the AST without recursing in Python: the work left to do is kept on a stack of steps and the values computed so
+# far on a stack of values, both plain lists on the heap. Visiting a node takes its first step, which either pushes its
+# value right away (for literals and variables), or pushes the steps of its operands along with the step finishing it,
+# which pops their values off the value stack. Every expression leaves exactly one value there, statements none.
+# Calling a Lox function pushes a CallBoundary and the function's body instead of nesting a Python call, and a return
+# drops the steps left in the body up to the boundary, so how deep Lox code can recurse only depends on the memory
+# available, and every call or nested expression costs a few list operations rather than Python frames
+class StackInterpreter(Interpreter):
+    def __init__(self, lox_main, max_call_depth: int = MAX_CALL_DEPTH):
+        super().__init__(lox_main)
+        self.__lox_main = lox_main
+        self.__max_call_depth: int = max_call_depth
+        self.__script_frame_size: int = 0
+
+        self.__steps: list[Step] = []
+        self.__values: list[object] = []
+        self.__depth: int = 0
+
+        # Bound once, so that a boundary can be told apart from the other steps by identity
+        self.__return_step: Callable[[CallBoundary], None] = self.__return
+        self.__visits: dict[type, Callable[[object], None]] = {
+            AssignExpr: self.visit_assign_expr, BinaryExpr: self.visit_binary_expr, CallExpr: self.visit_call_expr,
+            TailCallExpr: self.visit_call_expr,
+            GetExpr: self.visit_get_expr, GroupingExpr: self.visit_grouping_expr,
+            LiteralExpr: self.visit_literal_expr, LogicalExpr: self.visit_logical_expr, SetExpr: self.visit_set_expr,
+            SuperExpr: self.visit_super_expr, ThisExpr: self.visit_this_expr, UnaryExpr: self.visit_unary_expr,
+            VariableExpr: self.visit_variable_expr,
+            BlockStmt: self.visit_block_stmt, ClassStmt: self.visit_class_stmt,
+            ExpressionStmt: self.visit_expression_stmt, FunctionStmt: self.visit_function_stmt,
+            IfStmt: self.visit_if_stmt, PrintStmt: self.visit_print_stmt, ReturnStmt: self.visit_return_stmt,
+            VarStmt: self.visit_var_stmt, WhileStmt: self.visit_while_stmt
+        }
+
+        self.__binary_operators: dict[TokenType, Callable[[Token, object, object], object]] = {
+            TokenType.MINUS: self.__numbers(lambda left, right: left - right),
+            TokenType.PLUS: self.__plus,
+            TokenType.SLASH: self.__numbers(lambda left, right: nan if left == right == 0 else left / right),
+            TokenType.STAR: self.__numbers(lambda left, right: left * right),
+            TokenType.CARET: self.__numbers(lambda left, right: left ** right),
+            TokenType.PERCENT: self.__numbers(lambda left, right: left % right),
+            TokenType.GREATER: self.__numbers(lambda left, right: left > right),
+            TokenType.GREATER_EQUAL: self.__numbers(lambda left, right: left >= right),
+            TokenType.LESS: self.__numbers(lambda left, right: left < right),
+            TokenType.LESS_EQUAL: self.__numbers(lambda left, right: left <= right),
+            TokenType.BANG_EQUAL: lambda _, left, right: not is_equal(left, right),
+            TokenType.EQUAL_EQUAL: lambda _, left, right: is_equal(left, right)
+        }
+
+    def interpret(self, statements: list[Stmt], mode: OpMode) -> None:
+        self._frame = [None] * self.__script_frame_size
+        self._upvalues = []
+        self._mark_tail_calls()
+
+        self.__steps.append((None, None))
+        for statement in reversed(statements):
+            if mode == OpMode.INTERACTIVE and isinstance(statement, ExpressionStmt):
+                self.__steps.append((self.__print, None))
+                self.__schedule(statement.expression)
+            else:
+                self.__schedule(statement)
+
+        try:
+            self.__run()
+        except LoxRuntimeError as err:
+            self.__steps.clear()
+            self.__values.clear()
+            self.__depth = 0
+            self.__lox_main.runtime_error(err)
+
+    # Only for calls made through LoxFunction.invoke, from outside the evaluator, which get a run loop of their own
+    def execute_function(self, statements: list[Stmt], frame: list[object], upvalues: list[Cell]) -> object:
+        self.__steps.append((None, None))
+        self.__enter(frame, upvalues, statements, None, False)
+        self.__run()
+        return self.__values.pop()
+
+    def resolve_script(self, frame_size: int) -> None:
+        self.__script_frame_size = frame_size
+
+    # Runs until it reaches the end of the steps it was given, marked by a step of None under them
+    def __run(self) -> None:
+        pop = self.__steps.pop
+
+        step, node = pop()
+        while step is not None:
+            step(node)
+            step, node = pop()
+
+    def __schedule(self, node: Expr | Stmt) -> None:
+        self.__steps.append((self.__visits[type(node)], node))
+
+    def visit_assign_expr(self, expr: AssignExpr) -> None:
+        self.__steps.append((self.__assign, expr))
+        self.__schedule(expr.value)
+
+    def __assign(self, expr: AssignExpr) -> None:
+        location: tuple[VariableKind, int] | None = self._locals.get(expr)
+        if location is not None:
+            self._store(location, self.__values[-1])
+        else:
+            self.globals.assign(expr.name, self.__values[-1])
+
+    # Literals and variables are read as they're needed rather than through steps of their own, which is only
+    # possible for the operand evaluated last, or when they're both literals or variables: reading the right operand
+    # when finishing, right after the left one has been evaluated, keeps the order everything is evaluated in
+    def visit_binary_expr(self, expr: BinaryExpr) -> None:
+        if type(expr.right) in LEAVES:
+            if type(expr.left) in LEAVES:
+                self.__values.append(self.__binary_operators[expr.operator.type](
+                    expr.operator, self.__read(expr.left), self.__read(expr.right)))
+                return
+
+            self.__steps.append((self.__binary_with_leaf, expr))
+            self.__schedule(expr.left)
+            return
+
+        self.__steps.append((self.__binary, expr))
+        self.__schedule(expr.right)
+        self.__schedule(expr.left)
+
+    def __binary(self, expr: BinaryExpr) -> None:
+        values: list[object] = self.__values
+        right: object = values.pop()
+        values[-1] = self.__binary_operators[expr.operator.type](expr.operator, values[-1], right)
+
+    def __binary_with_leaf(self, expr: BinaryExpr) -> None:
+        values: list[object] = self.__values
+        values[-1] = self.__binary_operators[expr.operator.type](expr.operator, values[-1], self.__read(expr.right))
+
+    # The callee and the arguments are evaluated onto the value stack, in order
+    def visit_call_expr(self, expr: CallExpr) -> None:
+        if isinstance(expr.callee, GetExpr):
+            self.__steps.append((self.__find_method, expr))
+            self.__schedule(expr.callee.obj)
+            return
+
+        self.__steps.append((self.__call, expr))
+        for argument in reversed(expr.arguments):
+            self.__schedule(argument)
+        self.__schedule(expr.callee)
+
+    def __call(self, expr: CallExpr) -> None:
+        values: list[object] = self.__values
+        start: int = len(values) - len(expr.arguments)
+        arguments: list[object] = values[start:]
+        del values[start:]
+        callee: object = values.pop()
+
+        if not isinstance(callee, LoxCallable):
+            raise LoxRuntimeError(expr.paren, "Can only call functions and classes.")
+        if (arg_no := len(arguments)) != (arity := callee.arity()):
+            raise LoxRuntimeError(expr.paren, f"Expected {arity} arguments but got {arg_no}.")
+
+        if type(callee) is LoxFunction:
+            self.__call_function(expr, callee, callee.this, arguments)
+        elif type(callee) is LoxClass:
+            instance: LoxInstance = LoxInstance(callee)
+            initializer: LoxFunction | None = callee.find_method("init")
+            if initializer is None:
+                values.append(instance)
+            else:
+                self.__call_function(expr, initializer, instance, arguments)
+        else:
+            try:
+                values.append(callee.call(self, arguments))
+            except LoxFunctionError as err:
+                raise LoxRuntimeError(expr.paren, f"in function {err.function}: {err.message}.")
+
+    # A method called right away runs with the instance as "this" directly, without being bound. Just like in the
+    # interpreter, the property is looked up before the arguments are evaluated
+    def __find_method(self, expr: CallExpr) -> None:
+        callee: GetExpr = expr.callee
+        values: list[object] = self.__values
+        obj: object = values[-1]
+        if not isinstance(obj, LoxInstance):
+            raise LoxRuntimeError(callee.name, "Only instances have properties.")
+
+        index: int | None = obj.shape.offsets.get(callee.name.lexeme)
+        if index is not None:
+            # Fields shadow methods, so a field holding a function is called as any other
+            values[-1] = obj.values[index]
+            self.__steps.append((self.__call, expr))
+        else:
+            method: LoxFunction | None = obj.klass.find_method(callee.name.lexeme)
+            if method is None:
+                raise LoxRuntimeError(callee.name, f"Undefined property '{callee.name.lexeme}'.")
+
+            values[-1] = method
+            values.append(obj)
+            self.__steps.append((self.__invoke, expr))
+
+        for argument in reversed(expr.arguments):
+            self.__schedule(argument)
+
+    def __invoke(self, expr: CallExpr) -> None:
+        values: list[object] = self.__values
+        start: int = len(values) - len(expr.arguments)
+        arguments: list[object] = values[start:]
+        del values[start:]
+        obj: LoxInstance = values.pop()
+        method: LoxFunction = values.pop()
+
+        if (arg_no := len(arguments)) != (arity := method.arity()):
+            raise LoxRuntimeError(expr.paren, f"Expected {arity} arguments but got {arg_no}.")
+
+        self.__call_function(expr, method, obj, arguments)
+
+    def __call_function(self, expr: CallExpr, function: LoxFunction, this: object | None,
+                        arguments: list[object]) -> None:
+        if type(expr) is TailCallExpr:
+            self.__replace_call(function, this, arguments)
+            return
+        if self.__depth == self.__max_call_depth:
+            raise LoxRuntimeError(expr.paren, "Stack overflow.")
+
+        self.__enter(function.new_frame(this, arguments), function.upvalues, function.declaration.body, this,
+                     function.is_initializer)
+
+    def __enter(self, frame: list[object], upvalues: list[Cell], body: list[Stmt], this: object | None,
+                is_initializer: bool) -> None:
+        self.__steps.append((self.__return_step, CallBoundary(self._frame, self._upvalues, this, is_initializer)))
+        for statement in reversed(body):
+            self.__schedule(statement)
+
+        self._frame = frame
+        self._upvalues = upvalues
+        self.__depth += 1
+
+    # A call returned right away by the function making it (see Resolver.visit_return_stmt) takes over that function's
+    # boundary instead of pushing one of its own: whatever the function had left to do is dropped, as on a return, and
+    # the callee returns straight to the function's caller, so tail recursion runs in constant space
+    def __replace_call(self, function: LoxFunction, this: object | None, arguments: list[object]) -> None:
+        boundary: CallBoundary = self.__drop_to_boundary()
+        boundary.this = this
+        boundary.is_initializer = function.is_initializer
+        self.__steps.append((self.__return_step, boundary))
+        for statement in reversed(function.declaration.body):
+            self.__schedule(statement)
+
+        self._frame = function.new_frame(this, arguments)
+        self._upvalues = function.upvalues
+
+    # Reached when the body runs to its end without returning
+    def __return(self, boundary: CallBoundary) -> None:
+        self.__leave(boundary, None)
+
+    def __leave(self, boundary: CallBoundary, value: object) -> None:
+        self._frame = boundary.frame
+        self._upvalues = boundary.upvalues
+        self.__depth -= 1
+        self.__values.append(boundary.this if boundary.is_initializer else value)
+
+    def visit_get_expr(self, expr: GetExpr) -> None:
+        self.__steps.append((self.__get, expr))
+        self.__schedule(expr.obj)
+
+    def __get(self, expr: GetExpr) -> None:
+        obj: object = self.__values[-1]
+        if not isinstance(obj, LoxInstance):
+            raise LoxRuntimeError(expr.name, "Only instances have properties.")
+
+        self.__values[-1] = obj.get(expr.name)
+
+    def visit_grouping_expr(self, expr: GroupingExpr) -> None:
+        self.__schedule(expr.expression)
+
+    def visit_literal_expr(self, expr: LiteralExpr) -> None:
+        self.__values.append(expr.value)
+
+    def visit_logical_expr(self, expr: LogicalExpr) -> None:
+        self.__steps.append((self.__logical, expr))
+        self.__schedule(expr.left)
+
+    # The left operand is the result if it decides the outcome on its own, otherwise it's replaced by the right one
+    def __logical(self, expr: LogicalExpr) -> None:
+        if is_truthy(self.__values[-1]) == (expr.operator.type == TokenType.OR):
+            return
+
+        self.__values.pop()
+        self.__schedule(expr.right)
+
+    # The object is checked before the value is evaluated, as in the interpreter
+    def visit_set_expr(self, expr: SetExpr) -> None:
+        self.__steps.append((self.__set_object, expr))
+        self.__schedule(expr.obj)
+
+    def __set_object(self, expr: SetExpr) -> None:
+        if not isinstance(self.__values[-1], LoxInstance):
+            raise LoxRuntimeError(expr.name, "Only instances have fields.")
+
+        self.__steps.append((self.__set, expr))
+        self.__schedule(expr.value)
+
+    def __set(self, expr: SetExpr) -> None:
+        values: list[object] = self.__values
+        value: object = values.pop()
+        values[-1].set(expr.name, value)
+        values[-1] = value
+
+    def visit_super_expr(self, expr: SuperExpr) -> None:
+        superclass: LoxClass = self._load(self._locals[expr])
+        obj: LoxInstance = self._load(self._locals[expr, "this"])
+        method: LoxFunction | None = superclass.find_method(expr.method.lexeme)
+
+        if method is None:
+            raise LoxRuntimeError(expr.method, f"Undefined property '{expr.method.lexeme}'.")
+
+        self.__values.append(method.bind(obj))
+
+    def visit_this_expr(self, expr: ThisExpr) -> None:
+        self.__values.append(self._lookup_variable(expr.keyword, expr))
+
+    def visit_unary_expr(self, expr: UnaryExpr) -> None:
+        self.__steps.append((self.__unary, expr))
+        self.__schedule(expr.right)
+
+    def __unary(self, expr: UnaryExpr) -> None:
+        right: object = self.__values[-1]
+        if expr.operator.type == TokenType.BANG:
+            self.__values[-1] = not is_truthy(right)
+            return
+
+        if not isinstance(right, float):
+            raise LoxRuntimeError(expr.operator, "Operand must be a number.")
+        self.__values[-1] = -right
+
+    def visit_variable_expr(self, expr: VariableExpr) -> None:
+        self.__values.append(self._lookup_variable(expr.name, expr))
+
+    def visit_block_stmt(self, stmt: BlockStmt) -> None:
+        for statement in reversed(stmt.statements):
+            self.__schedule(statement)
+
+    def visit_class_stmt(self, stmt: ClassStmt) -> None:
+        self.__steps.append((self.__class, stmt))
+        if stmt.superclass is not None:
+            self.__schedule(stmt.superclass)
+
+    def __class(self, stmt: ClassStmt) -> None:
+        superclass: object | None = None
+        if stmt.superclass is not None:
+            superclass = self.__values.pop()
+            if not isinstance(superclass, LoxClass):
+                raise LoxRuntimeError(stmt.superclass.name, "Superclass must be a class.")
+
+        self._define(stmt, stmt.name.lexeme, None)
+
+        if superclass is not None:
+            self._define((stmt, "super"), "super", superclass)
+
+        methods: dict[str, LoxFunction] = \
+            {method.name.lexeme: self._function(method, method.name.lexeme == "init") for method in stmt.methods}
+
+        self._initialize(stmt, stmt.name.lexeme, LoxClass(stmt.name.lexeme, superclass, methods))
+
+    def visit_expression_stmt(self, stmt: ExpressionStmt) -> None:
+        self.__steps.append((self.__discard, None))
+        self.__schedule(stmt.expression)
+
+    def __discard(self, _: None) -> None:
+        self.__values.pop()
+
+    def visit_function_stmt(self, stmt: FunctionStmt) -> None:
+        # Declared before the function is created, in case it captures itself
+        self._define(stmt, stmt.name.lexeme, None)
+        self._initialize(stmt, stmt.name.lexeme, self._function(stmt, False))
+
+    def visit_if_stmt(self, stmt: IfStmt) -> None:
+        self.__steps.append((self.__if, stmt))
+        self.__schedule(stmt.condition)
+
+    def __if(self, stmt: IfStmt) -> None:
+        if is_truthy(self.__values.pop()):
+            self.__schedule(stmt.if_clause)
+        elif stmt.else_clause is not None:
+            self.__schedule(stmt.else_clause)
+
+    def visit_print_stmt(self, stmt: PrintStmt) -> None:
+        self.__steps.append((self.__print, None))
+        self.__schedule(stmt.expression)
+
+    def __print(self, _: None) -> None:
+        print(stringify(self.__values.pop()))
+
+    def visit_return_stmt(self, stmt: ReturnStmt) -> None:
+        self.__steps.append((self.__unwind, stmt))
+        if stmt.value is not None:
+            self.__schedule(stmt.value)
+
+    def __unwind(self, stmt: ReturnStmt) -> None:
+        value: object | None = None if stmt.value is None else self.__values.pop()
+        self.__leave(self.__drop_to_boundary(), value)
+
+    # Whatever was left to do in the function is dropped, up to the boundary of its call
+    def __drop_to_boundary(self) -> CallBoundary:
+        pop = self.__steps.pop
+        return_step: Callable[[CallBoundary], None] = self.__return_step
+        while True:
+            step, boundary = pop()
+            if step is return_step:
+                return boundary
+
+    def visit_var_stmt(self, stmt: VarStmt) -> None:
+        self.__steps.append((self.__var, stmt))
+        if stmt.initializer is not None:
+            self.__schedule(stmt.initializer)
+
+    def __var(self, stmt: VarStmt) -> None:
+        self._define(stmt, stmt.name.lexeme, None if stmt.initializer is None else self.__values.pop())
+
+    # Every check of the condition schedules the next iteration, body first
+    def visit_while_stmt(self, stmt: WhileStmt) -> None:
+        self.__steps.append((self.__while, stmt))
+        self.__schedule(stmt.condition)
+
+    def __while(self, stmt: WhileStmt) -> None:
+        if is_truthy(self.__values.pop()):
+            self.__steps.append((self.visit_while_stmt, stmt))
+            self.__schedule(stmt.body)
+
+    def __read(self, expr: LiteralExpr | VariableExpr) -> object:
+        if type(expr) is LiteralExpr:
+            return expr.value
+
+        location: tuple[VariableKind, int] | None = self._locals.get(expr)
+        return self._load(location) if location is not None else self.globals.get(expr.name)
+
+    @staticmethod
+    def __plus(operator: Token, left: object, right: object) -> float | str:
+        if isinstance(left, float) and isinstance(right, float) or isinstance(left, str) and isinstance(right, str):
+            return left + right
+
+        raise LoxRuntimeError(operator, "Operands must be two numbers or two strings.")
+
+    @staticmethod
+    def __numbers(operation: Callable[[float, float], object]) -> Callable[[Token, object, object], object]:
+        def apply(operator: Token, left: object, right: object) -> object:
+            if isinstance(left, float) and isinstance(right, float):
+                return operation(left, right)
+
+            raise LoxRuntimeError(operator, "Operands must be numbers.")
+        return apply
+
+
+__all__ = ["StackInterpreter"]
@@ -5,6 +5,8 @@ from tokenclass import Token
 
 
 class Stmt(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def accept(self, visitor): ...
 
@@ -40,6 +42,8 @@ class StmtVisitor(ABC):
 
 
 class BlockStmt(Stmt):
+    __slots__ = ("statements",)
+
     def __init__(self, statements: list[Stmt]):
         self.statements: list[Stmt] = statements
 
@@ -48,6 +52,8 @@ class BlockStmt(Stmt):
 
 
 class ExpressionStmt(Stmt):
+    __slots__ = ("expression",)
+
     def __init__(self, expression: Expr):
         self.expression: Expr = expression
 
@@ -56,6 +62,8 @@ class ExpressionStmt(Stmt):
 
 
 class FunctionStmt(Stmt):
+    __slots__ = ("name", "params", "body")
+
     def __init__(self, name: Token, params: list[Token], body: list[Stmt]):
         self.name: Token = name
         self.params: list[Token] = params
@@ -66,6 +74,8 @@ class FunctionStmt(Stmt):
 
 
 class IfStmt(Stmt):
+    __slots__ = ("condition", "if_clause", "else_clause")
+
     def __init__(self, condition: Expr, if_clause: Stmt, else_clause: Stmt | None):
         self.condition: Expr = condition
         self.if_clause: Stmt = if_clause
@@ -76,6 +86,8 @@ class IfStmt(Stmt):
 
 
 class PrintStmt(Stmt):
+    __slots__ = ("expression",)
+
     def __init__(self, expression: Expr):
         self.expression: Expr = expression
 
@@ -84,6 +96,8 @@ class PrintStmt(Stmt):
 
 
 class ReturnStmt(Stmt):
+    __slots__ = ("keyword", "value")
+
     def __init__(self, keyword: Token, value: Expr | None):
         self.keyword: Token = keyword
         self.value: Expr | None = value
@@ -93,6 +107,8 @@ class ReturnStmt(Stmt):
 
 
 class VarStmt(Stmt):
+    __slots__ = ("name", "initializer")
+
     def __init__(self, name: Token, initializer: Expr):
         self.name: Token = name
         self.initializer: Expr = initializer
@@ -102,6 +118,8 @@ class VarStmt(Stmt):
 
 
 class WhileStmt(Stmt):
+    __slots__ = ("condition", "body")
+
     def __init__(self, condition: Expr, body: Stmt):
         self.condition: Expr = condition
         self.body: Stmt = body
@@ -111,6 +129,8 @@ class WhileStmt(Stmt):
 
 
 class ClassStmt(Stmt):
+    __slots__ = ("name", "superclass", "methods")
+
     def __init__(self, name: Token, superclass: VariableExpr | None, methods: list[FunctionStmt]):
         self.name: Token = name
         self.superclass: VariableExpr | None = superclass
@@ -120,5 +140,5 @@ class ClassStmt(Stmt):
         return visitor.visit_class_stmt(self)
 
 
-__all__ = ["Stmt", "StmtVisitor", "BlockStmt", "ExpressionStmt", "FunctionStmt",
-           "IfStmt", "PrintStmt", "ReturnStmt", "VarStmt", "WhileStmt", "ClassStmt"]
+__all__ = ["Stmt", "StmtVisitor", "BlockStmt", "ExpressionStmt", "FunctionStmt", "IfStmt", "PrintStmt", "ReturnStmt",
+           "VarStmt", "WhileStmt", "ClassStmt"]
@@ -53,7 +53,10 @@ class TokenType(Enum):
     EOF = auto()
 
 
+# Programs are made of a lot of tokens, so they are kept small, without a dict of attributes
 class Token:
+    __slots__ = ("type", "lexeme", "literal", "line")
+
     def __init__(self, typ: TokenType, lexeme: str, literal: object | None, line: int):
         self.type: TokenType = typ
         self.lexeme: str = lexeme
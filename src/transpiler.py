@@ -0,0 +1,814 @@
+import functools
+import hashlib
+import importlib.util
+import marshal
+import math
+import os
+from math import nan
+from types import CodeType, TracebackType
+
+from errors import LoxRuntimeError, LoxFunctionError
+from expr import *
+from interpreter import OpMode
+from lox_callable import LoxCallable
+from lox_class import *
+from lox_native import *
+from lox_value import *
+from resolver import FunctionLayout, VariableKind
+from stmt import *
+from tokenclass import *
+
+
+# Cache entries are keyed by the source of every module of the interpreter, not only this one, since the passes that run
+# before the transpiler shape the code it generates as well, so that changing any of them never picks up a stale entry
+@functools.cache
+def sources_hash() -> bytes:
+    directory: str = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".py"):
+            with open(os.path.join(directory, name), "rb") as file:
+                digest.update(name.encode("utf-8"))
+                digest.update(file.read())
+
+    return digest.digest()
+
+
+class Declaration:
+    def __init__(self, python_name: str, owner, immutable: bool = False):
+        self.python_name: str = python_name
+        self.owner: FunctionScope = owner
+        # "this" and "super" can never be assigned to, so closures may capture their values directly
+        self.immutable: bool = immutable
+        self.captured: bool = False
+
+    @property
+    def boxed(self) -> bool:
+        # Captured variables live in one-element lists ("boxes"), which closures receive when they're created. A box
+        # is made every time the declaration runs, which gives each loop iteration its own variable, like in jlox
+        return self.captured and not self.immutable
+
+    def read(self) -> str:
+        return f"{self.python_name}[0]" if self.boxed else self.python_name
+
+
+class FunctionScope:
+    def __init__(self, enclosing):
+        self.enclosing: FunctionScope | None = enclosing
+        # Declarations from enclosing functions used by this function or by the ones nested in it; used as a set that
+        # keeps the insertion order (so that the generated code is deterministic)
+        self.free: dict[Declaration, None] = {}
+
+
+# Works out which declaration every variable refers to and which of the local variables get captured by closures.
+# Scoping mirrors the resolver: anything not found in a local scope is a global
+class ScopeAnalyzer(ExprVisitor, StmtVisitor):
+    def __init__(self):
+        self.references: dict[Expr, Declaration] = {}
+        self.super_references: dict[SuperExpr, tuple[Declaration, Declaration]] = {}
+        self.bindings: dict[object, Declaration] = {}
+        self.functions: dict[FunctionStmt, FunctionScope] = {}
+
+        self.__scopes: list[dict[str, Declaration]] = []
+        self.__function: FunctionScope = FunctionScope(None)
+        self.__counter: int = 0
+
+    def analyze(self, statements: list[Stmt]) -> None:
+        for statement in statements:
+            statement.accept(self)
+
+    def visit_assign_expr(self, expr: AssignExpr) -> None:
+        expr.value.accept(self)
+        self.__reference(expr, expr.name.lexeme)
+
+    def visit_binary_expr(self, expr: BinaryExpr) -> None:
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visit_call_expr(self, expr: CallExpr) -> None:
+        expr.callee.accept(self)
+        for argument in expr.arguments:
+            argument.accept(self)
+
+    def visit_get_expr(self, expr: GetExpr) -> None:
+        expr.obj.accept(self)
+
+    def visit_grouping_expr(self, expr: GroupingExpr) -> None:
+        expr.expression.accept(self)
+
+    @staticmethod
+    def visit_literal_expr(expr: LiteralExpr) -> None:
+        pass
+
+    def visit_logical_expr(self, expr: LogicalExpr) -> None:
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visit_set_expr(self, expr: SetExpr) -> None:
+        expr.value.accept(self)
+        expr.obj.accept(self)
+
+    def visit_super_expr(self, expr: SuperExpr) -> None:
+        self.super_references[expr] = (self.__lookup("super"), self.__lookup("this"))
+
+    def visit_this_expr(self, expr: ThisExpr) -> None:
+        self.__reference(expr, "this")
+
+    def visit_unary_expr(self, expr: UnaryExpr) -> None:
+        expr.right.accept(self)
+
+    def visit_variable_expr(self, expr: VariableExpr) -> None:
+        self.__reference(expr, expr.name.lexeme)
+
+    def visit_block_stmt(self, stmt: BlockStmt) -> None:
+        self.__scopes.append({})
+        self.analyze(stmt.statements)
+        self.__scopes.pop()
+
+    def visit_class_stmt(self, stmt: ClassStmt) -> None:
+        self.__declare(stmt, stmt.name.lexeme)
+
+        if stmt.superclass is not None:
+            stmt.superclass.accept(self)
+            self.__scopes.append({})
+            self.__declare((stmt, "super"), "super", True)
+
+        for method in stmt.methods:
+            self.__function_body(method, True)
+
+        if stmt.superclass is not None:
+            self.__scopes.pop()
+
+    def visit_expression_stmt(self, stmt: ExpressionStmt) -> None:
+        stmt.expression.accept(self)
+
+    def visit_function_stmt(self, stmt: FunctionStmt) -> None:
+        self.__declare(stmt, stmt.name.lexeme)
+        self.__function_body(stmt, False)
+
+    def visit_if_stmt(self, stmt: IfStmt) -> None:
+        stmt.condition.accept(self)
+        stmt.if_clause.accept(self)
+        if stmt.else_clause is not None:
+            stmt.else_clause.accept(self)
+
+    def visit_print_stmt(self, stmt: PrintStmt) -> None:
+        stmt.expression.accept(self)
+
+    def visit_return_stmt(self, stmt: ReturnStmt) -> None:
+        if stmt.value is not None:
+            stmt.value.accept(self)
+
+    def visit_var_stmt(self, stmt: VarStmt) -> None:
+        self.__declare(stmt, stmt.name.lexeme)
+        if stmt.initializer is not None:
+            stmt.initializer.accept(self)
+
+    def visit_while_stmt(self, stmt: WhileStmt) -> None:
+        stmt.condition.accept(self)
+        stmt.body.accept(self)
+
+    def __function_body(self, stmt: FunctionStmt, is_method: bool) -> None:
+        enclosing: FunctionScope = self.__function
+        self.__function = self.functions[stmt] = FunctionScope(enclosing)
+        self.__scopes.append({})
+
+        if is_method:
+            self.__declare((stmt, "this"), "this", True)
+        for param in stmt.params:
+            self.__declare(param, param.lexeme)
+        self.analyze(stmt.body)
+
+        self.__scopes.pop()
+        self.__function = enclosing
+
+    def __declare(self, key: object, name: str, immutable: bool = False) -> None:
+        if not self.__scopes:
+            return
+
+        self.__counter += 1
+        python_name: str = "this" if name == "this" else f"l{self.__counter}_{name}"
+        self.__scopes[-1][name] = self.bindings[key] = Declaration(python_name, self.__function, immutable)
+
+    def __reference(self, expr: Expr, name: str) -> None:
+        if (declaration := self.__lookup(name)) is not None:
+            self.references[expr] = declaration
+
+    def __lookup(self, name: str) -> Declaration | None:
+        for scope in reversed(self.__scopes):
+            if (declaration := scope.get(name)) is not None:
+                function: FunctionScope = self.__function
+                while function is not declaration.owner:
+                    declaration.captured = True
+                    function.free[declaration] = None
+                    function = function.enclosing
+
+                return declaration
+
+        return None
+
+
+class Transpiler(ExprVisitor, StmtVisitor):
+    def __init__(self, analyzer: ScopeAnalyzer, token_table: str, tail_calls: set[CallExpr]):
+        self.__analyzer: ScopeAnalyzer = analyzer
+        self.__token_table: str = token_table
+        self.__tail_calls: set[CallExpr] = tail_calls
+
+        self.lines: list[str] = []
+        # The global variables read and the calls made on every line of the generated code, in the order they're
+        # evaluated. Since undefined globals surface as Python NameErrors, and calls nested too deep as RecursionErrors,
+        # this is how the offending token is found again
+        self.line_tokens: list[list[Token]] = []
+        self.tokens: list[Token] = []
+
+        self.__pending_tokens: list[Token] = []
+        self.__token_indices: dict[int, int] = {}
+        self.__indent: int = 0
+        self.__counter: int = 0
+        self.__initializer: bool = False
+        self.__makes_tail_calls: bool = False
+
+        self.__arithmetic: dict[TokenType, str] = {
+            TokenType.MINUS: "-",
+            TokenType.STAR: "*",
+            TokenType.CARET: "**",
+            TokenType.PERCENT: "%",
+            TokenType.GREATER: ">",
+            TokenType.GREATER_EQUAL: ">=",
+            TokenType.LESS: "<",
+            TokenType.LESS_EQUAL: "<="
+        }
+
+    def transpile(self, statements: list[Stmt], print_expressions: bool) -> str:
+        self.__emit("def _main():")
+        self.__indent += 1
+
+        start: int = len(self.lines)
+        for statement in statements:
+            if print_expressions and isinstance(statement, ExpressionStmt):
+                self.__emit(f"print(_str({self.__expression(statement.expression)}))")
+            else:
+                statement.accept(self)
+        self.__end_suite(start)
+
+        return "\n".join(self.lines) + "\n"
+
+    def visit_assign_expr(self, expr: AssignExpr) -> str:
+        value: str = self.__expression(expr.value)
+
+        if (declaration := self.__analyzer.references.get(expr)) is None:
+            return f"_set_global({value}, 'g_{expr.name.lexeme}', {self.__token(expr.name)})"
+        if declaration.boxed:
+            return f"_set_box({declaration.python_name}, {value})"
+
+        return f"({declaration.python_name} := {value})"
+
+    def visit_binary_expr(self, expr: BinaryExpr) -> str:
+        left: str = self.__expression(expr.left)
+        right: str = self.__expression(expr.right)
+        a: str = self.__temp()
+        b: str = self.__temp()
+        token: str = self.__token(expr.operator)
+        operands: str = f"type({a} := {left}) is type({b} := {right}) is float"
+
+        match expr.operator.type:
+            case TokenType.EQUAL_EQUAL:
+                return f"(type({a} := {left}) is type({b} := {right}) and {a} == {b})"
+            case TokenType.BANG_EQUAL:
+                return f"(not (type({a} := {left}) is type({b} := {right}) and {a} == {b}))"
+            case TokenType.PLUS:
+                return f"({a} + {b} if {operands} else _add({a}, {b}, {token}))"
+            case TokenType.SLASH:
+                return f"(_divide({a}, {b}) if {operands} else _numbers_error({token}))"
+
+        return f"({a} {self.__arithmetic[expr.operator.type]} {b} if {operands} else _numbers_error({token}))"
+
+    def visit_call_expr(self, expr: CallExpr) -> str:
+        return self.__call(expr, False)
+
+    def visit_get_expr(self, expr: GetExpr) -> str:
+        return f"_get({self.__expression(expr.obj)}, {self.__token(expr.name)})"
+
+    def visit_grouping_expr(self, expr: GroupingExpr) -> str:
+        return self.__expression(expr.expression)
+
+    @staticmethod
+    def visit_literal_expr(expr: LiteralExpr) -> str:
+        # Infinite and NaN literals (which constant folding produces out of expressions like 0/0) have no Python syntax
+        if isinstance(expr.value, float) and not math.isfinite(expr.value):
+            return "_nan" if math.isnan(expr.value) else "_inf" if expr.value > 0 else "-_inf"
+
+        return repr(expr.value)
+
+    def visit_logical_expr(self, expr: LogicalExpr) -> str:
+        left: str = self.__expression(expr.left)
+        right: str = self.__expression(expr.right)
+        temp: str = self.__temp()
+        truthy: str = f"(({temp} := {left}) is not None and {temp} is not False)"
+
+        if expr.operator.type == TokenType.OR:
+            return f"({temp} if {truthy} else {right})"
+
+        return f"({right} if {truthy} else {temp})"
+
+    def visit_set_expr(self, expr: SetExpr) -> str:
+        token: str = self.__token(expr.name)
+        # The object is checked before the value is evaluated, just like in the interpreter
+        return f"_set(_instance({self.__expression(expr.obj)}, {token}), {token}, {self.__expression(expr.value)})"
+
+    def visit_super_expr(self, expr: SuperExpr) -> str:
+        superclass, this = self.__analyzer.super_references[expr]
+        return f"_super({superclass.read()}, {this.read()}, {self.__token(expr.method)})"
+
+    def visit_this_expr(self, expr: ThisExpr) -> str:
+        return self.__analyzer.references[expr].read()
+
+    def visit_unary_expr(self, expr: UnaryExpr) -> str:
+        right: str = self.__expression(expr.right)
+        temp: str = self.__temp()
+
+        if expr.operator.type == TokenType.BANG:
+            return f"(({temp} := {right}) is None or {temp} is False)"
+
+        return f"(-{temp} if type({temp} := {right}) is float else _number_error({self.__token(expr.operator)}))"
+
+    def visit_variable_expr(self, expr: VariableExpr) -> str:
+        if (declaration := self.__analyzer.references.get(expr)) is not None:
+            return declaration.read()
+
+        self.__pending_tokens.append(expr.name)
+        return f"g_{expr.name.lexeme}"
+
+    # Blocks don't need anything of their own: all locals have unique names in the generated code
+
+    def visit_block_stmt(self, stmt: BlockStmt) -> None:
+        for statement in stmt.statements:
+            statement.accept(self)
+
+    def visit_class_stmt(self, stmt: ClassStmt) -> None:
+        superclass: str = "None"
+        if stmt.superclass is not None:
+            declaration: Declaration = self.__analyzer.bindings[(stmt, "super")]
+            superclass = declaration.python_name
+            self.__emit(f"{superclass} = _superclass({self.__expression(stmt.superclass)}, "
+                        f"{self.__token(stmt.superclass.name)})")
+
+        self.__declare(stmt, stmt.name, "None")
+
+        methods: list[str] = [f"{method.name.lexeme!r}: {self.__function(method, 'm', method.name.lexeme == 'init')}"
+                              for method in stmt.methods]
+
+        self.__define(stmt, stmt.name, f"LoxClass({stmt.name.lexeme!r}, {superclass}, {{{', '.join(methods)}}})")
+
+    def visit_expression_stmt(self, stmt: ExpressionStmt) -> None:
+        if not isinstance(expr := stmt.expression, AssignExpr):
+            self.__emit(self.__expression(expr))
+            return
+
+        # Plain statements are cheaper than assignment expressions
+        value: str = self.__expression(expr.value)
+        if (declaration := self.__analyzer.references.get(expr)) is None:
+            temp: str = self.__temp()
+            self.__emit(f"{temp} = {value}")
+            self.__emit(f"if 'g_{expr.name.lexeme}' not in _G: _undefined({self.__token(expr.name)})")
+            self.__emit(f"_G['g_{expr.name.lexeme}'] = {temp}")
+        else:
+            self.__emit(f"{declaration.read()} = {value}")
+
+    def visit_function_stmt(self, stmt: FunctionStmt) -> None:
+        if stmt in self.__analyzer.bindings:
+            self.__declare(stmt, stmt.name, "None")
+        self.__define(stmt, stmt.name, self.__function(stmt, "f", False))
+
+    def visit_if_stmt(self, stmt: IfStmt) -> None:
+        keyword: str = "if"
+        while True:
+            self.__emit(f"{keyword} {self.__condition(stmt.condition)}:")
+            self.__suite([stmt.if_clause])
+
+            # Else-if chains are flattened into "elif" to keep the indentation (which Python limits) from growing
+            if not isinstance(stmt.else_clause, IfStmt):
+                break
+
+            stmt = stmt.else_clause
+            keyword = "elif"
+
+        if stmt.else_clause is not None:
+            self.__emit("else:")
+            self.__suite([stmt.else_clause])
+
+    def visit_print_stmt(self, stmt: PrintStmt) -> None:
+        self.__emit(f"print(_str({self.__expression(stmt.expression)}))")
+
+    def visit_return_stmt(self, stmt: ReturnStmt) -> None:
+        if self.__initializer:
+            self.__emit("return this")
+        elif stmt.value is None:
+            self.__emit("return None")
+        elif stmt.value in self.__tail_calls:
+            self.__makes_tail_calls = True
+            self.__emit(f"return {self.__call(stmt.value, True)}")
+        else:
+            self.__emit(f"return {self.__expression(stmt.value)}")
+
+    def visit_var_stmt(self, stmt: VarStmt) -> None:
+        value: str = "None" if stmt.initializer is None else self.__expression(stmt.initializer)
+        self.__define(stmt, stmt.name, value)
+
+    def visit_while_stmt(self, stmt: WhileStmt) -> None:
+        self.__emit(f"while {self.__condition(stmt.condition)}:")
+        self.__suite([stmt.body])
+
+    # Returns the expression creating the function's value
+    def __function(self, stmt: FunctionStmt, prefix: str, is_initializer: bool) -> str:
+        self.__counter += 1
+        python_name: str = f"{prefix}{self.__counter}_{stmt.name.lexeme}"
+        bindings: dict[object, Declaration] = self.__analyzer.bindings
+
+        params: list[Declaration] = [bindings[param] for param in stmt.params]
+        signature: list[str] = (["this"] if prefix == "m" else []) + [param.python_name for param in params]
+        free: list[str] = [f"{declaration.python_name}={declaration.python_name}"
+                           for declaration in self.__analyzer.functions[stmt].free]
+        if free:
+            signature += ["*"] + free
+
+        self.__emit(f"def {python_name}({', '.join(signature)}):")
+        self.__indent += 1
+        start: int = len(self.lines)
+
+        for param in params:
+            if param.boxed:
+                self.__emit(f"{param.python_name} = [{param.python_name}]")
+
+        enclosing_initializer: bool = self.__initializer
+        enclosing_tail_calls: bool = self.__makes_tail_calls
+        self.__initializer = is_initializer
+        self.__makes_tail_calls = False
+        for statement in stmt.body:
+            statement.accept(self)
+        if is_initializer:
+            self.__emit("return this")
+        makes_tail_calls: bool = self.__makes_tail_calls
+        self.__initializer = enclosing_initializer
+        self.__makes_tail_calls = enclosing_tail_calls
+
+        self.__end_suite(start)
+        self.__indent -= 1
+
+        return f"_Function({stmt.name.lexeme!r}, {python_name}, {len(stmt.params)}, {is_initializer}, " \
+               f"{makes_tail_calls})"
+
+    # Lox functions with the right number of arguments are called directly, everything else (classes, natives,
+    # errors) goes through _call. A call in tail position isn't made at all, but handed to the loop running the
+    # function making it (see _trampoline), so that it takes no Python stack
+    def __call(self, expr: CallExpr, tail: bool) -> str:
+        callee: str = self.__temp()
+        arguments: list[str] = [self.__temp() for _ in expr.arguments]
+        evaluation: list[str] = [f"({callee} := {self.__expression(expr.callee)})"] + \
+                                [f"({temp} := {self.__expression(argument)})"
+                                 for temp, argument in zip(arguments, expr.arguments)]
+        self.__pending_tokens.append(expr.paren)
+
+        args: str = ", ".join(arguments)
+        direct: str = f"_TailCall({callee}.body, ({args}{',' if arguments else ''}))" if tail else \
+            f"{callee}.function({args})"
+        return f"({direct} if ({', '.join(evaluation)},) and {callee}.__class__ is _Function " \
+               f"and {callee}.param_count == {len(arguments)} " \
+               f"else _call({callee}, {self.__token(expr.paren)}, ({args}{',' if arguments else ''})))"
+
+    # Declaring and defining are separate for functions and classes, because they have to be able to refer to their
+    # own (boxed) variable from inside their bodies
+
+    def __declare(self, key: object, name: Token, value: str) -> None:
+        declaration: Declaration | None = self.__analyzer.bindings.get(key)
+        if declaration is None:
+            self.__emit(f"_G['g_{name.lexeme}'] = {value}")
+        elif declaration.boxed:
+            self.__emit(f"{declaration.python_name} = [{value}]")
+
+    def __define(self, key: object, name: Token, value: str) -> None:
+        declaration: Declaration | None = self.__analyzer.bindings.get(key)
+        if declaration is None:
+            self.__emit(f"_G['g_{name.lexeme}'] = {value}")
+        elif declaration.boxed and not isinstance(key, VarStmt):
+            self.__emit(f"{declaration.python_name}[0] = {value}")
+        elif declaration.boxed:
+            self.__emit(f"{declaration.python_name} = [{value}]")
+        else:
+            self.__emit(f"{declaration.python_name} = {value}")
+
+    def __condition(self, expr: Expr) -> str:
+        value: str = self.__expression(expr)
+
+        # Comparisons, equality and negation always produce booleans, so Python's truthiness can be used as is
+        if isinstance(expr, UnaryExpr) and expr.operator.type == TokenType.BANG or \
+                isinstance(expr, BinaryExpr) and expr.operator.type not in (TokenType.PLUS, TokenType.MINUS,
+                                                                             TokenType.STAR, TokenType.SLASH,
+                                                                             TokenType.CARET, TokenType.PERCENT):
+            return value
+
+        temp: str = self.__temp()
+        return f"(({temp} := {value}) is not None and {temp} is not False)"
+
+    def __suite(self, statements: list[Stmt]) -> None:
+        self.__indent += 1
+        start: int = len(self.lines)
+
+        for statement in statements:
+            statement.accept(self)
+
+        self.__end_suite(start)
+        self.__indent -= 1
+
+    def __end_suite(self, start: int) -> None:
+        if len(self.lines) == start:
+            self.__emit("pass")
+
+    def __expression(self, expr: Expr) -> str:
+        return expr.accept(self)
+
+    def __temp(self) -> str:
+        self.__counter += 1
+        return f"_t{self.__counter}"
+
+    def __token(self, token: Token) -> str:
+        index: int | None = self.__token_indices.get(id(token))
+        if index is None:
+            index = self.__token_indices[id(token)] = len(self.tokens)
+            self.tokens.append(token)
+
+        return f"{self.__token_table}[{index}]"
+
+    def __emit(self, line: str) -> None:
+        self.lines.append("    " * self.__indent + line)
+        self.line_tokens.append(self.__pending_tokens)
+        self.__pending_tokens = []
+
+
+# Runtime support for the generated code
+
+# A call made in tail position, returned by the body making it instead of being made
+class _TailCall:
+    __slots__ = ("body", "arguments")
+
+    def __init__(self, body, arguments: tuple[object, ...]):
+        self.body = body
+        self.arguments: tuple[object, ...] = arguments
+
+
+# Runs the body, then the tail calls it returns one after the other, so that tail recursion takes no Python stack
+def _trampoline(body):
+    def run(*arguments: object) -> object:
+        value: object = body(*arguments)
+        while value.__class__ is _TailCall:
+            value = value.body(*value.arguments)
+
+        return value
+
+    return run
+
+
+# The body is the Python function generated for the Lox one, and function is what calls go through: the body itself,
+# unless it makes tail calls, which have to be run by a trampoline
+class TranspiledFunction(LoxCallable):
+    def __init__(self, name: str, body, param_count: int, is_initializer: bool, makes_tail_calls: bool):
+        self.name: str = name
+        self.body = body
+        self.function = _trampoline(body) if makes_tail_calls else body
+        self.param_count: int = param_count
+        self.is_initializer: bool = is_initializer
+        self.makes_tail_calls: bool = makes_tail_calls
+
+    def bind(self, instance: LoxInstance):
+        # Methods take "this" as their first parameter, so binding is just making a Python bound method
+        return TranspiledFunction(self.name, self.body.__get__(instance), self.param_count, self.is_initializer,
+                                  self.makes_tail_calls)
+
+    def call(self, interpreter, arguments: list[object]) -> object:
+        return self.function(*arguments)
+
+    def invoke(self, interpreter, this: LoxInstance, arguments: list[object]) -> object:
+        return self.function(this, *arguments)
+
+    def arity(self) -> int:
+        return self.param_count
+
+    def __str__(self) -> str:
+        return f"<fn {self.name}>"
+
+
+def _add(left: object, right: object, token: Token) -> str:
+    if isinstance(left, str) and isinstance(right, str):
+        return left + right
+
+    raise LoxRuntimeError(token, "Operands must be two numbers or two strings.")
+
+
+def _divide(left: float, right: float) -> float:
+    # 0/0 is NaN, just like in the interpreter
+    return nan if left == right == 0 else left / right
+
+
+def _numbers_error(token: Token) -> None:
+    raise LoxRuntimeError(token, "Operands must be numbers.")
+
+
+def _number_error(token: Token) -> None:
+    raise LoxRuntimeError(token, "Operand must be a number.")
+
+
+def _undefined(token: Token) -> None:
+    raise LoxRuntimeError(token, f"Undefined variable '{token.lexeme}'.")
+
+
+def _get(obj: object, name: Token) -> object:
+    if isinstance(obj, LoxInstance):
+        return obj.get(name)
+
+    raise LoxRuntimeError(name, "Only instances have properties.")
+
+
+def _instance(obj: object, name: Token) -> LoxInstance:
+    if isinstance(obj, LoxInstance):
+        return obj
+
+    raise LoxRuntimeError(name, "Only instances have fields.")
+
+
+def _set(obj: LoxInstance, name: Token, value: object) -> object:
+    obj.set(name, value)
+    return value
+
+
+def _set_box(box: list[object], value: object) -> object:
+    box[0] = value
+    return value
+
+
+def _super(superclass: LoxClass, this: LoxInstance, method_name: Token) -> TranspiledFunction:
+    method: TranspiledFunction | None = superclass.find_method(method_name.lexeme)
+    if method is None:
+        raise LoxRuntimeError(method_name, f"Undefined property '{method_name.lexeme}'.")
+
+    return method.bind(this)
+
+
+def _superclass(superclass: object, name: Token) -> LoxClass:
+    if isinstance(superclass, LoxClass):
+        return superclass
+
+    raise LoxRuntimeError(name, "Superclass must be a class.")
+
+
+class PythonBackend:
+    def __init__(self, lox_main, cache_dir: str | None = None):
+        self.__lox_main = lox_main
+        self.__cache_dir: str = cache_dir if cache_dir is not None else \
+            os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")), "pylox")
+        self.__cache_key: str | None = None
+        self.__line_tokens: dict[str, list[list[Token]]] = {}
+        self.__tail_calls: set[CallExpr] = set()
+        self.__program_count: int = 0
+
+        # The namespace all the generated code runs in; Lox globals are its Python globals, with a "g_" prefix
+        self.__namespace: dict[str, object] = {
+            "_add": _add, "_divide": _divide, "_numbers_error": _numbers_error, "_number_error": _number_error,
+            "_undefined": _undefined, "_get": _get, "_instance": _instance, "_set": _set, "_set_box": _set_box,
+            "_super": _super, "_superclass": _superclass, "_call": self.__call, "_set_global": self.__set_global,
+            "_str": stringify, "_inf": math.inf, "_nan": math.nan, "_Function": TranspiledFunction,
+            "_TailCall": _TailCall, "LoxClass": LoxClass
+        }
+        self.__namespace["_G"] = self.__namespace
+
+        for native in native_functions:
+            native: LoxNativeFunction = native()
+            self.__namespace[f"g_{native.name}"] = native
+
+    # Looks the script up in the cache first, so that scanning, parsing and resolving can be skipped entirely. On a
+    # miss, the key is remembered for the interpret call that follows
+    def run_cached(self, source: str, mode: OpMode, inline: bool) -> bool:
+        self.__cache_key = None
+        if mode != OpMode.SCRIPT:
+            return False
+
+        key: str = hashlib.sha256(b"".join([sources_hash(), importlib.util.MAGIC_NUMBER, b"inline" if inline else b"",
+                                            source.encode("utf-8")])).hexdigest()
+        # Anything wrong with the entry, down to it not having the expected shape, only means compiling the script again
+        try:
+            with open(os.path.join(self.__cache_dir, f"{key}.loxc"), "rb") as file:
+                code, stored_tokens, stored_lines = marshal.load(file)
+            if type(code) is not CodeType:
+                raise ValueError("cache entry holds no code")
+            tokens: list[Token] = [Token(TokenType[typ], lexeme, literal, line)
+                                   for typ, lexeme, literal, line in stored_tokens]
+            line_tokens: list[list[Token]] = [[tokens[index] for index in line] for line in stored_lines]
+        except Exception:
+            self.__cache_key = key
+            return False
+
+        self.__execute(code, key, tokens, line_tokens)
+        return True
+
+    def interpret(self, statements: list[Stmt], mode: OpMode) -> None:
+        key: str = self.__cache_key if self.__cache_key is not None else f"repl{self.__program_count}"
+        self.__program_count += 1
+
+        analyzer: ScopeAnalyzer = ScopeAnalyzer()
+        analyzer.analyze(statements)
+        transpiler: Transpiler = Transpiler(analyzer, f"_T_{key}", self.__tail_calls)
+        source: str = transpiler.transpile(statements, mode == OpMode.INTERACTIVE)
+        self.__tail_calls.clear()
+        code: CodeType = compile(source, f"<lox {key}>", "exec")
+
+        if self.__cache_key is not None:
+            self.__store(key, code, transpiler.tokens, transpiler.line_tokens)
+            self.__cache_key = None
+
+        self.__execute(code, key, transpiler.tokens, transpiler.line_tokens)
+
+    # Variables are resolved by the transpiler's own analysis
+    def resolve(self, node: object, kind: VariableKind, index: int) -> None:
+        pass
+
+    def resolve_function(self, function: FunctionStmt, layout: FunctionLayout) -> None:
+        pass
+
+    def resolve_script(self, frame_size: int) -> None:
+        pass
+
+    def resolve_tail_call(self, expr: CallExpr) -> None:
+        self.__tail_calls.add(expr)
+
+    def __store(self, key: str, code: CodeType, tokens: list[Token], line_tokens: list[list[Token]]) -> None:
+        path: str = os.path.join(self.__cache_dir, f"{key}.loxc")
+        try:
+            os.makedirs(self.__cache_dir, exist_ok=True)
+            # Only plain tuples, strings and numbers go next to the code, so that reading an entry back never runs
+            # anything; the tokens of each line refer to the token table by their index
+            indices: dict[int, int] = {id(token): index for index, token in enumerate(tokens)}
+            stored_tokens: list[tuple] = [(token.type.name, token.lexeme, token.literal, token.line)
+                                          for token in tokens]
+            stored_lines: list[tuple[int, ...]] = []
+            for line in line_tokens:
+                for token in line:
+                    if id(token) not in indices:
+                        indices[id(token)] = len(stored_tokens)
+                        stored_tokens.append((token.type.name, token.lexeme, token.literal, token.line))
+                stored_lines.append(tuple(indices[id(token)] for token in line))
+
+            # Written under a temporary name first so that concurrent runs never see a half-written entry
+            with open(f"{path}.{os.getpid()}", "wb") as file:
+                marshal.dump((code, tuple(stored_tokens), tuple(stored_lines)), file)
+            os.replace(f"{path}.{os.getpid()}", path)
+        except OSError:
+            pass
+
+    def __execute(self, code: CodeType, key: str, tokens: list[Token], line_tokens: list[list[Token]]) -> None:
+        self.__namespace[f"_T_{key}"] = tokens
+        self.__line_tokens[code.co_filename] = line_tokens
+
+        try:
+            exec(code, self.__namespace)
+            self.__namespace["_main"]()
+        except LoxRuntimeError as err:
+            self.__lox_main.runtime_error(err)
+        except NameError as err:
+            name: str = err.name.removeprefix("g_")
+            token: Token = next(token for token in self.__failed_line(err) if token.lexeme == name)
+            self.__lox_main.runtime_error(LoxRuntimeError(token, f"Undefined variable '{name}'."))
+        except RecursionError as err:
+            # Calls in tail position never nest, so this is recursion the other backends run out of stack on as well
+            token: Token = next(token for token in self.__failed_line(err) if token.type == TokenType.RIGHT_PAREN)
+            self.__lox_main.runtime_error(LoxRuntimeError(token, "Stack overflow."))
+
+    # The tokens of the line of generated code that failed, in the innermost frame of generated code
+    def __failed_line(self, err: Exception) -> list[Token]:
+        traceback: TracebackType | None = err.__traceback__
+        tokens: list[Token] = []
+        while traceback is not None:
+            if (line_tokens := self.__line_tokens.get(traceback.tb_frame.f_code.co_filename)) is not None:
+                tokens = line_tokens[traceback.tb_lineno - 1]
+            traceback = traceback.tb_next
+
+        return tokens
+
+    def __call(self, callee: object, paren: Token, arguments: tuple[object, ...]) -> object:
+        if not isinstance(callee, LoxCallable):
+            raise LoxRuntimeError(paren, "Can only call functions and classes.")
+        if (arg_no := len(arguments)) != (arity := callee.arity()):
+            raise LoxRuntimeError(paren, f"Expected {arity} arguments but got {arg_no}.")
+
+        try:
+            return callee.call(self, list(arguments))
+        except LoxFunctionError as err:
+            raise LoxRuntimeError(paren, f"in function {err.function}: {err.message}.")
+
+    def __set_global(self, value: object, name: str, token: Token) -> object:
+        if name not in self.__namespace:
+            raise LoxRuntimeError(token, f"Undefined variable '{token.lexeme}'.")
+
+        self.__namespace[name] = value
+        return value
+
+
+__all__ = ["PythonBackend"]
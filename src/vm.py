@@ -0,0 +1,539 @@
+from math import nan
+
+from bytecode import OpCode
+from compiler import *
+from errors import LoxRuntimeError, LoxFunctionError
+from expr import CallExpr
+from interpreter import OpMode
+from lox_callable import LoxCallable
+from lox_class import *
+from lox_native import *
+from lox_value import *
+from resolver import FunctionLayout, VariableKind
+from stmt import FunctionStmt, Stmt
+from tokenclass import Token
+
+# Comparing against plain ints is a good deal faster than comparing against IntEnum members in the dispatch loop
+CONSTANT: int = OpCode.CONSTANT.value
+NIL: int = OpCode.NIL.value
+TRUE: int = OpCode.TRUE.value
+FALSE: int = OpCode.FALSE.value
+POP: int = OpCode.POP.value
+GET_LOCAL: int = OpCode.GET_LOCAL.value
+SET_LOCAL: int = OpCode.SET_LOCAL.value
+GET_GLOBAL: int = OpCode.GET_GLOBAL.value
+DEFINE_GLOBAL: int = OpCode.DEFINE_GLOBAL.value
+SET_GLOBAL: int = OpCode.SET_GLOBAL.value
+GET_UPVALUE: int = OpCode.GET_UPVALUE.value
+SET_UPVALUE: int = OpCode.SET_UPVALUE.value
+GET_PROPERTY: int = OpCode.GET_PROPERTY.value
+SET_PROPERTY: int = OpCode.SET_PROPERTY.value
+GET_SUPER: int = OpCode.GET_SUPER.value
+GET_METHOD: int = OpCode.GET_METHOD.value
+GET_SUPER_METHOD: int = OpCode.GET_SUPER_METHOD.value
+EQUAL: int = OpCode.EQUAL.value
+NOT_EQUAL: int = OpCode.NOT_EQUAL.value
+GREATER: int = OpCode.GREATER.value
+GREATER_EQUAL: int = OpCode.GREATER_EQUAL.value
+LESS: int = OpCode.LESS.value
+LESS_EQUAL: int = OpCode.LESS_EQUAL.value
+ADD: int = OpCode.ADD.value
+SUBTRACT: int = OpCode.SUBTRACT.value
+MULTIPLY: int = OpCode.MULTIPLY.value
+DIVIDE: int = OpCode.DIVIDE.value
+MODULO: int = OpCode.MODULO.value
+POWER: int = OpCode.POWER.value
+NOT: int = OpCode.NOT.value
+NEGATE: int = OpCode.NEGATE.value
+PRINT: int = OpCode.PRINT.value
+JUMP: int = OpCode.JUMP.value
+JUMP_IF_FALSE: int = OpCode.JUMP_IF_FALSE.value
+POP_JUMP_IF_FALSE: int = OpCode.POP_JUMP_IF_FALSE.value
+LOOP: int = OpCode.LOOP.value
+CALL: int = OpCode.CALL.value
+INVOKE: int = OpCode.INVOKE.value
+CALL_METHOD: int = OpCode.CALL_METHOD.value
+CLOSURE: int = OpCode.CLOSURE.value
+CLOSE_UPVALUE: int = OpCode.CLOSE_UPVALUE.value
+RETURN: int = OpCode.RETURN.value
+CLASS: int = OpCode.CLASS.value
+INHERIT: int = OpCode.INHERIT.value
+METHOD: int = OpCode.METHOD.value
+
+FRAMES_MAX: int = 4096
+
+
+class Upvalue:
+    # While the captured variable is still alive on the VM stack, "cells" is the stack itself and "index" is the
+    # variable's slot. Closing the upvalue swaps in a one-element list of its own, so reads and writes never branch
+    def __init__(self, stack: list[object], index: int):
+        self.cells: list[object] = stack
+        self.index: int = index
+
+    def close(self) -> None:
+        self.cells = [self.cells[self.index]]
+        self.index = 0
+
+
+class Closure(LoxCallable):
+    def __init__(self, function: Function, upvalues: list[Upvalue]):
+        self.function: Function = function
+        self.upvalues: list[Upvalue] = upvalues
+
+    def bind(self, instance: LoxInstance):
+        return BoundMethod(instance, self)
+
+    def call(self, interpreter, arguments: list[object]) -> object:
+        return interpreter.call_closure(self, arguments)
+
+    def invoke(self, interpreter, this: LoxInstance, arguments: list[object]) -> object:
+        return interpreter.call_closure(self, arguments, this)
+
+    def arity(self) -> int:
+        return self.function.arity
+
+    def __str__(self) -> str:
+        return str(self.function)
+
+
+class BoundMethod(LoxCallable):
+    def __init__(self, receiver: LoxInstance, method: Closure):
+        self.receiver: LoxInstance = receiver
+        self.method: Closure = method
+
+    def call(self, interpreter, arguments: list[object]) -> object:
+        return interpreter.call_closure(self.method, arguments, self.receiver)
+
+    def arity(self) -> int:
+        return self.method.arity()
+
+    def __str__(self) -> str:
+        return str(self.method)
+
+
+class CallFrame:
+    __slots__ = ("closure", "ip", "base")
+
+    def __init__(self, closure: Closure, base: int):
+        self.closure: Closure = closure
+        self.ip: int = 0
+        # Index of the stack slot holding the callee (or the receiver for methods); locals follow it
+        self.base: int = base
+
+
+class VM:
+    def __init__(self, lox_main):
+        self.__lox_main = lox_main
+        self.globals: dict[str, object] = {}
+        self.__stack: list[object] = []
+        self.__frames: list[CallFrame] = []
+        self.__open_upvalues: dict[int, Upvalue] = {}
+
+        self.__define_natives()
+
+    def interpret(self, statements: list[Stmt], mode: OpMode) -> None:
+        function: Function = Compiler().compile(statements, mode == OpMode.INTERACTIVE)
+
+        try:
+            self.call_closure(Closure(function, []), [])
+        except LoxRuntimeError as err:
+            self.__stack.clear()
+            self.__frames.clear()
+            self.__open_upvalues.clear()
+            self.__lox_main.runtime_error(err)
+
+    # The compiler resolves variables on its own, so the resolver's results aren't needed
+    def resolve(self, node: object, kind: VariableKind, index: int) -> None:
+        pass
+
+    def resolve_function(self, function: FunctionStmt, layout: FunctionLayout) -> None:
+        pass
+
+    def resolve_script(self, frame_size: int) -> None:
+        pass
+
+    # A call right before a return is a tail call, which the VM spots on its own
+    def resolve_tail_call(self, expr: CallExpr) -> None:
+        pass
+
+    def call_closure(self, closure: Closure, arguments: list[object], receiver: LoxInstance | None = None) -> object:
+        self.__stack.append(receiver if receiver is not None else closure)
+        self.__stack.extend(arguments)
+        self.__push_frame(closure, len(arguments))
+
+        return self.__run(len(self.__frames) - 1)
+
+    def __push_frame(self, closure: Closure, arg_count: int) -> CallFrame:
+        frame: CallFrame = CallFrame(closure, len(self.__stack) - arg_count - 1)
+        self.__frames.append(frame)
+
+        return frame
+
+    # Everything but closures is called here, away from the dispatch loop: bound methods and classes turn into calls of
+    # their closures (or of nothing, for a class without an initializer), other callables are called straight away and
+    # leave their result on the stack
+    def __prepare_call(self, callee: object, arg_count: int, token: Token) -> Closure | None:
+        stack: list[object] = self.__stack
+        if isinstance(callee, LoxClass):
+            stack[-1 - arg_count] = LoxInstance(callee)
+            initializer: Closure | None = callee.find_method("init")
+            if initializer is None and arg_count != 0:
+                raise LoxRuntimeError(token, f"Expected 0 arguments but got {arg_count}.")
+            return initializer
+
+        if isinstance(callee, BoundMethod):
+            stack[-1 - arg_count] = callee.receiver
+            return callee.method
+
+        if not isinstance(callee, LoxCallable):
+            raise LoxRuntimeError(token, "Can only call functions and classes.")
+
+        if arg_count != (arity := callee.arity()):
+            raise LoxRuntimeError(token, f"Expected {arity} arguments but got {arg_count}.")
+
+        arguments: list[object] = stack[len(stack) - arg_count:]
+        del stack[len(stack) - arg_count - 1:]
+        try:
+            stack.append(callee.call(self, arguments))
+        except LoxFunctionError as err:
+            raise LoxRuntimeError(token, f"in function {err.function}: {err.message}.")
+
+        return None
+
+    def __capture_upvalue(self, index: int) -> Upvalue:
+        upvalue: Upvalue | None = self.__open_upvalues.get(index)
+        if upvalue is None:
+            upvalue = self.__open_upvalues[index] = Upvalue(self.__stack, index)
+
+        return upvalue
+
+    def __close_upvalues(self, last: int) -> None:
+        for index in [index for index in self.__open_upvalues if index >= last]:
+            self.__open_upvalues.pop(index).close()
+
+    # The frame that a call was made from is kept untouched, so it is enough to remember the depth the VM has to come
+    # back to in order to support re-entrant calls (from Closure.call)
+    def __run(self, exit_depth: int) -> object:
+        stack: list[object] = self.__stack
+        frames: list[CallFrame] = self.__frames
+        open_upvalues: dict[int, Upvalue] = self.__open_upvalues
+        push = stack.append
+        pop = stack.pop
+        global_values: dict[str, object] = self.globals
+
+        frame: CallFrame = frames[-1]
+        closure: Closure = frame.closure
+        code = closure.function.chunk.code
+        constants: list[object] = closure.function.chunk.constants
+        tokens: list[Token] = closure.function.chunk.tokens
+        base: int = frame.base
+        ip: int = frame.ip
+
+        # Every instruction tested costs all the ones tested after it a comparison, so they are tested in the order of
+        # how often they ran over the benchmarks. A table of handlers would cost a Python call for every instruction
+        # instead, which is more than all those comparisons for the ones at the top
+        while True:
+            op: int = code[ip]
+            ip += 1
+
+            if op == GET_LOCAL:
+                push(stack[base + code[ip]])
+                ip += 1
+            elif op == GET_GLOBAL:
+                name: Token = constants[code[ip]]
+                ip += 1
+                try:
+                    push(global_values[name.lexeme])
+                except KeyError:
+                    raise LoxRuntimeError(name, f"Undefined variable '{name.lexeme}'.")
+            elif op == POP:
+                pop()
+            elif op == CONSTANT:
+                push(constants[code[ip]])
+                ip += 1
+            elif CALL <= op <= CALL_METHOD:
+                if op == INVOKE:
+                    name: Token = constants[code[ip]]
+                    arg_count: int = code[ip + 1]
+                    ip += 2
+
+                    receiver: object = stack[-1 - arg_count]
+                    if not isinstance(receiver, LoxInstance):
+                        raise LoxRuntimeError(name, "Only instances have properties.")
+
+                    index: int | None = receiver.shape.offsets.get(name.lexeme)
+                    if index is not None:
+                        callee: object = receiver.values[index]
+                        stack[-1 - arg_count] = callee
+                    elif (callee := receiver.klass.find_method(name.lexeme)) is None:
+                        raise LoxRuntimeError(name, f"Undefined property '{name.lexeme}'.")
+                else:
+                    arg_count: int = code[ip]
+                    ip += 1
+
+                    # A method looked up ahead of CALL_METHOD sits between its receiver and the arguments, a nil there
+                    # means a field is called
+                    method: Closure | None = stack.pop(-1 - arg_count) if op == CALL_METHOD else None
+                    callee: object = method if method is not None else stack[-1 - arg_count]
+
+                if callee.__class__ is not Closure:
+                    frame.ip = ip
+                    callee = self.__prepare_call(callee, arg_count, tokens[ip - 1])
+                    if callee is None:
+                        continue
+
+                function: Function = callee.function
+                if arg_count != function.arity:
+                    raise LoxRuntimeError(tokens[ip - 1], f"Expected {function.arity} arguments but got {arg_count}.")
+
+                if code[ip] == RETURN:
+                    # A call in tail position: the caller is done, so the callee takes over its frame (and the return
+                    # to the caller's caller), instead of piling up another one
+                    if open_upvalues:
+                        self.__close_upvalues(base)
+                    del stack[base:len(stack) - arg_count - 1]
+                    frame.closure = callee
+                else:
+                    if len(frames) == FRAMES_MAX:
+                        raise LoxRuntimeError(tokens[ip - 1], "Stack overflow.")
+
+                    frame.ip = ip
+                    frame = CallFrame(callee, len(stack) - arg_count - 1)
+                    frames.append(frame)
+                closure = callee
+                code = function.chunk.code
+                constants = function.chunk.constants
+                tokens = function.chunk.tokens
+                base = frame.base
+                ip = 0
+            elif op == RETURN:
+                result: object = pop()
+                if open_upvalues:
+                    self.__close_upvalues(base)
+
+                frames.pop()
+                del stack[base:]
+
+                if len(frames) == exit_depth:
+                    return result
+
+                push(result)
+                frame = frames[-1]
+                closure = frame.closure
+                code = closure.function.chunk.code
+                constants = closure.function.chunk.constants
+                tokens = closure.function.chunk.tokens
+                base = frame.base
+                ip = frame.ip
+            elif op == GET_PROPERTY:
+                name: Token = constants[code[ip]]
+                ip += 1
+                obj: object = stack[-1]
+                if not isinstance(obj, LoxInstance):
+                    raise LoxRuntimeError(name, "Only instances have properties.")
+
+                # Only methods, which have to be bound, and missing properties are left to LoxInstance.get
+                index: int | None = obj.shape.offsets.get(name.lexeme)
+                stack[-1] = obj.values[index] if index is not None else obj.get(name)
+            elif op == ADD:
+                right: object = pop()
+                left: object = stack[-1]
+                if isinstance(left, float) and isinstance(right, float):
+                    stack[-1] = left + right
+                elif isinstance(left, str) and isinstance(right, str):
+                    stack[-1] = left + right
+                else:
+                    raise LoxRuntimeError(tokens[ip - 1], "Operands must be two numbers or two strings.")
+            elif op == NIL:
+                push(None)
+            elif op == POP_JUMP_IF_FALSE:
+                condition: object = pop()
+                if condition is None or condition is False:
+                    ip += code[ip]
+                ip += 1
+            elif op == EQUAL:
+                right: object = pop()
+                left: object = stack[-1]
+                # The same as is_equal, without the call
+                stack[-1] = type(left) is type(right) and left == right
+            elif op == LESS:
+                right: object = pop()
+                left: object = stack[-1]
+                if not (isinstance(left, float) and isinstance(right, float)):
+                    raise LoxRuntimeError(tokens[ip - 1], "Operands must be numbers.")
+                stack[-1] = left < right
+            elif op == SET_PROPERTY:
+                name: Token = constants[code[ip]]
+                ip += 1
+                value: object = pop()
+                obj: object = stack[-1]
+                if not isinstance(obj, LoxInstance):
+                    raise LoxRuntimeError(name, "Only instances have fields.")
+                obj.set(name, value)
+                stack[-1] = value
+            elif op == SUBTRACT:
+                right: object = pop()
+                left: object = stack[-1]
+                if not (isinstance(left, float) and isinstance(right, float)):
+                    raise LoxRuntimeError(tokens[ip - 1], "Operands must be numbers.")
+                stack[-1] = left - right
+            elif op == FALSE:
+                push(False)
+            elif op == SET_GLOBAL:
+                name: Token = constants[code[ip]]
+                ip += 1
+                if name.lexeme not in global_values:
+                    raise LoxRuntimeError(name, f"Undefined variable '{name.lexeme}'.")
+                global_values[name.lexeme] = stack[-1]
+            elif op == TRUE:
+                push(True)
+            elif op == LOOP:
+                ip += 1 - code[ip]
+            elif op == GET_METHOD:
+                name: Token = constants[code[ip]]
+                ip += 1
+                obj: object = stack[-1]
+                if not isinstance(obj, LoxInstance):
+                    raise LoxRuntimeError(name, "Only instances have properties.")
+
+                index: int | None = obj.shape.offsets.get(name.lexeme)
+                if index is not None:
+                    stack[-1] = obj.values[index]
+                    push(None)
+                elif (method := obj.klass.find_method(name.lexeme)) is not None:
+                    push(method)
+                else:
+                    raise LoxRuntimeError(name, f"Undefined property '{name.lexeme}'.")
+            elif op == NOT:
+                value: object = stack[-1]
+                stack[-1] = value is None or value is False
+            elif op == GREATER:
+                right: object = pop()
+                left: object = stack[-1]
+                if not (isinstance(left, float) and isinstance(right, float)):
+                    raise LoxRuntimeError(tokens[ip - 1], "Operands must be numbers.")
+                stack[-1] = left > right
+            elif op == GREATER_EQUAL:
+                right: object = pop()
+                left: object = stack[-1]
+                if not (isinstance(left, float) and isinstance(right, float)):
+                    raise LoxRuntimeError(tokens[ip - 1], "Operands must be numbers.")
+                stack[-1] = left >= right
+            elif op == JUMP:
+                ip += code[ip] + 1
+            elif op == JUMP_IF_FALSE:
+                condition: object = stack[-1]
+                if condition is None or condition is False:
+                    ip += code[ip]
+                ip += 1
+            elif op == SET_LOCAL:
+                stack[base + code[ip]] = stack[-1]
+                ip += 1
+            elif op == GET_UPVALUE:
+                upvalue: Upvalue = closure.upvalues[code[ip]]
+                ip += 1
+                push(upvalue.cells[upvalue.index])
+            elif op == SET_UPVALUE:
+                upvalue: Upvalue = closure.upvalues[code[ip]]
+                ip += 1
+                upvalue.cells[upvalue.index] = stack[-1]
+            elif op == GET_SUPER_METHOD:
+                name: Token = constants[code[ip]]
+                ip += 1
+                method: Closure | None = pop().find_method(name.lexeme)
+                if method is None:
+                    raise LoxRuntimeError(name, f"Undefined property '{name.lexeme}'.")
+                push(method)
+            elif op == NOT_EQUAL:
+                right: object = pop()
+                left: object = stack[-1]
+                stack[-1] = type(left) is not type(right) or left != right
+            elif op == LESS_EQUAL:
+                right: object = pop()
+                left: object = stack[-1]
+                if not (isinstance(left, float) and isinstance(right, float)):
+                    raise LoxRuntimeError(tokens[ip - 1], "Operands must be numbers.")
+                stack[-1] = left <= right
+            elif op == MULTIPLY:
+                right: object = pop()
+                left: object = stack[-1]
+                if not (isinstance(left, float) and isinstance(right, float)):
+                    raise LoxRuntimeError(tokens[ip - 1], "Operands must be numbers.")
+                stack[-1] = left * right
+            elif op == DIVIDE:
+                right: object = pop()
+                left: object = stack[-1]
+                if not (isinstance(left, float) and isinstance(right, float)):
+                    raise LoxRuntimeError(tokens[ip - 1], "Operands must be numbers.")
+                # Same as in the interpreter: 0/0 gives NaN, like in Java
+                stack[-1] = nan if left == right == 0 else left / right
+            elif op == MODULO:
+                right: object = pop()
+                left: object = stack[-1]
+                if not (isinstance(left, float) and isinstance(right, float)):
+                    raise LoxRuntimeError(tokens[ip - 1], "Operands must be numbers.")
+                stack[-1] = left % right
+            elif op == POWER:
+                right: object = pop()
+                left: object = stack[-1]
+                if not (isinstance(left, float) and isinstance(right, float)):
+                    raise LoxRuntimeError(tokens[ip - 1], "Operands must be numbers.")
+                stack[-1] = left ** right
+            elif op == NEGATE:
+                value: object = stack[-1]
+                if not isinstance(value, float):
+                    raise LoxRuntimeError(tokens[ip - 1], "Operand must be a number.")
+                stack[-1] = -value
+            elif op == PRINT:
+                print(stringify(pop()))
+            elif op == CLOSURE:
+                function: Function = constants[code[ip]]
+                ip += 1
+
+                upvalues: list[Upvalue] = []
+                for _ in range(function.upvalue_count):
+                    is_local: int = code[ip]
+                    index: int = code[ip + 1]
+                    ip += 2
+                    upvalues.append(self.__capture_upvalue(base + index) if is_local else closure.upvalues[index])
+
+                push(Closure(function, upvalues))
+            elif op == CLOSE_UPVALUE:
+                self.__close_upvalues(len(stack) - 1)
+                pop()
+            elif op == DEFINE_GLOBAL:
+                global_values[constants[code[ip]].lexeme] = pop()
+                ip += 1
+            elif op == GET_SUPER:
+                name: Token = constants[code[ip]]
+                ip += 1
+                superclass: LoxClass = pop()
+                method: Closure | None = superclass.find_method(name.lexeme)
+                if method is None:
+                    raise LoxRuntimeError(name, f"Undefined property '{name.lexeme}'.")
+                stack[-1] = method.bind(stack[-1])
+            elif op == CLASS:
+                push(LoxClass(constants[code[ip]], None, {}))
+                ip += 1
+            elif op == INHERIT:
+                superclass: object = stack[-2]
+                if not isinstance(superclass, LoxClass):
+                    raise LoxRuntimeError(tokens[ip - 1], "Superclass must be a class.")
+
+                # Copy-down inheritance, just like in the interpreter: the subclass's own methods are only added
+                # afterwards, so they override the inherited ones
+                subclass: LoxClass = pop()
+                subclass.superclass = superclass
+                subclass.methods.update(superclass.methods)
+            elif op == METHOD:
+                method: Closure = pop()
+                stack[-1].methods[constants[code[ip]]] = method
+                ip += 1
+
+    def __define_natives(self) -> None:
+        for native in native_functions:
+            native: LoxNativeFunction = native()
+            self.globals[native.name] = native
+
+
+__all__ = ["VM"]
@@ -1,10 +1,30 @@
+import itertools
+
 import pytest as pt
 
-from pylox import Lox
+from pylox import Backend, Lox
+
+cache_homes = itertools.count()
+
+
+@pt.fixture(scope="session")
+def cache_root(tmp_path_factory):
+    return tmp_path_factory.mktemp("cache")
+
+
+# The Python backend caches the code it compiles, which would make every run after the first one skip the transpiler,
+# so each test gets a cache of its own, out of the way of the real one. The directory is only made if something is
+# stored in it
+@pt.fixture(autouse=True)
+def cache_home(monkeypatch, cache_root):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(cache_root / str(next(cache_homes))))
 
 
-@pt.fixture
-def lox():
-    interpreter = Lox()
+# Every backend has to produce exactly the same output, so the whole suite runs against each of them, with and without
+# inlining small functions
+@pt.fixture(params=[(backend, inline) for inline in (False, True) for backend in Backend],
+            ids=lambda param: param[0].name.lower() + ("-inline" if param[1] else ""))
+def lox(request):
+    interpreter = Lox(*request.param)
     yield interpreter
     del interpreter
@@ -26,6 +26,11 @@ class TestFields:
         capture = capsys.readouterr().out
         assert capture == "\n".join(["other", "1", "method", "2"]) + "\n"
 
+    def test_field_order(self, capsys, lox):
+        lox.run_file("field/field_order.lox")
+        capture = capsys.readouterr().out
+        assert capture == "\n".join(["1", "2", "4", "3", "1", "2", "5", "3"]) + "\n"
+
     def test_get_on_instance(self, capsys, lox):
         lox.run_file("field/on_instance.lox")
         capture = capsys.readouterr().out
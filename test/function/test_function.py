@@ -1,5 +1,7 @@
 import pytest as pt
 
+from pylox import Backend, Lox
+
 recursion_settings = ["function/recursion.lox", "function/local_recursion.lox"]
 recursion_ids = ["regular", "local"]
 
@@ -56,6 +58,21 @@ class TestFunctions:
         capture = capsys.readouterr().err
         assert capture == "Error: Undefined variable 'isOdd'.\n[line 4]\n"
 
+    # Only the stack evaluator recurses this deep, the other backends run out of Python stack or of frames first
+    def test_deep_recursion(self, capsys):
+        Lox(Backend.STACK).run_file("function/deep_recursion.lox")
+        assert capsys.readouterr().out == "30000\n30000\n"
+
+    # A runaway recursion is stopped by the depth limit long before it has used up the memory, or by Python's own in
+    # the Python backend
+    @pt.mark.parametrize("backend", [Backend.PYTHON, Backend.STACK], ids=lambda backend: backend.name.lower())
+    def test_runaway_recursion(self, capsys, backend):
+        with pt.raises(SystemExit) as exc:
+            Lox(backend).run_file("function/runaway_recursion.lox")
+        assert exc.value.code == 70
+
+        assert capsys.readouterr().err == "Error: Stack overflow.\n[line 2]\n"
+
     def test_body_must_be_block(self, capsys, lox):
         with pt.raises(SystemExit) as exc:
             lox.run_file("function/body_must_be_block.lox")
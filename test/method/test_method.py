@@ -28,6 +28,11 @@ class TestMethods:
         capture = capsys.readouterr().out
         assert capture == "nil\n"
 
+    def test_polymorphic_call_site(self, capsys, lox):
+        lox.run_file("method/polymorphic_call_site.lox")
+        capture = capsys.readouterr().out
+        assert capture == "\n".join(["A", "B", "A", "B", "field"]) + "\n"
+
     def test_print_bound_method(self, capsys, lox):
         lox.run_file("method/print_bound_method.lox")
         capture = capsys.readouterr().out
@@ -60,6 +65,15 @@ class TestMethods:
         capture = capsys.readouterr().err
         assert capture == "Error: Undefined property 'unknown'.\n[line 3]\n"
 
+    def test_lookup_before_arguments(self, capsys, lox):
+        with pt.raises(SystemExit) as exc:
+            lox.run_file("method/lookup_before_arguments.lox")
+        assert exc.value.code == 70
+
+        capture = capsys.readouterr()
+        assert capture.out == ""
+        assert capture.err == "Error: Undefined property 'unknown'.\n[line 9]\n"
+
     def test_refer_to_name(self, capsys, lox):
         with pt.raises(SystemExit) as exc:
             lox.run_file("method/refer_to_name.lox")
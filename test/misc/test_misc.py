@@ -1,5 +1,7 @@
 import pytest as pt
 
+from pylox import Backend, Lox
+
 
 def test_empty(capsys, lox):
     lox.run_file("misc/empty_file.lox")
@@ -28,3 +30,20 @@ def test_precedence(capsys, lox):
     expected_val = [str(v).lower() for v in expected_val]
 
     assert capture == "\n".join(expected_val) + "\n"
+
+
+def test_unreadable_cache_entry(capsys, monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    with pt.raises(SystemExit):
+        Lox(Backend.PYTHON).run_file("variable/undefined_global.lox")
+    for entry in (tmp_path / "pylox").iterdir():
+        entry.write_bytes(b"\x00not a cache entry")
+
+    # The broken entry counts as a miss and is replaced, so the last run reads the script back from the cache
+    for _ in range(2):
+        with pt.raises(SystemExit) as exc:
+            Lox(Backend.PYTHON).run_file("variable/undefined_global.lox")
+        assert exc.value.code == 70
+
+    capture = capsys.readouterr().err
+    assert capture == "Error: Undefined variable 'notDefined'.\n[line 2]\n" * 3
@@ -0,0 +1,182 @@
+import pytest as pt
+
+from constant_folder import ConstantFolder
+from dead_code_eliminator import DeadCodeEliminator
+from expr import *
+from inliner import Inliner
+from interpreter import Interpreter, OpMode
+from parser import Parser
+from pylox import Backend, Lox
+from quickening import *
+from resolver import Resolver
+from scanner import Scanner
+from stmt import *
+
+
+def optimize(source: str) -> list[Stmt]:
+    lox = Lox()
+    statements = ConstantFolder().fold(Parser(Scanner(source, lox).scan_tokens(), lox).parse())
+    resolver = Resolver(Interpreter(lox), lox)
+    resolver.resolve(statements)
+    assert not lox.had_error
+
+    return DeadCodeEliminator(resolver.unused_locals).eliminate(ConstantFolder(short_circuit=True).fold(statements))
+
+
+def test_constant_folding(capsys, lox):
+    lox.run_file("optimization/constant_folding.lox")
+    capture = capsys.readouterr().out
+
+    expected_val = ["5", "9", "abc", "2", "false", "nan", "nan", "-0", "0", "true", "false", "false", "true", "nil",
+                    "right", "right"]
+
+    assert capture == "\n".join(expected_val) + "\n"
+
+
+def test_folded_type_error(capsys, lox):
+    with pt.raises(SystemExit) as exc:
+        lox.run_file("optimization/folded_type_error.lox")
+    assert exc.value.code == 70
+
+    capture = capsys.readouterr()
+
+    assert capture.out == "3\n"
+    assert capture.err == "Error: Operands must be two numbers or two strings.\n[line 4]\n"
+
+
+def test_dead_code(capsys, lox):
+    lox.run_file("optimization/dead_code.lox")
+    capture = capsys.readouterr().out
+
+    assert capture == "used\nbig\nsmall\n3\n"
+
+
+def test_unreachable_static_error(capsys, lox):
+    with pt.raises(SystemExit) as exc:
+        lox.run_file("optimization/unreachable_static_error.lox")
+    assert exc.value.code == 65
+
+    assert capsys.readouterr().err == "[line 3] Error at 'this': Can't use 'this' outside of a class.\n"
+
+
+def test_short_circuited_static_error(capsys, lox):
+    with pt.raises(SystemExit) as exc:
+        lox.run_file("optimization/short_circuited_static_error.lox")
+    assert exc.value.code == 65
+
+    expected_val = ["[line 1] Error at 'this': Can't use 'this' outside of a class.",
+                    "[line 5] Error at 'a': Can't read local variable in its own initializer."]
+
+    assert capsys.readouterr().err == "\n".join(expected_val) + "\n"
+
+
+def test_dead_code_elimination():
+    with open("optimization/dead_code.lox", "rt", encoding="utf-8") as file:
+        early, forever, block, *prints = optimize(file.read())
+
+    # Nothing follows a return, even one in both branches of an if, or a loop only a return can leave
+    assert [type(stmt) for stmt in early.body] == [IfStmt, ReturnStmt]
+    assert [type(stmt) for stmt in forever.body] == [VarStmt, WhileStmt]
+    # The unused local and the ifs and whiles with literal conditions are gone, the branch taken is left in a block
+    assert len(block.statements) == 2
+    assert isinstance(block.statements[0], VarStmt) and block.statements[0].name.lexeme == "used"
+    assert isinstance(block.statements[1], BlockStmt) and isinstance(block.statements[1].statements[0], PrintStmt)
+    assert len(prints) == 3
+
+
+def test_used_locals_kept():
+    block, = optimize("{ var a = 1; var b; var c = 1; fun f() { c = 2; } a = 2; print b; }")
+
+    assert [type(stmt) for stmt in block.statements] == [VarStmt, VarStmt, VarStmt, FunctionStmt, ExpressionStmt,
+                                                         PrintStmt]
+
+
+def test_inlining(capsys, lox):
+    with pt.raises(SystemExit) as exc:
+        lox.run_file("optimization/inlining.lox")
+    assert exc.value.code == 70
+
+    capture = capsys.readouterr()
+
+    assert capture.out == "16\n10\n20\n25\nfalse\n9\n"
+    assert capture.err == "Error: Operands must be numbers.\n[line 6]\n"
+
+
+def test_inlined_calls():
+    with open("optimization/inlining.lox", "rt", encoding="utf-8") as file:
+        source = file.read()
+    lox = Lox()
+    statements = Parser(Scanner(source, lox).scan_tokens(), lox).parse()
+    inliner = Inliner()
+    *_, block = inliner.inline(statements)
+
+    # Only the calls to square and mix in the block: the others are either made before square is declared or to a
+    # global shadowed where mix would be inlined, to a function that's reassigned or to one that calls itself
+    assert inliner.inlined == 3
+    square, mix = block.statements[1].expression, block.statements[2].expression
+    assert isinstance(square, BinaryExpr) and [operand.name.lexeme for operand in (square.left, square.right)] == \
+        ["x", "x"]
+    assert isinstance(mix, BinaryExpr) and isinstance(mix.right, VariableExpr) and mix.right.name.lexeme == "x"
+    assert isinstance(block.statements[-1].expression, BinaryExpr)
+
+
+@pt.mark.parametrize("backend", list(Backend), ids=lambda backend: backend.name.lower())
+def test_tail_calls(capsys, backend):
+    with pt.raises(SystemExit) as exc:
+        Lox(backend).run_file("optimization/tail_calls.lox")
+    assert exc.value.code == 70
+
+    capture = capsys.readouterr()
+
+    assert capture.out == "200010000\nfalse\n20000\ntrue\n0\ntrue\n<Counter instance>\n"
+    assert capture.err == "Error: Expected 2 arguments but got 1.\n[line 55]\n"
+
+
+@pt.mark.parametrize("backend", list(Backend), ids=lambda backend: backend.name.lower())
+def test_deep_tail_calls(capsys, backend):
+    Lox(backend).run_file("optimization/deep_tail_calls.lox")
+    assert capsys.readouterr().out == "100000\n"
+
+
+def subclasses(cls: type) -> list[type]:
+    return [cls] + [descendant for subclass in cls.__subclasses__() for descendant in subclasses(subclass)]
+
+
+# Swapping a node's class only works between classes with the same layout, which the quickened classes keep by not
+# adding any slots to those of the generated ones
+def test_slotted_nodes():
+    for node_class in subclasses(Expr) + subclasses(Stmt):
+        assert node_class.__dictoffset__ == 0, node_class.__name__
+    for node_class in subclasses(BinaryExpr)[1:] + subclasses(CallExpr)[1:]:
+        assert node_class.__basicsize__ == node_class.__base__.__basicsize__, node_class.__name__
+
+
+def test_quickening(capsys, lox):
+    with pt.raises(SystemExit) as exc:
+        lox.run_file("optimization/quickening.lox")
+    assert exc.value.code == 70
+
+    capture = capsys.readouterr()
+
+    assert capture.out == "3\n7\nab\n11\ntrue\nfalse\n"
+    assert capture.err == "Error: Operands must be numbers.\n[line 6]\n"
+
+
+def test_specialisation(capsys):
+    lox = Lox()
+    interpreter = Interpreter(lox)
+    statements = Parser(Scanner("fun f(a, b) { return a + b; } print f(1, 2); print f(3, 4);", lox).scan_tokens(),
+                        lox).parse()
+    Resolver(interpreter, lox).resolve(statements)
+    expr = statements[0].body[0].value
+
+    interpreter.interpret(statements[:2], OpMode.SCRIPT)
+    assert type(expr) is FloatAddExpr
+    interpreter.interpret(statements[2:], OpMode.SCRIPT)
+    assert type(expr) is FloatAddExpr
+
+    # A type miss turns the node generic for good, even if it gets numbers again afterwards
+    interpreter.interpret(Parser(Scanner('print f("a", "b"); print f(5, 6);', lox).scan_tokens(), lox).parse(),
+                          OpMode.SCRIPT)
+    assert type(expr) is GenericBinaryExpr
+    assert capsys.readouterr().out == "3\n7\nab\n11\n"
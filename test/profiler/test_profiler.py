@@ -0,0 +1,82 @@
+import pytest as pt
+
+from counters import InterpreterCounters
+from interpreter import Interpreter
+from lox_class import LoxClass
+from lox_function import LoxFunction
+from profiler import FunctionProfiler
+from pylox import Backend, Lox
+from sampler import SamplingProfiler
+
+
+# Only the tree-walker and the closure compiler call Lox functions through LoxFunction
+@pt.mark.parametrize("backend", [Backend.INTERPRETER, Backend.CLOSURES], ids=lambda backend: backend.name.lower())
+def test_call_counts(capsys, backend, tmp_path):
+    invoke, class_call = LoxFunction.invoke, LoxClass.call
+    profiler = FunctionProfiler()
+    profiler.start()
+    try:
+        Lox(backend).run_file("profiler/calls.lox")
+    finally:
+        profiler.stop()
+
+    assert capsys.readouterr().out == "5\n3\n1\n"
+    assert LoxFunction.invoke is invoke and LoxClass.call is class_call
+
+    calls = {label: stats.calls for label, stats in profiler.stats.items()}
+    assert calls == {"<fn fib> (line 1)": 15, "<class Counter>": 1, "<fn init> (line 7)": 1,
+                     "<fn increment> (line 11)": 3, "<native fn floor>": 1, "<script>": 1}
+
+    # Recursive calls are part of the outermost call's inclusive time, not added on top of it
+    fib = profiler.stats["<fn fib> (line 1)"]
+    assert fib.exclusive == pt.approx(fib.inclusive)
+    assert profiler.stats["<script>"].inclusive >= sum(stats.exclusive for stats in profiler.stats.values()) - 1e-9
+
+    assert ("<script>", "<class Counter>", "<fn init> (line 7)") in profiler.stacks
+    assert ("<script>", "<fn fib> (line 1)", "<fn fib> (line 1)", "<fn fib> (line 1)") in profiler.stacks
+
+    path = tmp_path / "calls.stacks"
+    profiler.write_stacks(str(path))
+    for line in path.read_text().splitlines():
+        stack, microseconds = line.rsplit(" ", 1)
+        assert stack.startswith("<script>") and int(microseconds) > 0
+
+
+def test_sampled_lines(capsys):
+    sampler = SamplingProfiler(0.0005)
+    sampler.start()
+    try:
+        Lox(Backend.INTERPRETER).run_file("profiler/hot_loop.lox")
+    finally:
+        sampler.stop()
+
+    assert capsys.readouterr().out == "449985000\n"
+    assert sampler.samples > 0
+    # Nearly every sample is taken inside the loop, all of them in the call on line 9
+    assert set(sampler.exclusive) <= {2, 3, 4, 6, 9}
+    assert sampler.exclusive.most_common(1)[0][0] in {3, 4}
+    assert sampler.inclusive[9] == sampler.samples
+    assert sampler.functions[4] == "<fn count> (line 1)" and sampler.functions[9] == "<script>"
+    assert all(stack[:2] == ("<script>", "<fn count> (line 1)") for stack in sampler.stacks if stack[-1] != "line 9")
+
+
+def test_counters(capsys):
+    visit_binary_expr = Interpreter.visit_binary_expr
+    counters = InterpreterCounters()
+    counters.start()
+    try:
+        Lox(Backend.INTERPRETER).run_file("profiler/calls.lox")
+    finally:
+        counters.stop()
+
+    assert capsys.readouterr().out == "5\n3\n1\n"
+    assert Interpreter.visit_binary_expr is visit_binary_expr
+
+    counts = counters.as_dict()
+    assert counts["nodes"]["CallExpr"] == 15 + 1 + 3 + 1
+    assert counts["nodes"]["ReturnStmt"] == counts["return_unwinds"] == 15
+    # Method calls invoke the method without binding it first
+    assert (counts["frames"], counts["bound_methods"], counts["cells"]) == (15 + 1 + 3, 0, 0)
+    assert counts["native_calls"] == 1
+    # fib in its body and in the print statement, Counter, counter in the loop and when printed, floor
+    assert counts["global_lookups"] == 14 + 1 + 1 + 3 + 1 + 1
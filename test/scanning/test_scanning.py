@@ -0,0 +1,94 @@
+import os
+import sys
+
+import pytest as pt
+
+from parser import TokenCursor
+from pylox import Lox
+from regex_scanner import RegexScanner
+from scanner import Scanner
+from tokenclass import Token, TokenType
+
+TEST_DIR: str = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR: str = os.path.dirname(TEST_DIR)
+
+
+def sources() -> list[str]:
+    paths: list[str] = []
+    for directory in (ROOT_DIR, os.path.join(os.path.dirname(ROOT_DIR), "benchmark")):
+        for parent, _, files in os.walk(directory):
+            paths += [os.path.join(parent, file) for file in files if file.endswith(".lox")]
+
+    return sorted(paths)
+
+
+def scan(scanner: type, source: str, capsys) -> tuple[list[tuple[object, ...]], str]:
+    tokens: list[Token] = scanner(source, Lox()).scan_tokens()
+    return [(token.type, token.lexeme, token.literal, token.line) for token in tokens], capsys.readouterr().err
+
+
+# The regular expression scanner has to be a drop-in replacement for the one going a character at a time, errors
+# included
+@pt.mark.parametrize("path", sources(), ids=lambda path: os.path.relpath(path, ROOT_DIR))
+def test_same_tokens(capsys, path):
+    with open(path, "rt", encoding="utf-8") as file:
+        source: str = file.read()
+
+    assert scan(RegexScanner, source, capsys) == scan(Scanner, source, capsys)
+
+
+def test_tokens(capsys):
+    # Carriage returns are kept, as they have to be skipped like any other whitespace
+    with open(os.path.join(TEST_DIR, "tokens.lox"), "rt", encoding="utf-8", newline="") as file:
+        tokens, errors = scan(RegexScanner, file.read(), capsys)
+
+    assert [lexeme for _, lexeme, _, line in tokens if line == 5] == \
+        ["123", "1.5", "1", ".", ".", "5", "0.25", ".", "3", "007", "12", "a", "a12"]
+    # The newline inside a string isn't counted
+    assert [literal for typ, _, literal, line in tokens if line == 6 and typ == TokenType.STRING] == \
+        ["", "a string", "multi\nline", "with // a comment"]
+    assert tokens[-1][3] == 9
+    assert errors.count("[line 7] Error: Unexpected character.\n") == 16
+    assert errors.endswith("[line 9] Error: Unterminated string.\n")
+
+
+# The parser pulls the tokens from the scanner as it goes, so scanning and parsing errors are reported in the order of
+# the lines they are on, rather than all of the scanning errors first
+def test_interleaved_errors(capsys, lox):
+    with pt.raises(SystemExit) as exc:
+        lox.run_file("scanning/interleaved_errors.lox")
+    assert exc.value.code == 65
+
+    assert capsys.readouterr().err == "[line 1] Error at ';': Expect expression.\n" \
+                                      "[line 2] Error: Unexpected character.\n" \
+                                      "[line 2] Error at '2': Expect ';' after variable declaration.\n"
+
+
+def test_bounded_lookahead():
+    pulled: list[Token] = []
+
+    def stream():
+        for token in RegexScanner("var a = 1;", Lox()).tokens():
+            pulled.append(token)
+            yield token
+
+    cursor: TokenCursor = TokenCursor(stream())
+    assert [token.lexeme for token in pulled] == ["var"]
+    for _ in range(2):
+        cursor.advance()
+    assert [token.lexeme for token in pulled] == ["var", "a", "="]
+    assert (cursor.previous.lexeme, cursor.current.lexeme) == ("a", "=")
+
+    # Nothing is pulled past the end
+    for _ in range(5):
+        cursor.advance()
+    assert cursor.current.type == TokenType.EOF and cursor.previous.lexeme == ";" and len(pulled) == 6
+
+
+def test_compact_tokens():
+    tokens: list[Token] = RegexScanner("var count = 1; count = count + 1;", Lox()).scan_tokens()
+    names: list[Token] = [token for token in tokens if token.type == TokenType.IDENTIFIER]
+
+    assert not hasattr(tokens[0], "__dict__")
+    # Every token of a name shares the interned string
+    assert len(names) == 3 and all(name.lexeme is sys.intern("count") for name in names)
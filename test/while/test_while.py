@@ -24,6 +24,11 @@ class TestWhile:
         capture = capsys.readouterr().out
         assert capture == "\n".join(["1", "2", "3"]) + "\n"
 
+    def test_reuse_body_slot(self, capsys, lox):
+        lox.run_file("while/reuse_body_slot.lox")
+        capture = capsys.readouterr().out
+        assert capture == "\n".join(["nil", "nil", "nil", "1"]) + "\n"
+
     @pt.mark.parametrize("path", return_paths, ids=return_ids)
     def test_return(self, capsys, lox, path):
         lox.run_file(path)
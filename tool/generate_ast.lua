@@ -1,5 +1,13 @@
+-- Nodes are slotted, so that big programs don't need a dict for each of them. Subclasses swapped in for a node's class
+-- at runtime (see quickening.py) have to declare empty slots, to keep the same layout
 function define_type(file, base_name, class_name, fields)
+    local names = {}
+    for field in fields:gmatch "([%a_]+: [%[%]%a%s|]+)" do
+        names[#names + 1] = "\"" .. field:match "([%a_]+):" .. "\""
+    end
+
     file:write("class ", class_name, base_name, "(", base_name, "):\n")
+    file:write("    __slots__ = (", table.concat(names, ", "), #names == 1 and "," or "", ")\n\n")
     file:write("    def __init__(self, ", fields, "):\n")
 
     for field in fields:gmatch "([%a_]+: [%[%]%a%s|]+)" do
@@ -12,21 +20,32 @@ function define_type(file, base_name, class_name, fields)
     file:write "\n\n"
 end
 
-function define_visitor(file, base_name, class_name)
+function define_visitor(file, base_name, class_name, return_type)
     local base = base_name:lower()
     file:write "    @abstractmethod\n"
-    file:write("    def visit_", class_name:lower(), "_", base, "(self, ", base, ": ", base_name, "): ...\n\n")
+    file:write("    def visit_", class_name:lower(), "_", base, "(self, ", base, ": ", base_name, ") -> ", return_type,
+               ": ...\n\n")
 end
 
+-- Wrapped at 120 columns, with the names on the following lines lined up with the first one
 function define_all(file, exprtypes)
+    local lines = {"__all__ = ["}
     for i, exprtype in ipairs(exprtypes) do
-        exprtypes[i] = "\"" .. exprtype .. "\""
+        local name = "\"" .. exprtype .. "\"" .. (i < #exprtypes and "," or "]")
+        local line = lines[#lines]
+        if i == 1 then
+            lines[#lines] = line .. name
+        elseif #line + 1 + #name > 120 then
+            lines[#lines + 1] = string.rep(" ", 11) .. name
+        else
+            lines[#lines] = line .. " " .. name
+        end
     end
 
-    file:write("__all__ = [", table.concat(exprtypes, ", "), "]\n")
+    file:write(table.concat(lines, "\n"), "\n")
 end
 
-function define_ast(out_dir, base_name, exprtypes, imports)
+function define_ast(out_dir, base_name, exprtypes, imports, return_type, visitor_comment)
     local path = out_dir .. "/" .. base_name:lower() .. ".py"
 
     -- Open/create the file
@@ -39,16 +58,18 @@ function define_ast(out_dir, base_name, exprtypes, imports)
     end
     file:write "\n\n"
     file:write("class ", base_name, "(ABC):\n")
+    file:write "    __slots__ = ()\n\n"
     file:write "    @abstractmethod\n"
     file:write "    def accept(self, visitor): ...\n\n\n"
 
     -- Defining a visitor interface
+    file:write(visitor_comment)
     file:write("class " .. base_name .. "Visitor(ABC):\n")
     local types = {base_name}
     for _, exprtype in ipairs(exprtypes) do
         local class_name = exprtype:match "(%a+)%s+:%s+[%g%s]+"
         types[#types + 1] = class_name .. base_name
-        define_visitor(file, base_name, class_name)
+        define_visitor(file, base_name, class_name, return_type)
     end
 
     file:write "\n"
@@ -78,7 +99,9 @@ exprs = {"Assign   : name: Token, value: Expr",
          "This     : keyword: Token",
          "Unary    : operator: Token, right: Expr",
          "Variable : name: Token"}
-define_ast("../src", "Expr", exprs, {{from = "tokenclass", what = "Token"}})
+define_ast("../src", "Expr", exprs, {{from = "tokenclass", what = "Token"}}, "object | None",
+           "# \"None\" as output type was added for the Resolver class, since at resolution pass expressions don't " ..
+           "produce values,\n# but they do at runtime\n")
 
 stmts = {"Block      : statements: list[Stmt]",
          "Expression : expression: Expr",
@@ -89,4 +112,6 @@ stmts = {"Block      : statements: list[Stmt]",
          "Var        : name: Token, initializer: Expr",
          "While      : condition: Expr, body: Stmt",
          "Class      : name: Token, superclass: VariableExpr | None, methods: list[FunctionStmt]"}
-define_ast("../src", "Stmt", stmts, {{from = "expr", what = "Expr, VariableExpr"}, {from = "tokenclass", what = "Token"}})
+define_ast("../src", "Stmt", stmts,
+           {{from = "expr", what = "Expr, VariableExpr"}, {from = "tokenclass", what = "Token"}}, "None",
+           "# All \"visit_<type>_stmt\" methods shouldn't produce output since statements don't produce values\n")